@@ -18,11 +18,19 @@
 #   limitations under the License.
 from __future__ import print_function
 
+import io
+import os
 import sys
+import mmap
 import ntpath
+import struct
 from enum import Enum
+from collections import OrderedDict, deque, namedtuple
 
 from . import RegistryParse
+from . import RegistryLog
+from . import RegistryIndex
+from . import RegistrySearch
 
 RegSZ = 0x0001
 RegExpandSZ = 0x0002
@@ -40,6 +48,69 @@ RegFileTime = 0x0010
 
 DEVPROP_MASK_TYPE = 0x00000FFF
 
+# This named tuple describes the usage of a PathCache.
+PathCacheStats = namedtuple('PathCacheStats', ['hits', 'partial_hits', 'misses', 'size', 'capacity'])
+
+# This named tuple describes a key visited by Registry.walk().
+# `values` is the list of RegistryValues of the key, or None if they were not requested.
+WalkEntry = namedtuple('WalkEntry', ['path', 'depth', 'key', 'values'])
+
+# This named tuple describes a record found by Registry.scan().
+# `record` is an NKRecord or a VKRecord, `offset` its absolute offset, and
+# `parent_offset` the offset of the NKRecord of its parent or owning key.
+ScanEntry = namedtuple('ScanEntry', ['offset', 'parent_offset', 'path', 'record'])
+
+# This named tuple holds the key and value arrays and name table built by Registry.to_arrays().
+HiveArrays = namedtuple("HiveArrays", ["keys", "values", "names"])
+
+# Field layouts of the structured arrays built by Registry.to_arrays().
+# Offsets are absolute offsets into the hive; -1 marks a missing parent.
+KEY_ARRAY_FIELDS = [
+    ("offset", "<i8"),
+    ("parent", "<i8"),
+    ("depth", "<u4"),
+    ("name", "<u4"),
+    ("timestamp", "<u8"),
+    ("subkeys", "<u4"),
+    ("values", "<u4"),
+]
+
+VALUE_ARRAY_FIELDS = [
+    ("key", "<i8"),
+    ("offset", "<i8"),
+    ("name", "<u4"),
+    ("type", "<u4"),
+    ("data_length", "<u4"),
+    ("data_offset", "<i8"),
+]
+
+# This named tuple describes a file read by probe().
+HiveInfo = namedtuple("HiveInfo", ["path", "file_type", "hive_type", "hive_name",
+                                   "major_version", "minor_version", "sequence1", "sequence2",
+                                   "checksum_valid", "recover_header", "recover_data",
+                                   "hbins_size", "timestamp"])
+
+
+class KeyRef(namedtuple("KeyRef", ["hive_id", "offset"])):
+    """
+    A lightweight handle to a key: the id of its hive and the offset of its
+    NKRecord. Unlike a RegistryKey, it does not hold the hive, so it is cheap
+    to pickle, send to another process, store, compare and hash.
+    The id of a hive opened from a file is its absolute path, or the tuple
+    (absolute path, "logs") when it was recovered from the transaction logs
+    next to it, so a handle resolves in any process that can read the file.
+    See open_hive().
+    """
+    __slots__ = ()
+
+    def key(self):
+        """
+        Get the RegistryKey this handle refers to, from the hive registry of
+        this process. The hive is opened if it is not open yet. See get_hive().
+        """
+        return get_hive(self.hive_id).key_at(self.offset)
+
+
 class HiveType(Enum):
     UNKNOWN = ""
     NTUSER = "ntuser.dat"
@@ -103,6 +174,8 @@ class RegistryValue(object):
     It represents the 3-tuple of (name, type, value) associated with 
       a registry value.
     """
+    __slots__ = ('_vkrecord',)
+
     def __init__(self, vkrecord):
         self._vkrecord = vkrecord
 
@@ -162,6 +235,42 @@ class RegistryValue(object):
     def raw_data(self):
         return self._vkrecord.raw_data()
 
+    def open_data(self):
+        """
+        Get a read-only, seekable file-like object over the raw data.
+        Large values are read segment by segment from the hive, rather
+        than being joined into one byte string first.
+        """
+        return self._vkrecord.data_stream()
+
+    def iter_data_chunks(self):
+        """
+        Generate the raw data as a sequence of memoryview objects that
+        refer directly into the hive buffer, for example to hash or write
+        out a large value without building it in memory.
+        A Registry opened with mmap=True cannot be closed while any of
+        these views are still referenced.
+        """
+        return self._vkrecord.data_chunks()
+
+
+def _projection_names(names):
+    """
+    Get the keys of RegistryKey.values_dict() for a list of value names.
+    """
+    return ["" if name == "(default)" else name.lower() for name in names]
+
+
+def _project(values, names, default):
+    """
+    Get the data of the values with the given keys of a RegistryKey.values_dict().
+    """
+    result = []
+    for name in names:
+        value = values.get(name)
+        result.append(default if value is None else value.value())
+    return result
+
 
 class RegistryKey(object):
     """
@@ -170,13 +279,17 @@ class RegistryKey(object):
     A RegistryKey may have a set of values associated with it,
       as well as a last modified timestamp.
     """
-    def __init__(self, nkrecord):
+    __slots__ = ('_nkrecord', '_registry')
+
+    def __init__(self, nkrecord, registry=None):
         """
 
         Arguments:
         - `NKRecord`:
+        - `registry`: The Registry this key belongs to, if known.
         """
         self._nkrecord = nkrecord
+        self._registry = registry
 
     def __str__(self):
         return "Registry Key %s with %d values and %d subkeys" % \
@@ -191,6 +304,13 @@ class RegistryKey(object):
         """
         return self._nkrecord.timestamp()
 
+    def raw_timestamp(self):
+        """
+        Get the last modified timestamp as the raw FILETIME integer,
+        which sorts and compares the same way and costs no conversion.
+        """
+        return self._nkrecord.raw_timestamp()
+
     def name(self):
         """
         Get the name of the key as a string.
@@ -218,7 +338,7 @@ class RegistryKey(object):
         # a new RegistryKey from the NKRecord parent key, rather
         # than using the parent of this instance, if it exists.
         try:
-            return RegistryKey(self._nkrecord.parent_key())
+            return RegistryKey(self._nkrecord.parent_key(), self._registry)
         except RegistryParse.ParseException:
             raise RegistryKeyHasNoParentException(self.name())
 
@@ -232,7 +352,7 @@ class RegistryKey(object):
             return []
 
         l = self._nkrecord.subkey_list()
-        return [RegistryKey(k) for k in l.keys()]
+        return [RegistryKey(k, self._registry) for k in l.keys()]
 
     def subkey(self, name):
         """
@@ -243,10 +363,10 @@ class RegistryKey(object):
         if self._nkrecord.subkey_number() == 0:
             raise RegistryKeyNotFoundException(self.path() + "\\" + name)
 
-        for k in self._nkrecord.subkey_list().keys():
-            if k.name().lower() == name.lower():
-                return RegistryKey(k)
-        raise RegistryKeyNotFoundException(self.path() + "\\" + name)
+        try:
+            return RegistryKey(self._nkrecord.subkey_list().find_key(name), self._registry)
+        except RegistryParse.RegistryStructureDoesNotExist:
+            raise RegistryKeyNotFoundException(self.path() + "\\" + name)
 
     def values(self):
         """
@@ -276,16 +396,221 @@ class RegistryKey(object):
             raise RegistryValueNotFoundException(self.path() + " : " + name)
         raise RegistryValueNotFoundException(self.path() + " : " + name)
 
+    def values_dict(self):
+        """
+        Return a dict from the lower case name of each value of this key
+        to its RegistryValue. The value names are decoded once, and no data
+        is decoded. The default value is found under "". If several values
+        have the same name, the first one is kept, as by value().
+        """
+        index = {}
+        if self._nkrecord.values_number() == 0:
+            return index
+        try:
+            vks = self._nkrecord.values_list().values()
+        except RegistryParse.RegistryStructureDoesNotExist:
+            return index
+        for vk in vks:
+            name = vk.name().lower()
+            if name not in index:
+                index[name] = RegistryValue(vk)
+        return index
+
+    def project(self, names, default=None):
+        """
+        Return a list of the data of the values with the given names, in the
+        same order, with `default` for those that do not exist. Names are
+        compared case-insensitively, and "(default)" is the default value.
+        The value list is read once, and only the requested data is decoded.
+        """
+        return _project(self.values_dict(), _projection_names(names), default)
+
+    def project_subkeys(self, names, default=None):
+        """
+        A generator that yields a (RegistryKey, data) tuple for each subkey
+        of this key, where data is the list of the data of the values with the
+        given names, as for project().
+        """
+        if self._nkrecord.subkey_number() == 0:
+            return
+        names = _projection_names(names)
+        for nk in self._nkrecord.subkey_list().keys():
+            key = RegistryKey(nk, self._registry)
+            yield key, _project(key.values_dict(), names, default)
+
     def find_key(self, path):
         """
         Perform a search for a RegistryKey with a specific path.
+        If the key belongs to a Registry with a sidecar index, the path is
+        looked up there. Otherwise, if it has a path cache, the search
+        resumes from the deepest ancestor of the path found in the cache.
         """
         if len(path) == 0:
             return self
 
-        (immediate, _, future) = path.partition("\\")
-        return self.subkey(immediate).find_key(future)
+        index = self._registry.index() if self._registry is not None else None
+        if index is not None:
+            position = index.position(self._nkrecord.offset())
+            if position is not None:
+                base = index.relative_path(position)
+                found = index.find(base + "\\" + path.rstrip("\\") if base else path.rstrip("\\"))
+                if found is not None:
+                    return self._registry.key_at(index.offset(found))
+
+        if self._registry is None or self._registry.path_cache() is None:
+            (immediate, _, future) = path.partition("\\")
+            return self.subkey(immediate).find_key(future)
+
+        cache = self._registry.path_cache()
+        names = path.split("\\")
+        if names[-1] == "":
+            names.pop()
+        prefixes = []
+        prefix = ""
+        for name in names:
+            prefix += "\\" + RegistryParse.upcase_name(name)
+            prefixes.append((self._nkrecord.offset(), prefix))
+
+        (depth, offset) = cache.lookup(prefixes)
+        key = self
+        if offset is not None:
+            key = self._registry.key_at(offset)
+        for name, prefix in zip(names[depth:], prefixes[depth:]):
+            key = key.subkey(name)
+            cache.add(prefix, key._nkrecord.offset())
+        return key
         
+    def ref(self):
+        """
+        Get a KeyRef handle to this key. Its hive is added to the hive
+        registry of this process, unless one is registered under its id
+        already, so that the handle resolves to it here.
+        Raises ValueError if the key does not belong to a hive with an id,
+        such as one read from a file-like object without a name, or one
+        recovered from given log files; see register_hive().
+        """
+        if self._registry is None or self._registry.hive_id() is None:
+            raise ValueError("The hive of key %s has no id" % (self.name()))
+        hive_id = self._registry.hive_id()
+        if hive_id not in _hives:
+            _hives[hive_id] = self._registry
+        return KeyRef(hive_id, self._nkrecord.offset())
+
+    def walk(self, prune=None, max_depth=None, order="pre", values=False):
+        """
+        A generator that yields a WalkEntry for this key and each key below it,
+        without recursion.
+        Paths are built from the path of the parent key as the walk descends,
+        rather than by climbing back to the root for every key.
+        Keys that would close a path cycle are skipped.
+        Arguments:
+        - `prune`: A callable receiving each WalkEntry. When it returns True,
+              the key is not yielded and its subkeys are not visited.
+        - `max_depth`: Do not visit keys deeper than this. The starting key has depth 0.
+        - `order`: "pre" to yield keys before their subkeys, "post" to yield
+              them after their subkeys, or "bfs" to yield them level by level.
+        - `values`: If True, each WalkEntry also holds the values of the key.
+        If the key belongs to a Registry with a sidecar index, a pre-order
+        walk reads the keys and their paths from the index.
+        """
+        index = self._registry.index() if self._registry is not None else None
+        if index is not None and order == "pre":
+            position = index.position(self._nkrecord.offset())
+            if position is not None:
+                return self._walk_index(index, position, prune, max_depth, values)
+        return self._walk(self.path(), 0, (), prune, max_depth, order, values)
+
+    def _walk_index(self, index, position, prune, max_depth, values):
+        """
+        Walk the subtree of this key in pre-order from the sidecar index of
+        its hive, given its position there. See RegistryKey.walk().
+        """
+        buf = self._registry._buf
+        start_depth = index.depth(position)
+        end = index.end(position)
+        while position < end:
+            entry = index.entry(position)
+            depth = entry.depth - start_depth
+            if max_depth is not None and depth > max_depth:
+                position = entry.end
+                continue
+            key = RegistryKey(RegistryParse.NKRecord(buf, entry.offset, None), self._registry)
+            walk_entry = WalkEntry(entry.path, depth, key, key.values() if values else None)
+            if prune is not None and prune(walk_entry):
+                position = entry.end
+                continue
+            yield walk_entry
+            position += 1
+
+    def _walk(self, path, depth, ancestors, prune, max_depth, order, values):
+        """
+        Walk the subtree of this key, given its path and depth and the offsets
+        of the keys above it, so that a walk may be resumed from a key found
+        by an earlier one. See RegistryKey.walk().
+        """
+        if order not in ("pre", "post", "bfs"):
+            raise ValueError("Unknown walk order: %s" % (order))
+
+        def make_entry(key, path, depth):
+            return WalkEntry(path, depth, key, key.values() if values else None)
+
+        def children(entry):
+            if max_depth is not None and entry.depth >= max_depth:
+                return iter(())
+            if entry.key.subkeys_number() == 0:
+                return iter(())
+            return (RegistryKey(k, self._registry) for k in entry.key._nkrecord.subkey_list().keys())
+
+        def visit(key, parent):
+            entry = make_entry(key, parent.path + "\\" + key.name(), parent.depth + 1)
+            if prune is not None and prune(entry):
+                return None
+            return entry
+
+        start = make_entry(self, path, depth)
+        if prune is not None and prune(start):
+            return
+
+        if order == "bfs":
+            seen = set(ancestors)
+            seen.add(self._nkrecord.offset())
+            queue = deque([start])
+            while queue:
+                entry = queue.popleft()
+                yield entry
+                for subkey in children(entry):
+                    if subkey._nkrecord.offset() in seen:
+                        continue
+                    child = visit(subkey, entry)
+                    if child is not None:
+                        seen.add(subkey._nkrecord.offset())
+                        queue.append(child)
+            return
+
+        if order == "pre":
+            yield start
+        ancestors = set(ancestors)
+        ancestors.add(self._nkrecord.offset())
+        stack = [(start, children(start))]
+        while stack:
+            (entry, subkeys) = stack[-1]
+            subkey = next(subkeys, None)
+            if subkey is None:
+                stack.pop()
+                ancestors.discard(entry.key._nkrecord.offset())
+                if order == "post":
+                    yield entry
+                continue
+            if subkey._nkrecord.offset() in ancestors:
+                continue
+            child = visit(subkey, entry)
+            if child is None:
+                continue
+            if order == "pre":
+                yield child
+            ancestors.add(subkey._nkrecord.offset())
+            stack.append((child, children(child)))
+
     def values_number(self):
     	"""
     	Return the number of values associated with this key
@@ -299,24 +624,572 @@ class RegistryKey(object):
     	return self._nkrecord.subkey_number()
 
 
+def map_file(filelikeobject, copy_on_write=False):
+    """
+    Map a file read-only into memory.
+    Arguments:
+    - `filelikeobject`: A file object with a .fileno() method.
+          If a Python string is passed, it is interpreted as a filename,
+          and the corresponding file is opened.
+    - `copy_on_write`: If True, the mapping may be written to. Written pages
+          are private copies; the file itself is never modified.
+    """
+    access = mmap.ACCESS_COPY if copy_on_write else mmap.ACCESS_READ
+    try:
+        fileno = filelikeobject.fileno()
+    except AttributeError:
+        with open(filelikeobject, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=access)
+    return mmap.mmap(fileno, 0, access=access)
+
+
+def read_file(filelikeobject):
+    """
+    Read a whole file into a byte string.
+    Arguments:
+    - `filelikeobject`: A file-like object with a .read() method.
+          If a Python string is passed, it is interpreted as a filename,
+          and the corresponding file is opened.
+    """
+    try:
+        return filelikeobject.read()
+    except AttributeError:
+        with open(filelikeobject, "rb") as f:
+            return f.read()
+
+
+def recover_file(filelikeobject, logs, mmap=False, skip_unsupported=False):
+    """
+    Apply transaction log files to a primary file in memory, leaving the
+    file itself untouched, and return a buffer with the recovered hive.
+    Each log is read and its log entries validated once. The dirty pages
+    of all logs are then written in offset order, adjacent pages joined.
+    See RegistryLog.apply_logs().
+    Arguments:
+    - `filelikeobject`: The primary file, as for Registry.
+    - `logs`: A list of one or two file-like objects or filenames
+          of the transaction log files.
+    - `mmap`: If True, the primary file is mapped copy-on-write: pages that
+          no log entry touches are shared with the file, and only the dirty
+          pages are copied into memory. When the logs grow the hive past the
+          end of the file, the file is read into memory instead.
+    - `skip_unsupported`: If True, log files that cannot be loaded are skipped.
+    """
+    if mmap:
+        primary = map_file(filelikeobject, copy_on_write=True)
+    else:
+        primary = io.BytesIO(read_file(filelikeobject))
+
+    dirty_pages = RegistryLog.DirtyPages()
+    RegistryLog.apply_logs(primary, logs, dirty_pages=dirty_pages, skip_unsupported=skip_unsupported)
+
+    if mmap and dirty_pages.end() > len(primary):
+        buf = primary
+        primary = io.BytesIO(buf[:])
+        buf.close()
+
+    dirty_pages.write_to(primary)
+    if isinstance(primary, io.BytesIO):
+        return primary.getvalue()
+    primary.seek(0)
+    return primary
+
+
+def find_logs(filename):
+    """
+    Get the filenames of the transaction log files next to a primary file:
+    those of <filename>.LOG1 and <filename>.LOG2 that exist, in either case.
+    """
+    logs = []
+    for suffix in (".LOG1", ".LOG2"):
+        for candidate in (filename + suffix, filename + suffix.lower()):
+            if os.path.isfile(candidate):
+                logs.append(candidate)
+                break
+    return logs
+
+
+def hive_type_from_name(hive_name):
+    """
+    Get the HiveType for the hive name stored in a REGF block.
+    """
+    temp = hive_name.replace('\\??\\', '')
+    temp = ntpath.basename(temp).lower()
+    for hive_type in HiveType:
+        if temp == hive_type.value:
+            return hive_type
+    return HiveType.UNKNOWN
+
+
+def probe(filelikeobject):
+    """
+    Read only the REGF block, the first 4 KB, of a primary or transaction
+    log file, and return a HiveInfo tuple describing it.
+    Raise RegistryParse.ParseException if it is not a Windows Registry file.
+    Arguments:
+    - `filelikeobject`: A file-like object with a .read() method, positioned
+          at the start of the file. If a Python string is passed, it is
+          interpreted as a filename, and the corresponding file is opened.
+    """
+    try:
+        buf = filelikeobject.read(0x1000)
+        path = getattr(filelikeobject, "name", None)
+    except AttributeError:
+        with open(filelikeobject, "rb") as f:
+            buf = f.read(0x1000)
+        path = filelikeobject
+
+    if len(buf) < 0x200:
+        raise RegistryParse.ParseException("Truncated REGF block")
+    regf = RegistryParse.REGFBlock(buf, 0, False)
+
+    try:
+        file_type = RegistryParse.FileType(regf.file_type())
+    except ValueError:
+        file_type = None
+    # junk that starts with "regf" may hold anything in the name field
+    hive_name = regf.unpack_string(0x30, 64).decode("utf-16le", "replace").rstrip("\x00")
+    recover = regf.recovery_required()
+    return HiveInfo(path, file_type, hive_type_from_name(hive_name), hive_name,
+                    regf.major_version(), regf.minor_version(),
+                    regf.hive_sequence1(), regf.hive_sequence2(),
+                    regf.validate_checksum(), recover.recover_header, recover.recover_data,
+                    regf.hbins_size(), regf.raw_modification_timestamp())
+
+
+def probe_directory(directory, recursive=True, workers=8):
+    """
+    A generator that probes the files in a directory in parallel threads,
+    see probe(), and yields a HiveInfo for each Windows Registry file.
+    Other files, and files that cannot be read, are skipped.
+    Results are yielded in the order the files are found.
+    Arguments:
+    - `directory`: The path of the directory.
+    - `recursive`: If True, the subdirectories are probed too.
+    - `workers`: The number of threads reading files.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def paths():
+        for (dirpath, dirnames, filenames) in os.walk(directory):
+            for filename in sorted(filenames):
+                yield os.path.join(dirpath, filename)
+            if not recursive:
+                break
+            dirnames.sort()
+
+    def try_probe(path):
+        try:
+            return probe(path)
+        except (RegistryParse.ParseException, IOError, OSError, ValueError, struct.error):
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for path in paths():
+            pending.append(executor.submit(try_probe, path))
+            if len(pending) < workers * 4:
+                continue
+            info = pending.popleft().result()
+            if info is not None:
+                yield info
+        while pending:
+            info = pending.popleft().result()
+            if info is not None:
+                yield info
+
+
+def _file_path(filelikeobject):
+    """
+    Get the absolute path of a filename or of a named file object, or None.
+    """
+    name = getattr(filelikeobject, "name", filelikeobject)
+    if isinstance(name, (str, type(u""))):
+        return os.path.abspath(name)
+    return None
+
+
+def _file_hive_id(filename, logs=False):
+    """
+    Get the id of a hive opened from a file: its absolute path, or the tuple
+    (absolute path, "logs") if it is recovered from the transaction log
+    files next to it, whose contents differ from those of the file.
+    """
+    path = os.path.abspath(filename)
+    return (path, "logs") if logs else path
+
+
+# The hives of this process, by id. The hives opened by open_hive() and
+# get_hive() belong to it, and stay open until close_hive(). Those added by
+# register_hive() or RegistryKey.ref() belong to their caller; closing them
+# removes them from it.
+_hives = {}
+
+
+def register_hive(reg, hive_id=None):
+    """
+    Add an opened Registry to the hive registry of this process, so that
+    KeyRef handles to its keys resolve to it, and return its id.
+    Arguments:
+    - `reg`: The Registry.
+    - `hive_id`: The id to register it under. Defaults to the id of the hive,
+          the absolute path of its file. It must be given for hives read
+          from file-like objects without a name.
+    """
+    hive_id = hive_id or reg.hive_id()
+    if hive_id is None:
+        raise ValueError("The hive has no id")
+    reg._hive_id = hive_id
+    _hives[hive_id] = reg
+    return hive_id
+
+
+def open_hive(filename, mmap=True, logs=False):
+    """
+    Get the Registry for a file from the hive registry of this process,
+    opening and registering it the first time. A hive recovered from its
+    logs has an id of its own, so both views of a file may be registered.
+    The hive registry closes the hives it opens in close_hive().
+    Arguments:
+    - `filename`: The filename of the hive.
+    - `mmap`: If True, the hive is memory mapped when it is opened here.
+          See Registry.
+    - `logs`: If True, the hive is recovered from the transaction log
+          files next to it. See Registry.open_with_logs().
+    """
+    hive_id = _file_hive_id(filename, logs)
+    reg = _hives.get(hive_id)
+    if reg is None:
+        if logs:
+            reg = Registry.open_with_logs(filename, mmap=mmap)
+        else:
+            reg = Registry(filename, mmap=mmap)
+        register_hive(reg, hive_id)
+    return reg
+
+
+def get_hive(hive_id):
+    """
+    Get the Registry with the given id from the hive registry of this
+    process. An id that is not registered is opened as a filename, with
+    the logs next to it for a (filename, "logs") id. See open_hive().
+    """
+    reg = _hives.get(hive_id)
+    if reg is None:
+        if isinstance(hive_id, tuple):
+            reg = open_hive(hive_id[0], logs=True)
+        else:
+            reg = open_hive(hive_id)
+    return reg
+
+
+def close_hive(hive_id):
+    """
+    Remove the Registry with the given id from the hive registry of this
+    process, and close it.
+    """
+    reg = _hives.pop(hive_id, None)
+    if reg is not None:
+        reg.close()
+
+
+def _replace_file(source, destination):
+    """
+    Rename `source` to `destination`, replacing it if it exists.
+    os.rename() does so atomically on POSIX systems; elsewhere the old file
+    is removed first.
+    """
+    try:
+        os.rename(source, destination)
+    except OSError:
+        if not os.path.exists(destination):
+            raise
+        os.remove(destination)
+        os.rename(source, destination)
+
+
+def build_index(filename):
+    """
+    Build the sidecar index of a hive, and write it next to it, as
+    <filename>.regidx. It holds the offsets of the keys, of their parents
+    and of their value lists, and their full paths, in walk order, with
+    tables to find them by path and by offset. A Registry opening the hive
+    afterwards loads it, as long as the checksum, sequence numbers and size
+    of the hive are unchanged, and open(), find_key() and walk() use it.
+    Return the filename of the index.
+    """
+    entries = []
+    with Registry(filename, mmap=True, index=False) as reg:
+        # the positions of the keys whose subtree is still being walked
+        stack = []
+        for entry in reg.walk():
+            while stack and entries[stack[-1]].depth >= entry.depth:
+                position = stack.pop()
+                entries[position] = entries[position]._replace(end=len(entries))
+            nk = entry.key._nkrecord
+            values_offset = 0
+            if nk.values_number() > 0:
+                try:
+                    values_offset = nk.values_list().offset()
+                except RegistryParse.RegistryStructureDoesNotExist:
+                    pass
+            entries.append(RegistryIndex.IndexEntry(
+                nk.offset(), entries[stack[-1]].offset if stack else None, entry.depth, 0,
+                values_offset, nk.values_number() if values_offset else 0, entry.path))
+            stack.append(len(entries) - 1)
+        for position in stack:
+            entries[position] = entries[position]._replace(end=len(entries))
+        identity = RegistryIndex.hive_identity(reg._regf, len(reg._buf))
+
+    # write a new file and move it in place, since open hives may map the old one
+    path = RegistryIndex.index_path(os.path.abspath(filename))
+    with open(path + ".tmp", "wb") as f:
+        RegistryIndex.write_index(f, identity, entries)
+    _replace_file(path + ".tmp", path)
+    return path
+
+
+def build_search_index(filename):
+    """
+    Build the trigram index of the key names, value names and string data
+    of a hive, and write it next to it, as <filename>.regtri. A Registry
+    opening the hive afterwards uses it for search(), as long as the
+    checksum, sequence numbers and size of the hive are unchanged.
+    Return the filename of the index.
+    """
+    with Registry(filename, mmap=True) as reg:
+        data = RegistrySearch.build(reg)
+
+    path = RegistrySearch.search_index_path(os.path.abspath(filename))
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    _replace_file(path + ".tmp", path)
+    return path
+
+
+class PathCache(object):
+    """
+    A bounded least recently used cache that maps key paths, upper cased
+    and relative to the key the search started from, to NKRecord offsets.
+    """
+    def __init__(self, capacity):
+        """
+        Constructor.
+        Arguments:
+        - `capacity`: The maximum number of paths to remember.
+        """
+        self._capacity = capacity
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._partial_hits = 0
+        self._misses = 0
+
+    def lookup(self, prefixes):
+        """
+        Find the longest cached prefix of a path.
+        Returns a tuple (number of path components found, NKRecord offset),
+        or (0, None) if no prefix is cached.
+        Arguments:
+        - `prefixes`: The cache keys of the prefixes of the path, shortest first.
+        """
+        for depth in range(len(prefixes), 0, -1):
+            offset = self._entries.pop(prefixes[depth - 1], None)
+            if offset is not None:
+                self._entries[prefixes[depth - 1]] = offset
+                if depth == len(prefixes):
+                    self._hits += 1
+                else:
+                    self._partial_hits += 1
+                return (depth, offset)
+        self._misses += 1
+        return (0, None)
+
+    def add(self, prefix, offset):
+        """
+        Remember the NKRecord offset of a path, evicting the least recently used path if needed.
+        """
+        self._entries.pop(prefix, None)
+        self._entries[prefix] = offset
+        if len(self._entries) > self._capacity:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Forget all paths and reset the statistics.
+        """
+        self._entries.clear()
+        self._hits = 0
+        self._partial_hits = 0
+        self._misses = 0
+
+    def stats(self):
+        """
+        Get the usage of the cache as a PathCacheStats named tuple.
+        A hit resolved the whole path from the cache, a partial hit resumed
+        the search from a cached ancestor, and a miss started from scratch.
+        """
+        return PathCacheStats(hits=self._hits,
+                              partial_hits=self._partial_hits,
+                              misses=self._misses,
+                              size=len(self._entries),
+                              capacity=self._capacity)
+
+
+class _LookupNode(object):
+    """
+    A node of the trie of key paths built by Registry.open_many() and
+    Registry.values_many(), one for each distinct upper case key name.
+    """
+    __slots__ = ('children', 'paths', 'values')
+
+    def __init__(self):
+        self.children = {}
+        # the requested paths that end at this key, as given
+        self.paths = []
+        # the requested value names of this key, by lower case name
+        self.values = {}
+
+    def add(self, path):
+        """
+        Get the node for a key path, relative to this one, adding the missing nodes.
+        """
+        node = self
+        names = path.split("\\")
+        if names[-1] == "":
+            names.pop()
+        for name in names:
+            upname = RegistryParse.upcase_name(name)
+            child = node.children.get(upname)
+            if child is None:
+                child = node.children[upname] = (name, _LookupNode())
+            node = child[1]
+        return node
+
+
 class Registry(object):
     """
     A class for parsing and reading from a Windows Registry file.
     """
-    def __init__(self, filelikeobject):
+    def __init__(self, filelikeobject, mmap=False, path_cache_size=1024, logs=None, index=True):
         """
         Constructor.
         Arguments:
         - `filelikeobject`: A file-like object with a .read() method.
               If a Python string is passed, it is interpreted as a filename,
               and the corresponding file is opened.
+        - `mmap`: If True, the file is mapped read-only into memory instead
+              of being read. Pages are only loaded once the traversal touches
+              them, so opening a hive does not depend on its size.
+              `filelikeobject` must then be a filename or a file object
+              with a .fileno() method.
+        - `path_cache_size`: The number of key paths whose location is
+              remembered by open() and find_key(). Use 0 to disable the cache.
+        - `logs`: A list of one or two file-like objects or filenames of
+              transaction log files (.LOG1 and .LOG2) to recover the hive
+              with. They are applied to an in-memory view of the hive; the
+              file is not modified. With mmap, only the pages the logs
+              change are copied. See recover_file().
+        - `index`: If True, and `filelikeobject` is a filename or a named file,
+              the sidecar index next to it is used when it was built for
+              these contents. See build_index().
         """
-        try:
-            self._buf = filelikeobject.read()
-        except AttributeError:
-            with open(filelikeobject, "rb") as f:
-                self._buf = f.read()
+        if logs:
+            buf = recover_file(filelikeobject, logs, mmap=mmap)
+        elif mmap:
+            buf = map_file(filelikeobject)
+        else:
+            buf = read_file(filelikeobject)
+        self._set_buffer(buf, path_cache_size)
+        self._filename = _file_path(filelikeobject)
+        # reopening the file would not recover it from the same logs
+        self._hive_id = None if logs else self._filename
+        if index:
+            self._load_index()
+
+    @classmethod
+    def open_with_logs(cls, filelikeobject, logs=None, mmap=False, path_cache_size=1024, index=True):
+        """
+        Open a hive and recover it from its transaction log files in one call.
+        The eligible logs are applied in the right order, and their dirty
+        pages are written to an in-memory view of the hive; the file is not
+        modified. Log files that cannot be loaded, such as old format logs,
+        are ignored. See recover_file().
+        Arguments:
+        - `filelikeobject`: The primary file, as for the constructor.
+        - `logs`: A list of file-like objects or filenames of the transaction
+              log files. If None and `filelikeobject` is a filename, the
+              .LOG1 and .LOG2 files next to it are used, if they exist.
+        - `mmap`, `path_cache_size`, `index`: As for the constructor.
+        """
+        found = logs is None
+        if found:
+            try:
+                logs = find_logs(filelikeobject)
+            except TypeError:
+                logs = []
+        if not logs:
+            return cls(filelikeobject, mmap=mmap, path_cache_size=path_cache_size, index=index)
+
+        reg = cls.from_buffer(recover_file(filelikeobject, logs, mmap=mmap, skip_unsupported=True),
+                              path_cache_size=path_cache_size)
+        reg._filename = _file_path(filelikeobject)
+        # only the logs found next to the file are found again from the id
+        if found and reg._filename is not None:
+            reg._hive_id = _file_hive_id(reg._filename, logs=True)
+        if index:
+            reg._load_index()
+        return reg
+
+    @classmethod
+    def from_buffer(cls, buf, path_cache_size=1024):
+        """
+        Create a Registry over a buffer that already holds the hive: a byte
+        string, or a memory map, which close() releases.
+        Arguments:
+        - `buf`: The contents of the Windows Registry file.
+        - `path_cache_size`: As for the constructor.
+        """
+        reg = cls.__new__(cls)
+        reg._set_buffer(buf, path_cache_size)
+        return reg
+
+    def _set_buffer(self, buf, path_cache_size):
+        self._buf = buf
         self._regf = RegistryParse.REGFBlock(self._buf, 0, False)
+        self._path_cache = PathCache(path_cache_size) if path_cache_size > 0 else None
+        self._filename = None
+        self._hive_id = None
+        self._index = None
+        self._search_index = None
+
+    def _load_index(self):
+        if self._filename is None:
+            return
+        self._index = RegistryIndex.HiveIndex.load(RegistryIndex.index_path(self._filename),
+                                                   RegistryIndex.hive_identity(self._regf, len(self._buf)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Release the memory map of the hive and of its index, if any, and
+        remove it from the hive registry of this process.
+        Keys and values of this hive must not be used afterwards.
+        """
+        if self._hive_id is not None and _hives.get(self._hive_id) is self:
+            del _hives[self._hive_id]
+        if hasattr(self._buf, "close"):
+            self._buf.close()
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+        if self._search_index is not None:
+            self._search_index.close()
+            self._search_index = None
 
     def hive_name(self):
         """Returns the internal file name"""
@@ -324,38 +1197,277 @@ class Registry(object):
 
     def hive_type(self):
         """Returns the hive type"""
-        temp = self.hive_name()
-        temp = temp.replace('\\??\\', '')
-        temp = ntpath.basename(temp)
-
-        if temp.lower() == HiveType.NTUSER.value:
-            return HiveType.NTUSER
-        elif temp.lower() == HiveType.SAM.value:
-            return HiveType.SAM
-        elif temp.lower() == HiveType.SECURITY.value:
-            return HiveType.SECURITY
-        elif temp.lower() == HiveType.SOFTWARE.value:
-            return HiveType.SOFTWARE
-        elif temp.lower() == HiveType.SYSTEM.value:
-            return HiveType.SYSTEM
-        elif temp.lower() == HiveType.USRCLASS.value:
-            return HiveType.USRCLASS
-        elif temp.lower() == HiveType.BCD.value:
-            return HiveType.BCD
-        elif temp.lower() == HiveType.COMPONENTS.value:
-            return HiveType.COMPONENTS
-        elif temp.lower() == HiveType.DEFAULT.value:
-            return HiveType.DEFAULT
-        elif temp.lower() == HiveType.SCHEMA.value:
-            return HiveType.SCHEMA
-        else:
-            return HiveType.UNKNOWN
+        return hive_type_from_name(self.hive_name())
+
+    def hive_id(self):
+        """
+        Return the id of the hive used by KeyRef handles: the absolute path
+        of its file, (absolute path, "logs") if it was recovered from the
+        logs next to it, the id it was registered under, or None, such as
+        for a hive recovered from given logs. See register_hive().
+        """
+        return self._hive_id
+
+    def index(self):
+        """
+        Return the RegistryIndex.HiveIndex loaded for this hive, or None.
+        See build_index().
+        """
+        return self._index
+
+    def search_index(self):
+        """
+        Return the RegistrySearch.SearchIndex of this hive: the one next to
+        its file, if it was built for these contents, or else one built in
+        memory, once. See build_search_index().
+        """
+        if self._search_index is None:
+            if self._filename is not None:
+                self._search_index = RegistrySearch.SearchIndex.load(
+                    RegistrySearch.search_index_path(self._filename),
+                    RegistryIndex.hive_identity(self._regf, len(self._buf)))
+            if self._search_index is None:
+                self._search_index = RegistrySearch.SearchIndex(RegistrySearch.build(self))
+        return self._search_index
+
+    def search(self, needle, case_insensitive=False, kinds=RegistrySearch.KINDS):
+        """
+        A generator that yields a RegistrySearch.SearchHit, in walk order, for:
+        - each key below the root whose path contains `needle`, ending in its name, such as
+          the keys named like "Run" or the key "Windows\\CurrentVersion";
+        - each value whose name contains `needle`;
+        - each RegSZ, RegExpandSZ or RegMultiSZ value whose data contains `needle`.
+        Candidates are found through the trigram index, built on the first
+        call when there is none next to the hive, then checked against the hive.
+        Arguments:
+        - `needle`: The string to find.
+        - `case_insensitive`: If True, strings are compared in upper case,
+              character by character, the way Windows compares key names.
+        - `kinds`: The kinds of hits to find, among RegistrySearch.KEY,
+              RegistrySearch.VALUE_NAME and RegistrySearch.DATA.
+        """
+        return self.search_index().search(self._buf, needle, case_insensitive, kinds)
+
+    def path_cache(self):
+        """
+        Return the PathCache used by open() and find_key(), or None if it is disabled.
+        """
+        return self._path_cache
 
     def root(self):
         """
         Return the first RegistryKey in the hive.
         """
-        return RegistryKey(self._regf.first_key())
+        return RegistryKey(self._regf.first_key(), self)
+
+    def walk(self, key=None, prune=None, max_depth=None, order="pre", values=False):
+        """
+        A generator that yields a WalkEntry for each key in the hive,
+        or in the subtree rooted at `key`. See RegistryKey.walk().
+        Arguments:
+        - `key`: The RegistryKey to start from. Defaults to the root key.
+        """
+        if key is None:
+            key = self.root()
+        return key.walk(prune=prune, max_depth=max_depth, order=order, values=values)
+
+    def scan(self, values=True):
+        """
+        A generator that yields a ScanEntry for each allocated NKRecord and,
+        if `values` is True, VKRecord of the hive, in file order.
+        This reads the hive sequentially instead of chasing subkey and value
+        pointers, which suits jobs that visit every key. Paths are rebuilt
+        from a map of offset to (parent offset, name) gathered in a first pass.
+        Records that are allocated but not linked from the root key are
+        also yielded; their path starts at the first unknown ancestor.
+        A VKRecord not referenced by any key has a parent_offset of None.
+        """
+        # unlinked cells may hold anything, so records that cannot be parsed are skipped
+        errors = (RegistryParse.RegistryException, struct.error, UnicodeDecodeError)
+        keys = {}
+        owners = {}
+        for offset in self._regf.allocated_cells():
+            if self._buf[offset + 0x4:offset + 0x6] != b"nk":
+                continue
+            try:
+                nk = RegistryParse.NKRecord(self._buf, offset + 0x4, None)
+                parent_offset = None if nk.is_root() else nk.parent_key_offset()
+                keys[nk.offset()] = (parent_offset, nk.name())
+            except errors:
+                continue
+            if values and nk.values_number() > 0:
+                try:
+                    value_offsets = list(nk.values_list().value_offsets())
+                except errors:
+                    continue
+                for value_offset in value_offsets:
+                    owners[value_offset] = nk.offset()
+
+        paths = {}
+        def path(offset):
+            chain = []
+            seen = set()
+            while offset in keys and offset not in paths and offset not in seen:
+                seen.add(offset)
+                chain.append(offset)
+                offset = keys[offset][0]
+            if offset in seen:
+                prefix = "[path cycle]"
+            else:
+                prefix = paths.get(offset)
+            for o in reversed(chain):
+                prefix = keys[o][1] if prefix is None else prefix + "\\" + keys[o][1]
+                paths[o] = prefix
+            return prefix
+
+        for offset in self._regf.allocated_cells():
+            id_ = self._buf[offset + 0x4:offset + 0x6]
+            if id_ == b"nk":
+                if offset + 0x4 not in keys:
+                    continue
+                nk = RegistryParse.NKRecord(self._buf, offset + 0x4, None)
+                yield ScanEntry(nk.offset(), keys[nk.offset()][0], path(nk.offset()), nk)
+            elif values and id_ == b"vk":
+                try:
+                    vk = RegistryParse.VKRecord(self._buf, offset + 0x4, None)
+                    vk.name()
+                except errors:
+                    continue
+                parent_offset = owners.get(vk.offset())
+                yield ScanEntry(vk.offset(), parent_offset,
+                                path(parent_offset) if parent_offset is not None else None, vk)
+
+    def to_arrays(self):
+        """
+        Flatten the keys and values reachable from the root key into NumPy
+        structured arrays, in a single depth-first pass over the records.
+        Return a HiveArrays tuple with:
+        - `keys`: One row per key, with the fields of KEY_ARRAY_FIELDS.
+              `timestamp` is the raw FILETIME of the key.
+        - `values`: One row per value, with the fields of VALUE_ARRAY_FIELDS.
+              `key` is the offset of the owning key, and `data_length` and
+              `data_offset` are as given by VKRecord.data_length() and
+              VKRecord.data_offset().
+        - `names`: A NumPy object array of the distinct key and value
+              names, which the `name` field of both arrays indexes.
+        Requires numpy.
+        """
+        import numpy
+
+        names = []
+        name_index = {}
+        def intern(name):
+            i = name_index.get(name)
+            if i is None:
+                i = name_index[name] = len(names)
+                names.append(name)
+            return i
+
+        keys = []
+        values = []
+        root = self._regf.first_key()
+        ancestors = set()
+        stack = [(root, -1, 0, None)]
+        while stack:
+            (nk, parent, depth, subkeys) = stack[-1]
+            if subkeys is None:
+                offset = nk.offset()
+                subkey_number = nk.subkey_number()
+                values_number = nk.values_number()
+                keys.append((offset, parent, depth, intern(nk.name()), nk.raw_timestamp(),
+                             subkey_number, values_number))
+                if values_number > 0:
+                    for vk in nk.values_list().values():
+                        values.append((offset, vk.offset(), intern(vk.name()), vk.data_type(),
+                                       vk.data_length(), vk.data_offset()))
+                ancestors.add(offset)
+                subkeys = nk.subkey_list().keys() if subkey_number > 0 else iter(())
+                stack[-1] = (nk, parent, depth, subkeys)
+
+            child = next(subkeys, None)
+            if child is None:
+                stack.pop()
+                ancestors.discard(nk.offset())
+            elif child.offset() not in ancestors:
+                stack.append((child, nk.offset(), depth + 1, None))
+
+        return HiveArrays(numpy.array(keys, dtype=KEY_ARRAY_FIELDS),
+                          numpy.array(values, dtype=VALUE_ARRAY_FIELDS),
+                          numpy.array(names, dtype=object))
+
+    def _lookup(self, trie):
+        """
+        Resolve a trie of _LookupNodes in a single descent from the root key,
+        and yield each node with its RegistryKey. Nodes below a missing key
+        are not yielded.
+        """
+        stack = [(trie, self.root())]
+        while stack:
+            (node, key) = stack.pop()
+            yield node, key
+            for name, child in node.children.values():
+                try:
+                    stack.append((child, key.subkey(name)))
+                except RegistryKeyNotFoundException:
+                    continue
+
+    def open_many(self, paths, default=None):
+        """
+        Look up many keys by full path at once, see open(), and return a
+        dict from each path, as given, to its RegistryKey.
+        The paths are gathered into a trie of their case-insensitive key
+        names, so that keys shared by several paths are looked up once.
+        A key that does not exist is not an error: its path maps to `default`.
+        """
+        trie = _LookupNode()
+        results = {}
+        for path in paths:
+            trie.add(path).paths.append(path)
+            results[path] = default
+
+        for node, key in self._lookup(trie):
+            for path in node.paths:
+                results[path] = key
+        return results
+
+    def values_many(self, requests, default=None):
+        """
+        Look up many values at once, and return a dict from each
+        (key path, value name) tuple, as given, to its RegistryValue.
+        Each key is looked up once, as for open_many(), and its values
+        are read once, however many of them are requested. Value names
+        are compared case-insensitively, and "(default)" is the default value.
+        A value or key that does not exist is not an error: it maps to `default`.
+        """
+        trie = _LookupNode()
+        results = {}
+        for request in requests:
+            (path, name) = request
+            if name == "(default)":
+                name = ""
+            trie.add(path).values.setdefault(name.lower(), []).append(request)
+            results[request] = default
+
+        for node, key in self._lookup(trie):
+            if not node.values or key.values_number() == 0:
+                continue
+            try:
+                vks = key._nkrecord.values_list().values()
+            except RegistryParse.RegistryStructureDoesNotExist:
+                continue
+            for vk in vks:
+                for request in node.values.get(vk.name().lower(), ()):
+                    if results[request] is default:
+                        results[request] = RegistryValue(vk)
+        return results
+
+    def key_at(self, offset):
+        """
+        Return the RegistryKey whose NKRecord is at the given offset,
+        as given by RegistryParse.Record.offset().
+        Raises RegistryParse.ParseException if there is no NKRecord there.
+        """
+        return RegistryKey(RegistryParse.NKRecord(self._buf, offset, None), self)
 
     def open(self, path):
         """
@@ -367,14 +1479,12 @@ class Registry(object):
         # is the first registry key always the root?
         # are there any other keys at this
         # level? is this the name of the hive?
-        return RegistryKey(self._regf.first_key()).find_key(path)
+        return self.root().find_key(path)
 
 def print_all(key):
-    if len(key.subkeys()) == 0:
-        print(key.path())
-    else:
-        for k in key.subkeys():
-            print_all(k)
+    for entry in key.walk():
+        if entry.key.subkeys_number() == 0:
+            print(entry.path)
 
 if __name__ == '__main__':
     r = Registry(sys.argv[1])
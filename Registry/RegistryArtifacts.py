@@ -0,0 +1,440 @@
+#!/bin/python
+
+#    This file is part of python-registry.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+Extract forensic artifacts from hives with declarative definitions.
+
+An Artifact names the hive types it applies to, the key path patterns it
+matches, and the values it projects into its records:
+
+    services = Artifact("Service", [HiveType.SYSTEM], "CurrentControlSet\\\\Services\\\\*",
+                        ["DisplayName", "ImagePath", Field("ServiceDll", "Parameters\\\\ServiceDll")])
+
+    extractor = Extractor([services, ...])
+    for record in extractor.extract(Registry.Registry("SYSTEM")):
+        print(record)
+
+The Extractor merges the patterns of all the artifacts that apply to a hive
+into one plan, and resolves it in a single traversal of the hive, so that
+keys shared by several artifacts are visited once. Each record is a
+namedtuple of the artifact's own type, with the path of the matched key,
+its raw FILETIME last written timestamp, and the projected fields.
+
+Path patterns are relative to the root key, and separated by backslashes.
+Each name matches case-insensitively and may be:
+- a key name,
+- a pattern with the wildcards *, ? and [...], matching one key,
+- "**", matching any number of keys, including none,
+- "CurrentControlSet", in SYSTEM hives, the control set named by Select\\Current.
+"""
+from __future__ import print_function
+
+import struct
+import datetime
+from fnmatch import fnmatchcase
+from collections import namedtuple
+
+from . import Registry
+from . import RegistryParse
+from .Registry import HiveType
+
+
+class Field(namedtuple("Field", ["name", "value", "decoder"])):
+    """
+    A field of the records of an Artifact.
+    - `name`: The name of the field.
+    - `value`: The name of the value it holds, defaults to `name`. It may be
+          preceded by the path of a subkey of the matched key, as in
+          "Parameters\\ServiceDll". "(default)" is the default value.
+    - `decoder`: A callable applied to the data of the value, if it exists.
+    """
+    __slots__ = ()
+
+    def __new__(cls, name, value=None, decoder=None):
+        return super(Field, cls).__new__(cls, name, value or name, decoder)
+
+
+def unix_timestamp(data):
+    """
+    A decoder for values holding seconds since the UNIX epoch.
+    """
+    return datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=data)
+
+
+def windows_timestamp(data):
+    """
+    A decoder for values holding a FILETIME, as an integer or 8 bytes.
+    """
+    if isinstance(data, bytes):
+        data = struct.unpack("<Q", data[:8])[0]
+    return RegistryParse.parse_windows_timestamp(data)
+
+
+class Artifact(object):
+    """
+    A declarative definition of a forensic artifact. See the module documentation.
+    """
+    def __init__(self, name, hive_types, paths, fields=(), per_value=False):
+        """
+        Constructor.
+        Arguments:
+        - `name`: The name of the artifact, which is also the type name
+              of its records, so it must be a valid identifier.
+        - `hive_types`: The HiveTypes it applies to. Empty for all hives.
+        - `paths`: A path pattern, or a list of them.
+        - `fields`: The Fields of its records. A string is a Field with that name.
+        - `per_value`: If True, a record is made for each value of the matched
+              keys instead, with the fields "name" and "data", and `fields`
+              holds at most one Field whose decoder is applied to the data.
+        """
+        self.name = name
+        self.hive_types = tuple(hive_types)
+        self.paths = [paths] if isinstance(paths, (str, type(u""))) else list(paths)
+        self.fields = [Field(f) if isinstance(f, (str, type(u""))) else f for f in fields]
+        self.per_value = per_value
+        if per_value:
+            self.record_type = namedtuple(name, ["path", "last_written", "name", "data"])
+        else:
+            self.record_type = namedtuple(name, ["path", "last_written"] + [f.name for f in self.fields])
+
+    def __repr__(self):
+        return "Artifact(%s)" % (self.name)
+
+    def applies_to(self, hive_type):
+        """
+        Does this artifact apply to hives of the given HiveType?
+        """
+        return not self.hive_types or hive_type in self.hive_types
+
+
+class _PlanNode(object):
+    """
+    A node of a traversal plan: the artifacts whose pattern ends here, and
+    the nodes for the next name of the patterns that continue.
+    """
+    __slots__ = ("literals", "globs", "any_depth", "recursive", "artifacts")
+
+    def __init__(self, recursive=False):
+        # the nodes of key names, by upper case name, with the name as given
+        self.literals = {}
+        # the nodes of wildcard patterns, with the upper case pattern
+        self.globs = []
+        # the node of a following "**"
+        self.any_depth = None
+        # True for the node of a "**", which stays active in the whole subtree
+        self.recursive = recursive
+        self.artifacts = []
+
+    def add(self, names):
+        """
+        Get the node for a list of pattern names, relative to this one, adding the missing nodes.
+        """
+        node = self
+        for name in names:
+            if name == "**":
+                if node.any_depth is None:
+                    node.any_depth = _PlanNode(recursive=True)
+                node = node.any_depth
+                continue
+            upname = RegistryParse.upcase_name(name)
+            if any(c in name for c in "*?["):
+                for pattern, child in node.globs:
+                    if pattern == upname:
+                        break
+                else:
+                    child = _PlanNode()
+                    node.globs.append((upname, child))
+            else:
+                if upname not in node.literals:
+                    node.literals[upname] = (name, _PlanNode())
+                child = node.literals[upname][1]
+            node = child
+        return node
+
+
+def _closure(nodes):
+    """
+    Add the "**" nodes that match no key at all to a list of active nodes,
+    without duplicates. A "**" node matches the key its parent matched too.
+    """
+    result = []
+    seen = set()
+    for node in nodes:
+        while node is not None and id(node) not in seen:
+            seen.add(id(node))
+            result.append(node)
+            node = node.any_depth
+    return result
+
+
+def current_control_set(reg):
+    """
+    Get the name of the current control set of a SYSTEM hive, such as
+    "ControlSet001", from Select\\Current, or None if there is none.
+    """
+    value = reg.values_many([("Select", "Current")])[("Select", "Current")]
+    if value is None:
+        return None
+    try:
+        return "ControlSet%03d" % (value.value())
+    except (RegistryParse.RegistryException, TypeError):
+        return None
+
+
+class Extractor(object):
+    """
+    Extract the records of many Artifacts from hives, in a single traversal
+    of each hive.
+    """
+    def __init__(self, artifacts):
+        """
+        Constructor.
+        Arguments:
+        - `artifacts`: A list of Artifacts.
+        """
+        self._artifacts = list(artifacts)
+        self._plans = {}
+
+    def artifacts(self, hive_type):
+        """
+        Get the Artifacts that apply to hives of the given HiveType.
+        """
+        return [a for a in self._artifacts if a.applies_to(hive_type)]
+
+    def plan(self, hive_type, control_set=None):
+        """
+        Get the traversal plan merging the patterns of all the artifacts
+        that apply to hives of the given HiveType. Plans are cached.
+        Arguments:
+        - `hive_type`: A HiveType.
+        - `control_set`: The name of the key that "CurrentControlSet" stands for.
+              Patterns using it are left out if it is None.
+        """
+        plan = self._plans.get((hive_type, control_set))
+        if plan is not None:
+            return plan
+
+        plan = _PlanNode()
+        for artifact in self.artifacts(hive_type):
+            for path in artifact.paths:
+                names = [name for name in path.split("\\") if name]
+                if names and names[0].upper() == "CURRENTCONTROLSET":
+                    if control_set is None:
+                        continue
+                    names[0] = control_set
+                node = plan.add(names)
+                if artifact not in node.artifacts:
+                    node.artifacts.append(artifact)
+        self._plans[(hive_type, control_set)] = plan
+        return plan
+
+    def extract(self, reg, hive_type=None):
+        """
+        A generator that yields the records of the artifacts that apply to a
+        hive, in the order the keys are visited: depth first, subkeys in the
+        order of their subkey lists, and for each key, in the order of the
+        artifacts. Keys matched by several patterns of an artifact give one record.
+        Fields whose value does not exist, or cannot be read or decoded, are None.
+        Arguments:
+        - `reg`: A Registry.
+        - `hive_type`: The HiveType of the hive. Defaults to Registry.hive_type().
+        """
+        if hive_type is None:
+            hive_type = reg.hive_type()
+        control_set = None
+        if any(path.split("\\")[0].upper() == "CURRENTCONTROLSET"
+               for artifact in self.artifacts(hive_type) for path in artifact.paths):
+            control_set = current_control_set(reg)
+        plan = self.plan(hive_type, control_set)
+
+        root = reg.root()
+        stack = [(root, root.path(), _closure([plan]), ())]
+        while stack:
+            (key, path, nodes, ancestors) = stack.pop()
+            offset = key._nkrecord.offset()
+
+            artifacts = []
+            for node in nodes:
+                for artifact in node.artifacts:
+                    if artifact not in artifacts:
+                        artifacts.append(artifact)
+            if artifacts:
+                for record in _records(key, path, artifacts):
+                    yield record
+
+            children = self._children(key, nodes)
+            ancestors += (offset,)
+            for (subkey, subnodes) in reversed(children):
+                if subkey._nkrecord.offset() in ancestors:
+                    continue
+                stack.append((subkey, path + "\\" + subkey.name(), subnodes, ancestors))
+
+    def _children(self, key, nodes):
+        """
+        Get the subkeys of a key that the active plan nodes continue into,
+        with their own active nodes. Only names are looked up, unless a
+        wildcard or "**" requires every subkey to be compared.
+        """
+        if key.subkeys_number() == 0:
+            return []
+
+        if not any(node.globs or node.recursive for node in nodes):
+            matched = []
+            index = {}
+            for node in nodes:
+                for upname, (name, child) in node.literals.items():
+                    if upname in index:
+                        index[upname][1].append(child)
+                        continue
+                    try:
+                        subkey = key.subkey(name)
+                    except Registry.RegistryKeyNotFoundException:
+                        continue
+                    index[upname] = (subkey, [child])
+                    matched.append(upname)
+            return [(index[upname][0], _closure(index[upname][1])) for upname in matched]
+
+        children = []
+        for nk in key._nkrecord.subkey_list().keys():
+            upname = RegistryParse.upcase_name(nk.name())
+            subnodes = []
+            for node in nodes:
+                if node.recursive:
+                    subnodes.append(node)
+                child = node.literals.get(upname)
+                if child is not None:
+                    subnodes.append(child[1])
+                for pattern, child in node.globs:
+                    if fnmatchcase(upname, pattern):
+                        subnodes.append(child)
+            if subnodes:
+                children.append((Registry.RegistryKey(nk, key._registry), _closure(subnodes)))
+        return children
+
+
+def _decode(value, decoder):
+    """
+    Get the data of a RegistryValue, decoded, or None if it does not exist
+    or cannot be read or decoded.
+    """
+    if value is None:
+        return None
+    try:
+        data = value.value()
+        if decoder is not None:
+            data = decoder(data)
+    except (RegistryParse.RegistryException, ValueError, TypeError, OverflowError, struct.error):
+        return None
+    return data
+
+
+def _records(key, path, artifacts):
+    """
+    A generator that yields the records of the given artifacts for a matched key.
+    """
+    last_written = key.raw_timestamp()
+    values = None
+    for artifact in artifacts:
+        if artifact.per_value:
+            decoder = artifact.fields[0].decoder if artifact.fields else None
+            for value in key.values():
+                yield artifact.record_type(path, last_written, value.name(), _decode(value, decoder))
+            continue
+
+        if values is None:
+            values = key.values_dict()
+        fields = []
+        for field in artifact.fields:
+            (subkey_path, _, name) = field.value.rpartition("\\")
+            if name == "(default)":
+                name = ""
+            if subkey_path:
+                try:
+                    value = key.find_key(subkey_path).value(name)
+                except RegistryParse.RegistryStructureDoesNotExist:
+                    value = None
+            else:
+                value = values.get(name.lower())
+            fields.append(_decode(value, field.decoder))
+        yield artifact.record_type(path, last_written, *fields)
+
+
+_RUN_KEYS = ["Microsoft\\Windows\\CurrentVersion\\Run",
+             "Microsoft\\Windows\\CurrentVersion\\RunOnce",
+             "Wow6432Node\\Microsoft\\Windows\\CurrentVersion\\Run",
+             "Wow6432Node\\Microsoft\\Windows\\CurrentVersion\\RunOnce"]
+
+# Artifacts gathered from the sample scripts.
+ARTIFACTS = [
+    Artifact("ComputerName", [HiveType.SYSTEM],
+             "CurrentControlSet\\Control\\ComputerName\\ComputerName", ["ComputerName"]),
+    Artifact("Environment", [HiveType.SYSTEM],
+             "CurrentControlSet\\Control\\Session Manager\\Environment",
+             ["PROCESSOR_ARCHITECTURE", "NUMBER_OF_PROCESSORS", "TEMP", "TMP", "windir"]),
+    Artifact("TimeZone", [HiveType.SYSTEM],
+             "CurrentControlSet\\Control\\TimeZoneInformation",
+             ["ActiveTimeBias", "Bias", "TimeZoneKeyName"]),
+    Artifact("Service", [HiveType.SYSTEM], "CurrentControlSet\\Services\\*",
+             ["DisplayName", "ImagePath", "Start", "Type", "Description",
+              Field("ServiceDll", "Parameters\\ServiceDll")]),
+    Artifact("NetworkInterface", [HiveType.SYSTEM],
+             "CurrentControlSet\\Services\\Tcpip\\Parameters\\Interfaces\\*",
+             ["EnableDHCP", "IPAddress", "DhcpIPAddress", "DhcpServer", "DhcpDomain",
+              Field("LeaseObtainedTime", decoder=unix_timestamp)]),
+    Artifact("USBStorage", [HiveType.SYSTEM], "CurrentControlSet\\Enum\\USBSTOR\\*\\*",
+             ["FriendlyName"]),
+    Artifact("OperatingSystem", [HiveType.SOFTWARE], "Microsoft\\Windows NT\\CurrentVersion",
+             ["ProductName", "ProductId", "CSDVersion", "CurrentBuild", "PathName",
+              Field("InstallDate", decoder=unix_timestamp),
+              "RegisteredOrganization", "RegisteredOwner"]),
+    Artifact("Profile", [HiveType.SOFTWARE], "Microsoft\\Windows NT\\CurrentVersion\\ProfileList\\*",
+             ["ProfileImagePath"]),
+    Artifact("InstalledProgram", [HiveType.SOFTWARE],
+             ["Microsoft\\Windows\\CurrentVersion\\Uninstall\\*",
+              "Wow6432Node\\Microsoft\\Windows\\CurrentVersion\\Uninstall\\*"],
+             ["DisplayName", "DisplayVersion", "Publisher", "InstallDate", "InstallLocation"]),
+    Artifact("Autorun", [HiveType.SOFTWARE], _RUN_KEYS, per_value=True),
+    Artifact("UserAutorun", [HiveType.NTUSER], ["Software\\" + path for path in _RUN_KEYS], per_value=True),
+    Artifact("ShellBag", [HiveType.NTUSER, HiveType.USRCLASS],
+             ["Software\\Microsoft\\Windows\\ShellNoRoam\\BagMRU\\**",
+              "Software\\Microsoft\\Windows\\Shell\\BagMRU\\**",
+              "Local Settings\\Software\\Microsoft\\Windows\\Shell\\BagMRU\\**"],
+             [Field("NodeSlot"), Field("MRUListEx")]),
+]
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Extract forensic artifacts from Windows Registry hives.")
+    parser.add_argument("--logs", action="store_true", help="Recover hives from their .LOG1/.LOG2 files")
+    parser.add_argument("hives", nargs="+", help="Paths of the hives")
+    args = parser.parse_args()
+
+    extractor = Extractor(ARTIFACTS)
+    for path in args.hives:
+        if args.logs:
+            reg = Registry.Registry.open_with_logs(path, mmap=True)
+        else:
+            reg = Registry.Registry(path, mmap=True)
+        with reg:
+            for record in extractor.extract(reg):
+                fields = dict(record._asdict(), artifact=type(record).__name__, hive=path)
+                print(json.dumps(fields, default=repr))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+#!/bin/python
+
+#    This file is part of python-registry.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+Run the same function over many hives in a pool of processes.
+
+    from Registry import RegistryBatch
+
+    def count_keys(reg):
+        return sum(1 for _ in reg.walk())
+
+    batch = RegistryBatch.Batch(count_keys, workers=8)
+    for result in batch.run(paths):
+        if result.error is None:
+            print(result.path, result.result)
+    print(batch.stats())
+
+The function must be defined at the top level of a module so that it can
+be sent to the worker processes, and so must its results.
+
+A single large hive can be walked in parallel too. The tree is split at a
+given depth, and the subtrees below it are walked by the workers:
+
+    def run_keys(entry):
+        if entry.path.endswith("\\Run"):
+            return entry.path
+
+    for path in RegistryBatch.walk_parallel("SOFTWARE", run_keys, split_depth=2):
+        print(path)
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import traceback
+import multiprocessing
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from . import Registry
+
+BatchResult = namedtuple("BatchResult", ["index", "path", "result", "error", "elapsed"])
+BatchStats = namedtuple("BatchStats", ["hives", "failed", "elapsed", "hives_per_second",
+                                       "mean_latency", "max_latency"])
+
+
+def summarize(reg):
+    """
+    A built-in function for Batch: the hive name and type, the number of
+    keys and values, and the latest key timestamp as a raw FILETIME.
+    """
+    keys = 0
+    values = 0
+    last_written = 0
+    for entry in reg.walk():
+        keys += 1
+        values += entry.key.values_number()
+        last_written = max(last_written, entry.key.raw_timestamp())
+    return {
+        "hive_name": reg.hive_name(),
+        "hive_type": reg.hive_type().value,
+        "keys": keys,
+        "values": values,
+        "last_written": last_written,
+    }
+
+
+def _open(path, mmap, logs):
+    if logs:
+        return Registry.Registry.open_with_logs(path, mmap=mmap)
+    return Registry.Registry(path, mmap=mmap)
+
+
+def _process_chunk(function, chunk, mmap, logs):
+    """
+    Run `function` over the hives of a chunk of (index, path) tuples in a
+    worker process. Errors are caught for each hive on its own.
+    """
+    results = []
+    for index, path in chunk:
+        start = time.time()
+        try:
+            reg = _open(path, mmap, logs)
+            try:
+                result = function(reg)
+            finally:
+                reg.close()
+            error = None
+        except Exception:
+            result = None
+            error = traceback.format_exc()
+        results.append(BatchResult(index, path, result, error, time.time() - start))
+    return results
+
+
+class Batch(object):
+    """
+    Run a function over many hives with a concurrent.futures.ProcessPoolExecutor,
+    and yield the results as they become available.
+    """
+    def __init__(self, function, workers=None, chunksize=1, ordered=False, mmap=False, logs=False):
+        """
+        Constructor.
+        Arguments:
+        - `function`: A callable that receives a Registry and returns a result.
+              Both must be picklable; the callable must be a top level function.
+        - `workers`: The number of worker processes. Defaults to the number of CPUs.
+        - `chunksize`: The number of hives sent to a worker at once. Larger chunks
+              cost less overhead for many small hives.
+        - `ordered`: If True, results are yielded in the order of the paths,
+              otherwise as soon as they are done.
+        - `mmap`: If True, the hives are memory mapped. See Registry.
+        - `logs`: If True, the hives are recovered from the transaction log
+              files next to them. See Registry.open_with_logs().
+        """
+        self._function = function
+        self._workers = workers or multiprocessing.cpu_count()
+        self._chunksize = max(1, chunksize)
+        self._ordered = ordered
+        self._mmap = mmap
+        self._logs = logs
+        self._hives = 0
+        self._failed = 0
+        self._latencies = []
+        self._start = None
+        self._end = None
+
+    def _chunks(self, paths):
+        chunk = []
+        for item in enumerate(paths):
+            chunk.append(item)
+            if len(chunk) == self._chunksize:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _results(self, future, chunk):
+        try:
+            results = future.result()
+        except Exception:
+            # the worker died, or the results could not be sent back
+            error = traceback.format_exc()
+            results = [BatchResult(index, path, None, error, 0.0) for index, path in chunk]
+        for result in results:
+            self._hives += 1
+            if result.error is not None:
+                self._failed += 1
+            self._latencies.append(result.elapsed)
+        self._end = time.time()
+        return results
+
+    def _next_done(self, pending):
+        if self._ordered:
+            return pending.popleft()
+        done, _ = wait([future for future, _ in pending], return_when=FIRST_COMPLETED)
+        for item in pending:
+            if item[0] in done:
+                pending.remove(item)
+                return item
+
+    def run(self, paths):
+        """
+        A generator that yields a BatchResult for each of the hive paths:
+        its position in `paths`, its path, the result of the function, the
+        formatted traceback if opening the hive or the function failed (and
+        the result is None), and the seconds spent on the hive.
+        """
+        self._start = self._start or time.time()
+        window = self._workers * 2
+        with ProcessPoolExecutor(max_workers=self._workers) as executor:
+            pending = deque()
+            for chunk in self._chunks(paths):
+                future = executor.submit(_process_chunk, self._function, chunk, self._mmap, self._logs)
+                pending.append((future, chunk))
+                while len(pending) >= window:
+                    for result in self._results(*self._next_done(pending)):
+                        yield result
+            while pending:
+                for result in self._results(*self._next_done(pending)):
+                    yield result
+
+    def stats(self):
+        """
+        Get a BatchStats tuple for the hives processed so far: the number of
+        hives and of failures, the seconds since the first run() started,
+        the throughput, and the mean and maximum seconds spent on a hive.
+        """
+        elapsed = (self._end or time.time()) - self._start if self._start else 0.0
+        latencies = self._latencies
+        return BatchStats(self._hives, self._failed, elapsed,
+                          self._hives / elapsed if elapsed > 0 else 0.0,
+                          sum(latencies) / len(latencies) if latencies else 0.0,
+                          max(latencies) if latencies else 0.0)
+
+
+def run(function, paths, **kwargs):
+    """
+    Run `function` over the hives at `paths`, see Batch, and yield the
+    BatchResults.
+    """
+    return Batch(function, **kwargs).run(paths)
+
+
+# The hives opened by _walk_chunk() in this process, by (path, mmap, logs),
+# kept open for the life of the worker. They are private to the workers, so
+# that a hive inherited from the parent, or opened with other options, is
+# never walked in their place.
+_walk_hives = {}
+
+
+def _walk_chunk(path, mmap, logs, function, units, prune, max_depth, values):
+    """
+    Walk the subtrees of a chunk of work units in a worker process, and
+    return the results of `function` that are not None, in walk order.
+    Each unit is the offset of the NKRecord at the top of a subtree, the
+    path of its parent key, its depth, and the offsets of its ancestors.
+    """
+    hive = (os.path.abspath(path), mmap, logs)
+    reg = _walk_hives.get(hive)
+    if reg is None:
+        reg = _walk_hives[hive] = _open(path, mmap, logs)
+    results = []
+    for offset, parent_path, depth, ancestors in units:
+        key = reg.key_at(offset)
+        for entry in key._walk(parent_path + "\\" + key.name(), depth, ancestors,
+                               prune, max_depth, "pre", values):
+            result = function(entry)
+            if result is not None:
+                results.append(result)
+    return results
+
+
+def walk_parallel(path, function, split_depth=1, start=None, prune=None, max_depth=None,
+                  values=False, workers=None, chunksize=1, mmap=True, logs=False):
+    """
+    A generator that walks a single hive with a pool of processes, and yields
+    the results of `function` for its keys in the order of Registry.walk().
+    The keys down to `split_depth` are walked here. The subtrees of the keys at
+    `split_depth` are sent to the workers as the offsets of their NKRecords,
+    read from the subkey lists without parsing the keys, and each worker opens
+    the hive once, with the same options, and walks the subtrees it is given.
+    Arguments:
+    - `path`: The filename of the hive.
+    - `function`: A callable that receives each WalkEntry. Results that are
+          None are dropped, so that it may also filter the keys. Both must
+          be picklable; the callable must be a top level function.
+    - `split_depth`: The depth, below the starting key, of the subtrees sent
+          to the workers. 1 splits at the subkeys of the starting key.
+    - `start`: The path of the key to start from, for example "Classes".
+          Defaults to the root key.
+    - `prune`, `max_depth`, `values`: As for Registry.walk(). `prune` must be
+          a top level function too.
+    - `workers`, `chunksize`, `mmap`, `logs`: As for Batch, except that
+          `chunksize` counts subtrees.
+    """
+    if split_depth < 1:
+        raise ValueError("split_depth must be at least 1")
+    workers = workers or multiprocessing.cpu_count()
+    chunksize = max(1, chunksize)
+    window = workers * 2
+    split = max_depth is None or split_depth <= max_depth
+    top_depth = split_depth - 1 if max_depth is None else min(split_depth - 1, max_depth)
+
+    reg = _open(path, mmap, logs)
+    try:
+        key = reg.open(start) if start else reg.root()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # the results of the keys walked here, and the futures of the
+            # chunks sent to the workers, in walk order
+            pending = deque()
+            submitted = 0
+            chunk = []
+            ancestors = []
+            for entry in key._walk(key.path(), 0, (), prune, top_depth, "pre", values):
+                del ancestors[entry.depth:]
+                ancestors.append(entry.key._nkrecord.offset())
+
+                result = function(entry)
+                if result is not None:
+                    pending.append([result])
+                if split and entry.depth == split_depth - 1 and entry.key.subkeys_number() > 0:
+                    for offset in entry.key._nkrecord.subkey_list().key_offsets():
+                        if offset in ancestors:
+                            continue
+                        chunk.append((offset, entry.path, split_depth, tuple(ancestors)))
+                        if len(chunk) == chunksize:
+                            pending.append(executor.submit(_walk_chunk, path, mmap, logs, function,
+                                                           chunk, prune, max_depth, values))
+                            submitted += 1
+                            chunk = []
+                if chunk:
+                    pending.append(executor.submit(_walk_chunk, path, mmap, logs, function,
+                                                   chunk, prune, max_depth, values))
+                    submitted += 1
+                    chunk = []
+
+                while pending and (submitted >= window or isinstance(pending[0], list)):
+                    item = pending.popleft()
+                    if not isinstance(item, list):
+                        submitted -= 1
+                        item = item.result()
+                    for result in item:
+                        yield result
+
+            while pending:
+                item = pending.popleft()
+                for result in (item if isinstance(item, list) else item.result()):
+                    yield result
+    finally:
+        reg.close()
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Summarize many Windows Registry hives in parallel.")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--chunksize", type=int, default=1, help="Hives sent to a worker at once")
+    parser.add_argument("--logs", action="store_true", help="Recover hives from their .LOG1/.LOG2 files")
+    parser.add_argument("hives", nargs="+", help="Paths of the hives")
+    args = parser.parse_args()
+
+    batch = Batch(summarize, workers=args.workers, chunksize=args.chunksize, mmap=True, logs=args.logs)
+    for result in batch.run(args.hives):
+        if result.error is None:
+            print(json.dumps(dict(result.result, path=result.path)))
+        else:
+            print("%s: %s" % (result.path, result.error.strip().splitlines()[-1]), file=sys.stderr)
+    print(batch.stats(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/bin/python
+
+#    This file is part of python-registry.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+A sidecar index of the keys of a hive, stored next to it, so that paths can
+be opened and the tree walked without parsing subkey lists and names again.
+
+The index is written by Registry.build_index(), and loaded by Registry when
+it opens a hive whose index file exists and was built for the same
+contents, as identified by the checksum, sequence numbers and size of the
+hive. Its layout, all little endian:
+
+- header: magic, version, hive checksum, sequence numbers and size,
+      the number of keys, and the offsets of the following tables;
+- keys: one entry per key, in the order of a pre-order walk from the root,
+      with its NKRecord and parent offsets, its depth, the position after
+      its subtree, the offset and size of its value list, and its path;
+- paths: (hash of the upper case path, position) pairs, sorted;
+- offsets: (NKRecord offset, position) pairs, sorted;
+- strings: the UTF-8 full paths of the keys.
+"""
+import io
+import mmap
+import zlib
+import struct
+from collections import namedtuple
+
+from . import RegistryParse
+
+INDEX_SUFFIX = ".regidx"
+INDEX_MAGIC = b"regfidx\x00"
+INDEX_VERSION = 1
+
+_HEADER = struct.Struct(str("<8sIIIIQQQQQQ"))
+_KEY = struct.Struct(str("<IIIIIIII"))
+_PAIR = struct.Struct(str("<II"))
+
+_NO_PARENT = 0xFFFFFFFF
+
+IndexEntry = namedtuple("IndexEntry", ["offset", "parent_offset", "depth", "end",
+                                       "values_offset", "values_number", "path"])
+
+
+def index_path(filename):
+    """
+    Get the filename of the sidecar index of a hive.
+    """
+    return filename + INDEX_SUFFIX
+
+
+def path_hash(path):
+    """
+    Get the hash of a key path relative to the root key, compared case-insensitively.
+    """
+    return zlib.crc32(RegistryParse.upcase_name(path).encode("utf-8")) & 0xFFFFFFFF
+
+
+def hive_identity(regf, size):
+    """
+    Get the (checksum, sequence1, sequence2, size) tuple that an index
+    must have been built for to be used with a hive.
+    """
+    return (regf.checksum(), regf.hive_sequence1(), regf.hive_sequence2(), size)
+
+
+def write_index(f, identity, entries):
+    """
+    Write an index to a file object open for writing in binary mode.
+    Arguments:
+    - `identity`: The hive_identity() of the hive.
+    - `entries`: A list of IndexEntry for the keys of the hive, in pre-order,
+          the root key first. `end` is the position of the first entry after
+          the subtree of the key, and `path` its full path.
+    """
+    count = len(entries)
+    keys_offset = _HEADER.size
+    paths_offset = keys_offset + count * _KEY.size
+    offsets_offset = paths_offset + count * _PAIR.size
+    strings_offset = offsets_offset + count * _PAIR.size
+
+    strings = io.BytesIO()
+    keys = bytearray()
+    hashes = []
+    root_length = len(entries[0].path) + 1 if entries else 0
+    for position, entry in enumerate(entries):
+        path = entry.path.encode("utf-8")
+        keys += _KEY.pack(entry.offset,
+                          _NO_PARENT if entry.parent_offset is None else entry.parent_offset,
+                          entry.depth, entry.end, entry.values_offset, entry.values_number,
+                          strings.tell(), len(path))
+        strings.write(path)
+        hashes.append((path_hash(entry.path[root_length:]), position))
+
+    (checksum, sequence1, sequence2, size) = identity
+    f.write(_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, checksum, sequence1, sequence2, size,
+                         count, keys_offset, paths_offset, offsets_offset, strings_offset))
+    f.write(keys)
+    f.write(b"".join(_PAIR.pack(*pair) for pair in sorted(hashes)))
+    f.write(b"".join(_PAIR.pack(entry.offset, position)
+                     for position, entry in sorted(enumerate(entries), key=lambda e: e[1].offset)))
+    f.write(strings.getvalue())
+
+
+class HiveIndex(object):
+    """
+    A read-only view of a sidecar index, memory mapped.
+    """
+    def __init__(self, buf):
+        """
+        Constructor.
+        Arguments:
+        - `buf`: The contents of the index file.
+        Raises RegistryParse.ParseException if it is not a valid index.
+        """
+        if len(buf) < _HEADER.size:
+            raise RegistryParse.ParseException("Truncated registry index")
+        (magic, version, checksum, sequence1, sequence2, size, count,
+         self._keys, self._paths, self._offsets, self._strings) = _HEADER.unpack_from(buf, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise RegistryParse.ParseException("Invalid registry index")
+        if self._strings > len(buf) or self._keys + count * _KEY.size > self._paths:
+            raise RegistryParse.ParseException("Truncated registry index")
+        self._buf = buf
+        self._count = count
+        self._identity = (checksum, sequence1, sequence2, size)
+        self._root_length = len(self.path(0)) + 1 if count else 0
+
+    @classmethod
+    def load(cls, filename, identity):
+        """
+        Map the index at `filename`, and return it if it was built for a hive
+        with the given hive_identity(), or None if it is missing or does not match.
+        """
+        try:
+            with open(filename, "rb") as f:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError):
+            return None
+        try:
+            index = cls(buf)
+        except RegistryParse.ParseException:
+            buf.close()
+            return None
+        if index.identity() != identity:
+            buf.close()
+            return None
+        return index
+
+    def close(self):
+        if hasattr(self._buf, "close"):
+            self._buf.close()
+
+    def __len__(self):
+        return self._count
+
+    def identity(self):
+        """
+        Get the hive_identity() of the hive this index was built for.
+        """
+        return self._identity
+
+    def _key(self, position):
+        return _KEY.unpack_from(self._buf, self._keys + position * _KEY.size)
+
+    def offset(self, position):
+        """
+        Get the offset of the NKRecord of the key at the given position.
+        """
+        return self._key(position)[0]
+
+    def depth(self, position):
+        return self._key(position)[2]
+
+    def end(self, position):
+        """
+        Get the position after the subtree of the key at the given position.
+        """
+        return self._key(position)[3]
+
+    def path(self, position):
+        """
+        Get the full path of the key at the given position.
+        """
+        key = self._key(position)
+        return self._buf[self._strings + key[6]:self._strings + key[6] + key[7]].decode("utf-8")
+
+    def entry(self, position):
+        """
+        Get the IndexEntry of the key at the given position.
+        """
+        (offset, parent_offset, depth, end, values_offset, values_number, start, length) = \
+            self._key(position)
+        path = self._buf[self._strings + start:self._strings + start + length].decode("utf-8")
+        return IndexEntry(offset, None if parent_offset == _NO_PARENT else parent_offset,
+                          depth, end, values_offset, values_number, path)
+
+    def entries(self):
+        """
+        A generator that yields the IndexEntry of each key, in pre-order.
+        """
+        for position in range(self._count):
+            yield self.entry(position)
+
+    def _bisect(self, table, value):
+        """
+        Get the position of the first pair of a sorted table not smaller than (value, 0).
+        """
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _PAIR.unpack_from(self._buf, table + mid * _PAIR.size)[0] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def position(self, offset):
+        """
+        Get the position of the key whose NKRecord is at the given offset, or None.
+        """
+        i = self._bisect(self._offsets, offset)
+        if i < self._count:
+            (found, position) = _PAIR.unpack_from(self._buf, self._offsets + i * _PAIR.size)
+            if found == offset:
+                return position
+        return None
+
+    def relative_path(self, position):
+        """
+        Get the path of the key at the given position, relative to the root key.
+        """
+        return self.path(position)[self._root_length:]
+
+    def find(self, path):
+        """
+        Get the position of the key with the given path relative to the root
+        key, compared case-insensitively, or None.
+        """
+        upath = RegistryParse.upcase_name(path)
+        value = path_hash(path)
+        i = self._bisect(self._paths, value)
+        while i < self._count:
+            (found, position) = _PAIR.unpack_from(self._buf, self._paths + i * _PAIR.size)
+            if found != value:
+                break
+            if RegistryParse.upcase_name(self.relative_path(position)) == upath:
+                return position
+            i += 1
+        return None
@@ -18,15 +18,25 @@
 #   limitations under the License.
 from __future__ import print_function
 
+import io
+import os
+from bisect import bisect_left, bisect_right
 from ctypes import c_uint32
 from struct import pack
+from collections import namedtuple
 from . import RegistryParse
 
+# The number of buffers passed to a single os.pwritev call.
+PWRITEV_BUFFERS = 1024
+
+DirtyPageStats = namedtuple("DirtyPageStats", ["pages", "unique_pages", "superseded_pages",
+                                               "runs", "writes", "bytes_written"])
+
 class RegistryLog(object):
     """
     A class for parsing and applying a Windows Registry transaction log file.
     """
-    def __init__(self, filelikeobject_primary, filelikeobject_log):
+    def __init__(self, filelikeobject_primary, filelikeobject_log, dirty_pages=None):
         """
         Constructor.
         Arguments:
@@ -35,6 +45,10 @@ class RegistryLog(object):
         - `filelikeobject_log`: A file-like object with a .read() method.
               If a Python string is passed, it is interpreted as a filename,
               and the corresponding file is opened.
+        - `dirty_pages`: A DirtyPages object. If given, dirty pages are added
+              to it instead of being written to the primary file one by one,
+              and it must be written to the primary file after the recovery.
+              The REGF block is still updated directly.
         """
         try:
             self._log_buf = filelikeobject_log.read()
@@ -64,6 +78,7 @@ class RegistryLog(object):
         self._primary = filelikeobject_primary
 
         self._primary_regf = RegistryParse.REGFBlock(self._primary_buf, 0, False)
+        self._dirty_pages = dirty_pages
         self._hive_flags = None
         self._hive_sequence = None
         self._hbins_size = None
@@ -125,6 +140,9 @@ class RegistryLog(object):
         offset_primary = dirty_page_reference.offset() + self._primary_regf.first_hbin_offset()
         size = dirty_page_reference.size()
         dirty_data = dirty_page.data()
+        if self._dirty_pages is not None:
+            self._dirty_pages.add(offset_primary, dirty_data)
+            return
         self._primary.seek(offset_primary)
         self._primary.write(dirty_data)
 
@@ -171,6 +189,22 @@ class RegistryLog(object):
             self.reload_primary_regf()
 
         if recover.recover_data:
+            return self.apply_log_entries()
+
+    def apply_log_entries(self):
+        """
+        Write the dirty pages of all valid log entries to the primary file,
+        then update its REGF block. Unless a DirtyPages object was given to
+        the constructor, the pages are collected and written once all log
+        entries are read, see DirtyPages.
+        Returns the sequence number of the last log entry applied or None.
+        """
+        collect = self._dirty_pages is None
+        if collect:
+            self._dirty_pages = DirtyPages()
+
+        log_entry = None
+        try:
             for log_entry in self._regf.log_entries():
                 for dirty_page_reference, dirty_page in log_entry.dirty_pages_with_references():
                     self.write_dirty_page(dirty_page_reference, dirty_page)
@@ -178,9 +212,16 @@ class RegistryLog(object):
                 self._hive_flags = log_entry.hive_flags()
                 self._hive_sequence = log_entry.sequence()
                 self._hbins_size = log_entry.hbins_size()
+        finally:
+            if collect:
+                dirty_pages, self._dirty_pages = self._dirty_pages, None
+                dirty_pages.write_to(self._primary)
+
+        if log_entry is None:
+            return None
 
-            self.update_regf_header(self.latest_hive_sequence(), self.latest_hbins_size(), self.latest_hive_flags())
-            return log_entry.sequence()
+        self.update_regf_header(self.latest_hive_sequence(), self.latest_hbins_size(), self.latest_hive_flags())
+        return log_entry.sequence()
 
     def recover_hive_continue(self, expected_sequence):
         """
@@ -190,13 +231,197 @@ class RegistryLog(object):
         if expected_sequence != self._regf.hive_sequence2():
             return None
 
-        for log_entry in self._regf.log_entries():
-            for dirty_page_reference, dirty_page in log_entry.dirty_pages_with_references():
-                self.write_dirty_page(dirty_page_reference, dirty_page)
+        return self.apply_log_entries()
 
-            self._hive_flags = log_entry.hive_flags()
-            self._hive_sequence = log_entry.sequence()
-            self._hbins_size = log_entry.hbins_size()
 
-        self.update_regf_header(self.latest_hive_sequence(), self.latest_hbins_size(), self.latest_hive_flags())
-        return log_entry.sequence()
+class DirtyPages(object):
+    """
+    Dirty pages collected from the log entries of one or more transaction
+    log files, to be written to the primary file in a single pass.
+    The pages are merged into a map of byte ranges as they are added: a
+    page replaces the bytes of the earlier pages it overlaps, which are
+    trimmed or split, so a page rewritten by many log entries is written
+    once. Ranges are written in offset order, and each run of adjacent
+    ranges is joined into one write.
+    """
+    def __init__(self):
+        # sorted, non-overlapping (offset, page number, data) ranges
+        self._ranges = []
+        self._starts = []
+        self._count = 0
+        self._writes = 0
+        self._bytes_written = 0
+
+    def __len__(self):
+        """
+        Get the number of distinct ranges, pages or the parts of them not
+        replaced by a later page.
+        """
+        return len(self._ranges)
+
+    def add(self, offset, data):
+        """
+        Add a dirty page.
+        Arguments:
+        - `offset`: The absolute offset of the page in the primary file.
+        - `data`: The contents of the page.
+        """
+        end = offset + len(data)
+        first = bisect_right(self._starts, offset)
+        if first > 0:
+            (start, _, previous) = self._ranges[first - 1]
+            if start + len(previous) > offset:
+                first -= 1
+        last = bisect_left(self._starts, end)
+
+        replacement = []
+        if first < last:
+            (start, number, previous) = self._ranges[first]
+            if start < offset:
+                replacement.append((start, number, previous[:offset - start]))
+        replacement.append((offset, self._count, data))
+        if first < last:
+            (start, number, previous) = self._ranges[last - 1]
+            if start + len(previous) > end:
+                replacement.append((end, number, previous[end - start:]))
+
+        self._ranges[first:last] = replacement
+        self._starts[first:last] = [r[0] for r in replacement]
+        self._count += 1
+
+    def end(self):
+        """
+        Get the offset just past the last dirty page, or 0 if there are none.
+        """
+        if not self._ranges:
+            return 0
+        (offset, _, data) = self._ranges[-1]
+        return offset + len(data)
+
+    def runs(self):
+        """
+        Get a list of (offset, [data, ...]) tuples, sorted by offset, each
+        listing ranges that directly follow one another.
+        """
+        runs = []
+        end = None
+        for offset, _, data in self._ranges:
+            if offset == end:
+                runs[-1][1].append(data)
+            else:
+                runs.append((offset, [data]))
+            end = offset + len(data)
+        return runs
+
+    def write_to(self, target):
+        """
+        Write the dirty pages to the primary file, and return the statistics.
+        Arguments:
+        - `target`: A file-like object with .seek() and .write() methods.
+              For a file descriptor or an unbuffered file (io.FileIO),
+              each run is written with os.pwritev, where available,
+              without joining its pages first.
+        """
+        fd = None
+        if hasattr(os, "pwritev"):
+            if isinstance(target, int):
+                fd = target
+            elif isinstance(target, io.FileIO):
+                fd = target.fileno()
+
+        for offset, datas in self.runs():
+            if fd is not None:
+                self._pwritev(fd, offset, datas)
+            else:
+                data = b"".join(datas)
+                target.seek(offset)
+                target.write(data)
+                self._writes += 1
+                self._bytes_written += len(data)
+        return self.stats()
+
+    def _pwritev(self, fd, offset, datas):
+        for i in range(0, len(datas), PWRITEV_BUFFERS):
+            buffers = datas[i:i + PWRITEV_BUFFERS]
+            size = sum(len(data) for data in buffers)
+            written = os.pwritev(fd, buffers, offset)
+            self._writes += 1
+            while written < size:
+                # short write, write out the rest of this batch
+                rest = b"".join(buffers)[written:]
+                written += os.pwrite(fd, rest, offset + written)
+                self._writes += 1
+            self._bytes_written += size
+            offset += size
+
+    def stats(self):
+        """
+        Get a DirtyPageStats tuple with the number of pages added, the number
+        of pages with some bytes left to write, the number of pages entirely
+        replaced by later ones, the number of runs of adjacent ranges, and
+        the number of writes made and bytes written so far.
+        """
+        unique = len(set(number for _, number, _ in self._ranges))
+        return DirtyPageStats(self._count, unique, self._count - unique,
+                              len(self.runs()), self._writes, self._bytes_written)
+
+
+def apply_logs(filelikeobject_primary, filelikeobjects_log, dirty_pages=None, skip_unsupported=False):
+    """
+    Recover a primary file from its transaction log files, as Windows does
+    when it loads a hive. Logs that are not eligible for the primary file
+    are skipped. When the dual-logging scheme is used and both logs are
+    eligible, they are applied in the order given by is_starting_log().
+    Arguments:
+    - `filelikeobject_primary`: A file-like object with .read(), .write() and .seek()
+          methods, as for RegistryLog. It receives the contents of the recovered hive.
+    - `filelikeobjects_log`: A list of one or two file-like objects or filenames
+          of the transaction log files (.LOG1 and .LOG2).
+    - `dirty_pages`: A DirtyPages object to collect the dirty pages in, see RegistryLog.
+          If None, the dirty pages of all logs are collected and written at the end.
+    - `skip_unsupported`: If True, log files that RegistryLog cannot load, such as
+          old format logs, are skipped instead of raising an exception.
+    Returns the sequence number of the last log entry applied or None.
+    """
+    pages = DirtyPages() if dirty_pages is None else dirty_pages
+    logs = []
+    for filelikeobject_log in filelikeobjects_log:
+        filelikeobject_primary.seek(0)
+        try:
+            logs.append(RegistryLog(filelikeobject_primary, filelikeobject_log, pages))
+        except (RegistryParse.NotSupportedException, RegistryParse.ParseException):
+            if not skip_unsupported:
+                raise
+
+    sequence = _apply_eligible_logs(filelikeobject_primary, logs)
+    if dirty_pages is None:
+        pages.write_to(filelikeobject_primary)
+    return sequence
+
+
+def _apply_eligible_logs(filelikeobject_primary, logs):
+    """
+    Apply those of the RegistryLogs `logs` that are eligible, in order.
+    See apply_logs().
+    """
+    filelikeobject_primary.seek(0)
+    recover = RegistryParse.REGFBlock(filelikeobject_primary.read(512), 0, False).recovery_required()
+    if not (recover.recover_header or recover.recover_data):
+        return None
+
+    logs = [log for log in logs if log.is_eligible_log()]
+    if len(logs) == 1:
+        return logs[0].recover_hive()
+    elif len(logs) == 2:
+        first, second = logs
+        if not first.is_starting_log(second):
+            first, second = second, first
+
+        if recover.recover_header:
+            return second.recover_hive()
+
+        sequence = first.recover_hive()
+        if sequence is None:
+            return None
+        return second.recover_hive_continue(sequence + 1) or sequence
+    return None
@@ -21,8 +21,10 @@
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import io
+import bisect
 import struct
-from datetime import datetime
+from datetime import datetime, timedelta
 import binascii
 from ctypes import c_uint32
 from enum import Enum
@@ -43,6 +45,14 @@ RegFullResourceDescriptor = 0x0009
 RegResourceRequirementsList = 0x000A
 RegFileTime = 0x0010
 
+# Value types whose data raw_data() returns as stored, at any length.
+_EXTENT_TYPES = (RegSZ, RegExpandSZ, RegBin, RegNone, RegMultiSZ, RegLink, RegResourceList,
+                 RegFullResourceDescriptor, RegResourceRequirementsList)
+
+# The first HBINBlock always directly follows the 4k REGF block.
+# Offsets stored in HBIN cells are relative to it.
+HBIN_BASE_OFFSET = 0x1000
+
 # Constants to support the transaction log files (new format)
 LOG_ENTRY_SIZE_HEADER = 40
 LOG_ENTRY_SIZE_ALIGNMENT = 0x200
@@ -57,12 +67,120 @@ class FileType(Enum):
 # see: http://msdn.microsoft.com/en-us/library/windows/hardware/ff543550%28v=vs.85%29.aspx
 DEVPROP_MASK_TYPE = 0x00000FFF
 
+# Precompiled structures, shared by all blocks.
+_WORD = struct.Struct(str("<H"))
+_DWORD = struct.Struct(str("<I"))
+_INT = struct.Struct(str("<i"))
+_QWORD = struct.Struct(str("<Q"))
+
+# The fixed part of an NKRecord, up to the key name at 0x4C:
+# id, flags, timestamp, access bits, parent key offset, subkey number,
+# volatile subkey number, subkey list offset, volatile subkey list offset,
+# values number, values list offset, SK record offset, classname offset,
+# five words of maximum sizes and work variables, name length, classname length.
+_NK_HEADER = struct.Struct(str("<2sHQ15IHH"))
+
+# The fixed part of a VKRecord, up to the value name at 0x14:
+# id, name length, data length, data offset, data type, flags, spare.
+_VK_HEADER = struct.Struct(str("<2sHIIIHH"))
+
 # This named tuple describes the recovery operations to be performed on a hive.
 RecoveryStatus = namedtuple('RecoveryStatus', ['recover_header', 'recover_data'])
 
+# A FILETIME counts 100 nanosecond intervals since 1601-01-01 UTC.
+WINDOWS_EPOCH = datetime(1601, 1, 1)
+WINDOWS_EPOCH_TO_UNIX_EPOCH = 116444736000000000
+
+# FILETIME intervals per unit of the epoch values returned below.
+_EPOCH_UNITS = {"s": 10000000, "ms": 10000, "us": 10}
+
+
 def parse_windows_timestamp(qword):
-    # see http://integriography.wordpress.com/2010/01/16/using-phython-to-parse-and-present-windows-64-bit-timestamps/
-    return datetime.utcfromtimestamp(float(qword) * 1e-7 - 11644473600 )
+    """
+    Convert a FILETIME to a naive UTC Python datetime, exactly, truncated
+    to whole microseconds. Raise ValueError if it is past year 9999.
+    """
+    try:
+        return WINDOWS_EPOCH + timedelta(microseconds=int(qword) // 10)
+    except OverflowError:
+        raise ValueError("Windows timestamp out of range: 0x%x" % (qword))
+
+
+def windows_timestamp_to_epoch(qword, unit="s"):
+    """
+    Convert a FILETIME to an integer count of `unit` since the UNIX epoch,
+    rounded down. `unit` is one of "s", "ms", "us" or "ns".
+    """
+    qword -= WINDOWS_EPOCH_TO_UNIX_EPOCH
+    if unit == "ns":
+        return qword * 100
+    return qword // _EPOCH_UNITS[unit]
+
+
+def windows_timestamps_to_epoch(qwords, unit="s"):
+    """
+    Vectorized windows_timestamp_to_epoch(): convert a sequence or array of
+    FILETIMEs to a NumPy int64 array. With unit "ns", only timestamps
+    between the years 1678 and 2262 can be represented; the others become
+    the minimum int64, NaT as a datetime64[ns].
+    Requires numpy.
+    """
+    import numpy
+    if unit == "ns":
+        return windows_timestamps_to_datetime64(qwords).view(numpy.int64)
+    # FILETIMEs are unsigned, and those from 2**63 on do not fit an int64
+    qwords = numpy.asarray(qwords, dtype=numpy.uint64)
+    epoch = numpy.uint64(WINDOWS_EPOCH_TO_UNIX_EPOCH)
+    divisor = numpy.uint64(_EPOCH_UNITS[unit])
+    after = qwords >= epoch
+    since = ((numpy.where(after, qwords, epoch) - epoch) // divisor).astype(numpy.int64)
+    before = ((epoch - numpy.where(after, epoch, qwords) + divisor - numpy.uint64(1)) // divisor).astype(numpy.int64)
+    return since - before
+
+
+def windows_timestamps_to_datetime64(qwords):
+    """
+    Convert a sequence or array of FILETIMEs to a NumPy datetime64[ns] array.
+    Timestamps outside of the range of datetime64[ns], about the years
+    1678 to 2262, become NaT, as does the zero FILETIME.
+    Requires numpy.
+    """
+    import numpy
+    qwords = numpy.asarray(qwords, dtype=numpy.uint64)
+    limit = numpy.iinfo(numpy.int64).max // 100
+    valid = (qwords > WINDOWS_EPOCH_TO_UNIX_EPOCH - limit) & (qwords < WINDOWS_EPOCH_TO_UNIX_EPOCH + limit)
+    ns = (numpy.where(valid, qwords, WINDOWS_EPOCH_TO_UNIX_EPOCH).astype(numpy.int64) -
+          WINDOWS_EPOCH_TO_UNIX_EPOCH) * 100
+    ns[~valid] = numpy.iinfo(numpy.int64).min
+    return ns.view("datetime64[ns]")
+
+
+def marvin32(buf, seed):
+    """
+    Hash the byte string `buf` using Marvin32 with the 64-bit `seed`, as the
+      transaction log entries are checked by HvLEBlock. The 32-bit words
+      are decoded in one call and mixed with plain integer arithmetic.
+    Note: as in the original implementation, only the last of up to
+      three trailing bytes is mixed into the final block.
+    """
+    lo = seed & 0xFFFFFFFF
+    hi = (seed >> 32) & 0xFFFFFFFF
+
+    count = len(buf) // 4
+    words = struct.unpack_from(str("<%dI") % (count), buf, 0)
+    tail = len(buf) - 4 * count
+    final = 0x80
+    if tail:
+        final = (final << 8) | bytearray(buf[4 * count + tail - 1:4 * count + tail])[0]
+
+    for val in words + (final, 0):
+        lo = (lo + val) & 0xFFFFFFFF
+        hi ^= lo
+        lo = (((lo << 20) | (lo >> 12)) + hi) & 0xFFFFFFFF
+        hi = (((hi << 9) | (hi >> 23)) ^ lo) & 0xFFFFFFFF
+        lo = (((lo << 27) | (lo >> 5)) + hi) & 0xFFFFFFFF
+        hi = ((hi << 19) | (hi >> 13)) & 0xFFFFFFFF
+    return hi << 32 | lo
 
 
 class RegistryException(Exception):
@@ -167,11 +285,15 @@ class RegistryBlock(object):
     Base class for structure blocks in the Windows Registry.
     A block is associated with a offset into a byte-string.
 
-    All blocks (besides the root) also have a parent member, which refers to
-    a RegistryBlock that contains a reference to this block, an is found at a
-    hierarchically superior rank. Note, by following the parent links upwards,
-    the root block should be accessible (aka. there should not be any loops)
+    Blocks may also have a parent member, which refers to a RegistryBlock
+    that contains a reference to this block, an is found at a hierarchically
+    superior rank. Parent links are not needed to resolve offsets, so records
+    reached by following an offset (for example the NKRecords yielded by a
+    SubkeyList) do not keep the chain of blocks that led to them alive, and
+    have no parent.
     """
+    __slots__ = ('_buf', '_offset', '_parent')
+
     def __init__(self, buf, offset, parent):
         """
         Constructor.
@@ -193,7 +315,7 @@ class RegistryBlock(object):
         Arguments:
         - `offset`: The relative offset from the start of the block.
         """
-        return struct.unpack_from(str("<H"), self._buf, self._offset + offset)[0]
+        return _WORD.unpack_from(self._buf, self._offset + offset)[0]
 
     def unpack_dword(self, offset):
         """
@@ -201,7 +323,7 @@ class RegistryBlock(object):
         Arguments:
         - `offset`: The relative offset from the start of the block.
         """
-        return struct.unpack_from(str("<I"), self._buf, self._offset + offset)[0]
+        return _DWORD.unpack_from(self._buf, self._offset + offset)[0]
 
     def unpack_int(self, offset):
         """
@@ -209,7 +331,7 @@ class RegistryBlock(object):
         Arguments:
         - `offset`: The relative offset from the start of the block.
         """
-        return struct.unpack_from(str("<i"), self._buf, self._offset + offset)[0]
+        return _INT.unpack_from(self._buf, self._offset + offset)[0]
 
     def unpack_qword(self, offset):
         """
@@ -217,7 +339,7 @@ class RegistryBlock(object):
         Arguments:
         - `offset`: The relative offset from the start of the block.
         """
-        return struct.unpack_from(str("<Q"), self._buf, self._offset + offset)[0]
+        return _QWORD.unpack_from(self._buf, self._offset + offset)[0]
 
     def unpack_string(self, offset, length):
         """
@@ -236,6 +358,13 @@ class RegistryBlock(object):
         """
         return self._offset + offset
 
+    def abs_offset_from_hbin_offset(self, offset):
+        """
+        Offsets contained in HBIN cells are relative to the beginning of the first HBIN.
+        This converts the relative offset into an absolute offset.
+        """
+        return HBIN_BASE_OFFSET + offset
+
     def parent(self):
         """
         Get the parent block. See the class documentation for what the parent link is.
@@ -254,6 +383,8 @@ class REGFBlock(RegistryBlock):
     The Windows Registry file header. This block has a length of 4k, although
     only the first 0x200 bytes are generally used.
     """
+    __slots__ = ()
+
     def __init__(self, buf, offset, parent):
         """
         Constructor.
@@ -294,6 +425,12 @@ class REGFBlock(RegistryBlock):
         """
         return parse_windows_timestamp(self.unpack_qword(0xC))
 
+    def raw_modification_timestamp(self):
+        """
+        Get the modified timestamp as the raw FILETIME integer.
+        """
+        return self.unpack_qword(0xC)
+
     def major_version(self):
         """
         Get the major version of the Windows Registry file format
@@ -324,19 +461,19 @@ class REGFBlock(RegistryBlock):
         """
         Check if this REGF block belongs to a primary (normal) file.
         """
-        return self.file_type() == FileType.FILE_TYPE_PRIMARY
+        return self.file_type() == FileType.FILE_TYPE_PRIMARY.value
 
     def is_old_transaction_log_file(self):
         """
         Check if this REGF block belongs to an old transaction log file (used before Windows 8.1).
         """
-        return (self.file_type() == FileType.FILE_TYPE_LOG_OLD_1) or (self.file_type() == FileType.FILE_TYPE_LOG_OLD_2)
+        return (self.file_type() == FileType.FILE_TYPE_LOG_OLD_1.value) or (self.file_type() == FileType.FILE_TYPE_LOG_OLD_2.value)
 
     def is_new_transaction_log_file(self):
         """
         Check if this REGF block belongs to a new transaction log file (used as of Windows 8.1).
         """
-        return self.file_type() == FileType.FILE_TYPE_LOG_NEW
+        return self.file_type() == FileType.FILE_TYPE_LOG_NEW.value
 
     def file_format(self):
         """
@@ -362,7 +499,7 @@ class REGFBlock(RegistryBlock):
         Get the buffer offset of the first HBINBlock as an unsigned integer.
         Note: always returns 0x1000, nothing else is possible.
         """
-        return 0x1000
+        return HBIN_BASE_OFFSET
 
     def hbins_size(self):
         """
@@ -452,6 +589,15 @@ class REGFBlock(RegistryBlock):
             h = h.next()
             yield h
 
+    def allocated_cells(self):
+        """
+        A generator that yields the absolute offset of each allocated HBINCell
+        in this Windows Registry, in file order. See HBINBlock.allocated_cells().
+        """
+        for h in self.hbins():
+            for offset in h.allocated_cells():
+                yield offset
+
     def first_log_entry_offset(self):
         """
         Get the offset of the first log entry as an unsigned integer.
@@ -482,6 +628,8 @@ class HBINCell(RegistryBlock):
     HBIN data cell. An HBINBlock is continuously filled with HBINCell structures.
     The general structure is the length of the block, followed by a blob of data.
     """
+    __slots__ = ('_size',)
+
     def __init__(self, buf, offset, parent):
         """
         Constructor.
@@ -551,17 +699,6 @@ class HBINCell(RegistryBlock):
         """
         return self.unpack_string(0x4, 2)
 
-    def abs_offset_from_hbin_offset(self, offset):
-        """
-        Offsets contained in HBIN cells are relative to the beginning of the first HBIN.
-        This converts the relative offset into an absolute offset.
-        """
-        h = self.parent()
-        while h.__class__.__name__ != "HBINBlock":
-            h = h.parent()
-
-        return h.first_hbin().offset() + offset
-
     def child(self):
         """
         Make a _guess_ as to the contents of this structure and
@@ -597,6 +734,8 @@ class Record(RegistryBlock):
     """
     Abstract class for Records contained by cells in HBINs
     """
+    __slots__ = ()
+
     def __init__(self, buf, offset, parent):
         """
         Constructor.
@@ -607,24 +746,14 @@ class Record(RegistryBlock):
         """
         super(Record, self).__init__(buf, offset, parent)
 
-    def abs_offset_from_hbin_offset(self, offset):
-        # TODO This violates DRY as this is a redefinition, see HBINCell.abs_offset_from_hbin_offset()
-        """
-        Offsets contained in HBIN cells are relative to the beginning of the first HBIN.
-        This converts the relative offset into an absolute offset.
-        """
-        h = self.parent()
-        while h.__class__.__name__ != "HBINBlock":
-            h = h.parent()
-
-        return h.first_hbin().offset() + offset
-
 
 class DataRecord(Record):
     """
     A DataRecord is a HBINCell that does not contain any further structural data, but
     may contain, for example, the values pointed to by a VKRecord.
     """
+    __slots__ = ()
+
     def __init__(self, buf, offset, parent):
         """
         Constructor.
@@ -645,6 +774,8 @@ class DBIndirectBlock(Record):
     The DBIndirect block is a list of offsets to DataRecords with data
     size up to 0x3fd8.
     """
+    __slots__ = ()
+
     def __init__(self, buf, offset, parent):
         """
         Constructor.
@@ -658,21 +789,38 @@ class DBIndirectBlock(Record):
     def __str__(self):
         return "Large Data Block at 0x%x" % (self.offset())
 
-    def large_data(self, length):
+    def data_extents(self, length):
         """
-        Get the data pointed to by the indirect block. It may be large.
-        Return a byte string.
+        Get the locations of the data pointed to by the indirect block.
+        Return a list of (absolute offset, size) tuples, one for each
+        data segment of up to 0x3fd8 bytes, in order. A segment never
+        extends past its cell.
+        Raises ParseException if the segments listed in the cell of the
+        block do not hold `length` bytes.
         """
-        b = bytearray()
+        extents = []
         count = 0
+        segments = (self.parent().size() - 4) // 4
         while length > 0:
+            if count >= segments:
+                raise ParseException("Large data block is shorter than its data")
             off = self.abs_offset_from_hbin_offset(self.unpack_dword(4 * count))
-            size = min(0x3fd8, length)
-            b += HBINCell(self._buf, off, self).raw_data()[0:size]
+            cell = HBINCell(self._buf, off, self)
+            size = min(0x3fd8, cell.size() - 4, length)
+            if size <= 0:
+                raise ParseException("Empty large data segment at 0x%x" % (off))
+            extents.append((cell.data_offset(), size))
 
             count += 1
             length -= size
-        return str(b)
+        return extents
+
+    def large_data(self, length):
+        """
+        Get the data pointed to by the indirect block. It may be large.
+        Return a byte string.
+        """
+        return b"".join(self._buf[off:off + size] for off, size in self.data_extents(length))
 
 
 class DBRecord(Record):
@@ -680,6 +828,8 @@ class DBRecord(Record):
     A DBRecord is a large data block, which is not thoroughly documented.
     Its similar to an inode in the Ext file systems.
     """
+    __slots__ = ()
+
     def __init__(self, buf, offset, parent):
         """
         Constructor.
@@ -697,15 +847,133 @@ class DBRecord(Record):
     def __str__(self):
         return "Large Data Block at 0x%x" % (self.offset())
 
-    def large_data(self, length):
+    def indirect_block(self):
         """
-        Get the data described by the DBRecord. It may be large.
-        Return a byte array.
+        Get the DBIndirectBlock listing the data segments.
         """
         off = self.abs_offset_from_hbin_offset(self.unpack_dword(0x4))
         cell = HBINCell(self._buf, off, self)
-        dbi = DBIndirectBlock(self._buf, cell.data_offset(), cell)
-        return dbi.large_data(length)
+        return DBIndirectBlock(self._buf, cell.data_offset(), cell)
+
+    def data_extents(self, length):
+        """
+        Get the locations of the data described by the DBRecord.
+        Return a list of (absolute offset, size) tuples.
+        """
+        return self.indirect_block().data_extents(length)
+
+    def large_data(self, length):
+        """
+        Get the data described by the DBRecord. It may be large.
+        Return a byte string.
+        """
+        return self.indirect_block().large_data(length)
+
+
+class DataStream(io.RawIOBase):
+    """
+    A read-only, seekable file-like object over data stored in one or
+    more extents of a hive buffer, such as the segments of a large value.
+    Reads copy only the requested bytes out of the buffer.
+    """
+    def __init__(self, buf, extents):
+        """
+        Constructor.
+        Arguments:
+        - `buf`: Byte string containing Windows Registry file.
+        - `extents`: A list of (absolute offset, size) tuples.
+        """
+        super(DataStream, self).__init__()
+        self._buf = buf
+        self._extents = extents
+        self._starts = []
+        self._length = 0
+        for _, size in extents:
+            self._starts.append(self._length)
+            self._length += size
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._length + offset
+        else:
+            raise ValueError("Invalid whence (%r)" % (whence))
+        if pos < 0:
+            raise ValueError("Negative seek position %d" % (pos))
+        self._pos = pos
+        return pos
+
+    def _read(self, size):
+        parts = []
+        index = bisect.bisect_right(self._starts, self._pos) - 1
+        while size > 0 and 0 <= index < len(self._extents):
+            off, length = self._extents[index]
+            skip = self._pos - self._starts[index]
+            n = min(length - skip, size)
+            parts.append(self._buf[off + skip:off + skip + n])
+            self._pos += n
+            size -= n
+            index += 1
+        return b"".join(parts)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._length
+        return self._read(max(0, min(size, self._length - self._pos)))
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+def upcase_name(name):
+    """
+    upcase_name converts a key name to upper case the way Windows does when
+      it sorts and hashes subkey lists: character by character, leaving
+      characters without a single character upper case form unchanged.
+
+    @type name: unicode
+    @param name: a key name
+    @rtype: unicode
+    @return: the upper case key name, of the same length as `name`
+    """
+    upper = name.upper()
+    if len(upper) == len(name):
+        return upper
+    return "".join(c.upper() if len(c.upper()) == 1 else c for c in name)
+
+
+def lh_hash(name):
+    """
+    lh_hash calculates the name hash stored in LHRecord entries.
+
+    @type name: unicode
+    @param name: a key name
+    @rtype: int
+    @return: the 32-bit hash of the upper case UTF-16 code units of `name`
+    """
+    units = upcase_name(name).encode("utf-16le")
+    h = 0
+    for unit in struct.unpack(str("<%dH") % (len(units) // 2), units):
+        h = (h * 37 + unit) & 0xFFFFFFFF
+    return h
 
 
 def decode_utf16le(s):
@@ -747,6 +1015,8 @@ class VKRecord(Record):
     The VKRecord holds one name-value pair.  The data may be one of many types,
     including strings, integers, and binary data.
     """
+    __slots__ = ('_header',)
+
     def __init__(self, buf, offset, parent):
         """
         Constructor.
@@ -758,8 +1028,11 @@ class VKRecord(Record):
         """
         super(VKRecord, self).__init__(buf, offset, parent)
 
-        _id = self.unpack_string(0x0, 2)
-        if _id != b"vk":
+        try:
+            self._header = _VK_HEADER.unpack_from(buf, offset)
+        except struct.error:
+            raise ParseException("Truncated VK Record at 0x%x" % (offset))
+        if self._header[0] != b"vk":
             raise ParseException("Invalid VK Record ID")
 
     def data_type_str(self):
@@ -828,23 +1101,23 @@ class VKRecord(Record):
         """
         Has a name? or perhaps we should use '(default)'
         """
-        return self.unpack_word(0x2) != 0
+        return self._header[1] != 0
 
     def has_ascii_name(self):
         """
         Is the name of this value in the ASCII charset?
         """
-        return self.unpack_word(0x10) & 1 == 1
+        return self._header[5] & 1 == 1
 
     def name(self):
         """
         Get the name, if it exists. If not, the empty string is returned.
         @return: unicode string containing the name
         """
-        if not self.has_name():
+        name_length = self._header[1]
+        if name_length == 0:
             return ""
-        name_length = self.unpack_word(0x2)
-        unpacked_string = self.unpack_string(0x14, name_length)
+        unpacked_string = self._buf[self._offset + 0x14:self._offset + 0x14 + name_length]
         if self.has_ascii_name():
             return unpacked_string.decode("windows-1252")
         return unpacked_string.decode("utf-16le")
@@ -853,13 +1126,13 @@ class VKRecord(Record):
         """
         Get the data type of this value data as an unsigned integer.
         """
-        return self.unpack_dword(0xC) & DEVPROP_MASK_TYPE
+        return self._header[4] & DEVPROP_MASK_TYPE
 
     def data_length(self):
         """
         Get the length of this value data. This is the actual length of the data that should be parsed for the value.
         """
-        size = self.unpack_dword(0x4)
+        size = self._header[2]
         if size >= 0x80000000:
             size -= 0x80000000
         return size
@@ -868,115 +1141,107 @@ class VKRecord(Record):
         """
         Get the literal length of this value data. Some interpretation may be required to make sense of the value.
         """
-        return self.unpack_dword(0x4)
+        return self._header[2]
 
     def data_offset(self):
         """
         Get the offset to the raw data associated with this value.
         """
-        if self.raw_data_length() < 5 or self.raw_data_length() >= 0x80000000:
-            return self.absolute_offset(0x8)
+        length = self._header[2]
+        if length < 5 or length >= 0x80000000:
+            return self._offset + 0x8
+        else:
+            return self.abs_offset_from_hbin_offset(self._header[3])
+
+    def data_extents(self):
+        """
+        Get the locations of the raw data of this value in the hive buffer.
+        Return a list of (absolute offset, size) tuples, in order, or None if
+        the data is stored in the VK record itself or is a fixed-size type
+        read directly by raw_data().
+        """
+        data_type = self.data_type()
+        data_length = self.raw_data_length()
+        data_offset = self.data_offset()
+
+        if data_length >= 0x80000000:
+            return None
+        elif data_type == RegDWord or data_type == RegQWord or data_type == RegBigEndian:
+            return None
+        elif data_type == RegFileTime:
+            return [(data_offset + 4, data_length)]
+        elif data_type not in _EXTENT_TYPES and data_length < 5:
+            return None
+        elif data_length > 0x3fd8:
+            d = HBINCell(self._buf, data_offset, self)
+            if d.data_id() == b"db":
+                # this should always be the case
+                # but empirical testing does not confirm this
+                return d.child().data_extents(data_length)
+            return [(d.data_offset(), min(data_length, d.size()))]
         else:
-            return self.abs_offset_from_hbin_offset(self.unpack_dword(0x8))
+            return [(data_offset + 4, data_length)]
 
     def raw_data(self):
         """
         Get the unparsed raw data.
         """
+        extents = self.data_extents()
+        if extents is not None:
+            return b"".join(self._buf[off:off + size] for off, size in extents)
+
         data_type = self.data_type()
         data_length = self.raw_data_length()
         data_offset = self.data_offset()
-        ret = None
 
         if data_type == RegSZ or data_type == RegExpandSZ:
-            if data_length >= 0x80000000:
-                # data is contained in the data_offset field
-                ret = self._buf[data_offset:data_offset + 0x4]
-            elif 0x3fd8 < data_length < 0x80000000:
-                d = HBINCell(self._buf, data_offset, self)
-                if d.data_id() == b"db":
-                    # this should always be the case
-                    # but empirical testing does not confirm this
-                    ret = d.child().large_data(data_length)
-                else:
-                    ret = d.raw_data()[:data_length]
-            else:
-                d = HBINCell(self._buf, data_offset, self)
-                data_offset = d.data_offset()
-                ret = self._buf[data_offset:data_offset + data_length]
-        elif data_type == RegBin or data_type == RegNone:
-            if data_length >= 0x80000000:
-                data_length -= 0x80000000
-                ret = self._buf[data_offset:data_offset + data_length]
-            elif 0x3fd8 < data_length < 0x80000000:
-                d = HBINCell(self._buf, data_offset, self)
-                if d.data_id() == b"db":
-                    # this should always be the case
-                    # but empirical testing does not confirm this
-                    ret = d.child().large_data(data_length)
-                else:
-                    ret = d.raw_data()[:data_length]
-            else:
-                ret = self._buf[data_offset + 4:data_offset + 4 + data_length]
-        elif data_type == RegDWord:
-            ret = self.unpack_binary(0x8, 0x4)
+            # data is contained in the data_offset field
+            return self._buf[data_offset:data_offset + 0x4]
         elif data_type == RegMultiSZ:
-            if data_length >= 0x80000000:
-                # this means data_length < 5, so it must be 4, and
-                # be composed of completely \x00, so the strings are empty
-                ret = b""
-            elif 0x3fd8 < data_length < 0x80000000:
-                d = HBINCell(self._buf, data_offset, self)
-                if d.data_id() == b"db":
-                    ret = d.child().large_data(data_length)
-                else:
-                    ret = d.raw_data()[:data_length]
-            else:
-                ret = self._buf[data_offset + 4:data_offset + 4 + data_length]
+            # this means data_length < 5, so it must be 4, and
+            # be composed of completely \x00, so the strings are empty
+            return b""
+        elif data_type == RegDWord:
+            return self.unpack_binary(0x8, 0x4)
         elif data_type == RegQWord:
             d = HBINCell(self._buf, data_offset, self)
             data_offset = d.data_offset()
-            ret = self._buf[data_offset:data_offset + 0x8]
+            return self._buf[data_offset:data_offset + 0x8]
         elif data_type == RegBigEndian:
             d = HBINCell(self._buf, data_offset, self)
             data_offset = d.data_offset()
-            ret = self._buf[data_offset:data_offset + 4]
-        elif data_type == RegLink or \
-                        data_type == RegResourceList or \
-                        data_type == RegFullResourceDescriptor or \
-                        data_type == RegResourceRequirementsList:
-            if data_length >= 0x80000000:
-                data_length -= 0x80000000
-                ret = self._buf[data_offset:data_offset + data_length]
-            elif 0x3fd8 < data_length < 0x80000000:
-                d = HBINCell(self._buf, data_offset, self)
-                if d.data_id() == b"db":
-                    # this should always be the case
-                    # but empirical testing does not confirm this
-                    ret = d.child().large_data(data_length)
-                else:
-                    ret = d.raw_data()[:data_length]
-            else:
-                ret = self._buf[data_offset + 4:data_offset + 4 + data_length]
+            return self._buf[data_offset:data_offset + 4]
         elif data_type == RegFileTime:
-            ret = self._buf[data_offset + 4:data_offset + 4 + data_length]
-        elif data_length < 5 or data_length >= 0x80000000:
-            ret = self.unpack_binary(0x8, 4)
+            return self._buf[data_offset + 4:data_offset + 4 + data_length]
+        elif data_type in _EXTENT_TYPES:
+            data_length -= 0x80000000
+            return self._buf[data_offset:data_offset + data_length]
         else:
-            if data_length >= 0x80000000:
-                data_length -= 0x80000000
-                ret = self._buf[data_offset:data_offset + data_length]
-            elif 0x3fd8 < data_length < 0x80000000:
-                d = HBINCell(self._buf, data_offset, self)
-                if d.data_id() == b"db":
-                    # this should always be the case
-                    # but empirical testing does not confirm this
-                    ret = d.child().large_data(data_length)
-                else:
-                    ret = d.raw_data()[:data_length]
-            else:
-                ret = self._buf[data_offset + 4:data_offset + 4 + data_length]
-        return ret
+            return self.unpack_binary(0x8, 4)
+
+    def data_chunks(self):
+        """
+        Generate the raw data as memoryview segments of the hive buffer,
+        in order, without copying. Data stored in the VK record itself is
+        generated as a single segment.
+        """
+        extents = self.data_extents()
+        if extents is None:
+            yield memoryview(self.raw_data())
+            return
+        view = memoryview(self._buf)
+        for off, size in extents:
+            yield view[off:off + size]
+
+    def data_stream(self):
+        """
+        Get a read-only, seekable file-like object over the raw data.
+        """
+        extents = self.data_extents()
+        if extents is None:
+            data = self.raw_data()
+            return DataStream(data, [(0, len(data))])
+        return DataStream(self._buf, extents)
 
     def data(self):
         """
@@ -1021,12 +1286,12 @@ class VKRecord(Record):
         elif data_type == RegBin or data_type == RegNone:
             return d
         elif data_type == RegDWord:
-            return struct.unpack_from(str("<I"), d, 0)[0]
+            return _DWORD.unpack_from(d, 0)[0]
         elif data_type == RegMultiSZ:
             s = d.decode("utf16")
             return s.split("\x00")
         elif data_type == RegQWord:
-            return struct.unpack_from(str("<Q"), d, 0)[0]
+            return _QWORD.unpack_from(d, 0)[0]
         elif data_type == RegBigEndian:
             return struct.unpack_from(str(">I"), d, 0)[0]
         elif data_type == RegLink or \
@@ -1037,9 +1302,9 @@ class VKRecord(Record):
             #  return raw binary for someone else to work with.
             return d
         elif data_type == RegFileTime:
-            return parse_windows_timestamp(struct.unpack_from(str("<Q"), d, 0)[0])
+            return parse_windows_timestamp(_QWORD.unpack_from(d, 0)[0])
         elif data_length < 5 or data_length >= 0x80000000:
-            return struct.unpack_from(str("<I"), d, 0)[0]
+            return _DWORD.unpack_from(d, 0)[0]
         else:
             raise UnknownTypeException("Unknown VK Record type 0x%x at 0x%x" % (data_type, self.offset()))
 
@@ -1052,6 +1317,8 @@ class SKRecord(Record):
 
     May be referenced by multiple NK records.
     """
+    __slots__ = ('_offset_prev_sk', '_offset_next_sk')
+
     def __init__(self, buf, offset, parent):
         """
         Constructor.
@@ -1077,6 +1344,8 @@ class ValuesList(HBINCell):
     """
     A ValuesList is a simple structure of fixed length pointers/offsets to VKRecords.
     """
+    __slots__ = ('_number',)
+
     def __init__(self, buf, offset, parent, number):
         """
         Constructor.
@@ -1091,6 +1360,13 @@ class ValuesList(HBINCell):
     def __str__(self):
         return "ValueList(Length: %d) at 0x%x" % (self.parent().values_number(), self.offset())
 
+    def value_offsets(self):
+        """
+        Get a list of the absolute offsets of the VKRecords referenced by this list.
+        """
+        offsets = struct.unpack_from(str("<%dI") % (self._number), self._buf, self._offset)
+        return [self.abs_offset_from_hbin_offset(offset) + 0x4 for offset in offsets]
+
     def values(self):
         """
         A generator that yields the VKRecords referenced by this list.
@@ -1100,8 +1376,7 @@ class ValuesList(HBINCell):
         for _ in range(0, self._number):
             value_offset = self.abs_offset_from_hbin_offset(self.unpack_dword(value_item))
 
-            d = HBINCell(self._buf, value_offset, self)
-            v = VKRecord(self._buf, d.data_offset(), self)
+            v = VKRecord(self._buf, value_offset + 0x4, None)
             value_item += 4
             yield v
 
@@ -1112,6 +1387,8 @@ class SubkeyList(Record):
     The required overload is self.keys(), which is a generator for all the subkeys (NKRecords).
     The SubkeyList is not meant to be used directly.
     """
+    __slots__ = ()
+
     def __init__(self, buf, offset, parent):
         """
         Constructor.
@@ -1135,6 +1412,25 @@ class SubkeyList(Record):
         """
         return
 
+    def key_offsets(self):
+        """
+        A generator that yields the offsets of the NKRecords referenced by this list,
+        without parsing them. The base SubkeyList class returns no offsets.
+        """
+        return
+
+    def find_key(self, name):
+        """
+        Get the NKRecord of the subkey with the given name, compared case-insensitively.
+        Raises RegistryStructureDoesNotExist if there is no such subkey.
+        This base implementation compares the name of every subkey.
+        """
+        upname = upcase_name(name)
+        for k in self.keys():
+            if upcase_name(k.name()) == upname:
+                return k
+        raise RegistryStructureDoesNotExist("Subkey %s not found in list at 0x%x" % (name, self.offset()))
+
 
 class RIRecord(SubkeyList):
     """
@@ -1142,6 +1438,8 @@ class RIRecord(SubkeyList):
     a lists of offsets/pointers to subkey NKRecords. It is like a double (or more)
     indirect block.
     """
+    __slots__ = ()
+
     def __init__(self, buf, offset, parent):
         """
         Constructor.
@@ -1164,7 +1462,7 @@ class RIRecord(SubkeyList):
 
         for _ in range(0, self._keys_len()):
             key_offset = self.abs_offset_from_hbin_offset(self.unpack_dword(key_index))
-            d = HBINCell(self._buf, key_offset, self)
+            d = HBINCell(self._buf, key_offset, None)
 
             try:
                 for k in d.child().keys():
@@ -1174,8 +1472,71 @@ class RIRecord(SubkeyList):
 
             key_index += 4
 
+    def key_offsets(self):
+        """
+        A generator that yields the offsets of the NKRecords referenced by the sublists.
+        """
+        for index in range(self._keys_len()):
+            for offset in self._sublist(index).key_offsets():
+                yield offset
+
+    def _sublist(self, index):
+        """
+        Get the lf, lh or li list at the given index of this ri list.
+        """
+        offset = self.abs_offset_from_hbin_offset(self.unpack_dword(0x4 + 4 * index))
+        try:
+            l = HBINCell(self._buf, offset, None).child()
+        except RegistryStructureDoesNotExist:
+            raise ParseException("Unsupported subkey list encountered.")
+        if not isinstance(l, DirectSubkeyList):
+            raise ParseException("Unsupported subkey list encountered.")
+        return l
+
+    def find_key(self, name):
+        """
+        Get the NKRecord of the subkey with the given name, compared case-insensitively.
+        Raises RegistryStructureDoesNotExist if there is no such subkey.
+        The sublists are sorted, and each sublist holds a contiguous range of names,
+        so this binary searches for the sublist whose last name is not smaller than
+        the given name, and then within it. If that fails, the lists are scanned, using
+        their name hashes if they have any, in case they are not sorted the way we expect.
+        """
+        upname = upcase_name(name)
+        count = self._keys_len()
+
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            l = self._sublist(mid)
+            last = l._keys_len() - 1
+            if last < 0 or upcase_name(l._key_at(last).name()) < upname:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo < count:
+            k = self._sublist(lo)._bisect(upname)
+            if k is not None:
+                return k
+
+        for index in range(count):
+            k = self._sublist(index)._scan(name, upname)
+            if k is not None:
+                return k
+        raise RegistryStructureDoesNotExist("Subkey %s not found in list at 0x%x" % (name, self.offset()))
+
 
 class DirectSubkeyList(SubkeyList):
+    """
+    A base class for subkey lists that directly reference the subkey NKRecords.
+    Windows keeps the entries sorted by the upper case subkey name.
+    """
+    __slots__ = ()
+
+    # The size of each entry in the list, in bytes.
+    _entry_size = 8
+
     def __init__(self, buf, offset, parent):
         """
         Constructor.
@@ -1192,16 +1553,77 @@ class DirectSubkeyList(SubkeyList):
     def keys(self):
         """
         A generator that yields the NKRecords referenced by this list.
-        Assumes each entry is 0x8 bytes long (lf / lh style).
+        """
+        for offset in self.key_offsets():
+            yield NKRecord(self._buf, offset, None)
+
+    def key_offsets(self):
+        """
+        A generator that yields the offsets of the NKRecords referenced by this list.
         """
         key_index = 0x4
 
         for _ in range(0, self._keys_len()):
-            key_offset = self.abs_offset_from_hbin_offset(self.unpack_dword(key_index))
+            yield self.abs_offset_from_hbin_offset(self.unpack_dword(key_index)) + 0x4
+            key_index += self._entry_size
+
+    def _key_at(self, index):
+        """
+        Get the NKRecord referenced by the entry at the given index.
+        """
+        key_offset = self.abs_offset_from_hbin_offset(self.unpack_dword(0x4 + index * self._entry_size))
+        return NKRecord(self._buf, key_offset + 0x4, None)
 
-            d = HBINCell(self._buf, key_offset, self)
-            yield NKRecord(self._buf, d.data_offset(), self)
-            key_index += 8
+    def _candidates(self, name):
+        """
+        Get the indices of the entries that may reference a subkey with the given name.
+        Lists that store a name hash use it to filter the entries; this one does not.
+        """
+        return range(self._keys_len())
+
+    def _bisect(self, upname):
+        """
+        Binary search the sorted entries for the subkey with the given upper case name.
+        Returns the NKRecord, or None if it was not found.
+        """
+        lo, hi = 0, self._keys_len()
+        while lo < hi:
+            mid = (lo + hi) // 2
+            k = self._key_at(mid)
+            n = upcase_name(k.name())
+            if n == upname:
+                return k
+            elif n < upname:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def _scan(self, name, upname):
+        """
+        Compare the names of the candidate entries for the subkey with the given name.
+        Returns the NKRecord, or None if it was not found.
+        """
+        for index in self._candidates(name):
+            k = self._key_at(index)
+            if upcase_name(k.name()) == upname:
+                return k
+        return None
+
+    def find_key(self, name):
+        """
+        Get the NKRecord of the subkey with the given name, compared case-insensitively.
+        Raises RegistryStructureDoesNotExist if there is no such subkey.
+        This binary searches the sorted list, and falls back to a scan filtered by
+        the name hashes, if the list has any, in case it is not sorted the way we expect.
+        """
+        upname = upcase_name(name)
+        k = self._bisect(upname)
+        if k is None:
+            k = self._scan(name, upname)
+        if k is None:
+            raise RegistryStructureDoesNotExist("Subkey %s not found in list at 0x%x" % (name, self.offset()))
+        return k
 
 
 class LIRecord(DirectSubkeyList):
@@ -1209,6 +1631,10 @@ class LIRecord(DirectSubkeyList):
     The LIRecord is a simple structure containing a list of offsets/pointers
     to subkey NKRecords. It is a single indirect block.
     """
+    __slots__ = ()
+
+    _entry_size = 4
+
     def __init__(self, buf, offset, parent):
         """
         Constructor.
@@ -1222,20 +1648,6 @@ class LIRecord(DirectSubkeyList):
     def __str__(self):
         return "LIRecord(Length: %d) at 0x%x" % (self._keys_len(), self.offset())
 
-    def keys(self):
-        """
-        A generator that yields the NKRecords referenced by this list.
-        li style entry size.
-        """
-        key_index = 0x4
-
-        for _ in range(0, self._keys_len()):
-            key_offset = self.abs_offset_from_hbin_offset(self.unpack_dword(key_index))
-
-            d = HBINCell(self._buf, key_offset, self)
-            yield NKRecord(self._buf, d.data_offset(), self)
-            key_index += 4
-
 
 class LFRecord(DirectSubkeyList):
     """
@@ -1244,6 +1656,8 @@ class LFRecord(DirectSubkeyList):
     The LFRecord also contains a hash for the name of the subkey pointed to
     by the offset, which enables more efficient seaching of the Registry tree.
     """
+    __slots__ = ()
+
     def __init__(self, buf, offset, parent):
         """
         Constructor.
@@ -1260,6 +1674,26 @@ class LFRecord(DirectSubkeyList):
     def __str__(self):
         return "LFRecord(Length: %d) at 0x%x" % (self._keys_len(), self.offset())
 
+    def _candidates(self, name):
+        """
+        Get the indices of the entries whose hint, the first four characters
+        of the subkey name, matches the given name.
+        Only the leading ASCII characters of the name are compared.
+        """
+        prefix = ""
+        for c in name[:4]:
+            if ord(c) >= 0x80:
+                break
+            prefix += c
+        prefix = prefix.upper().encode("ascii")
+        if len(prefix) == len(name) < 4:
+            prefix += b"\x00"
+
+        count = self._keys_len()
+        table = struct.unpack_from(str("<") + str("I4s") * count, self._buf, self._offset + 0x4)
+        return [index for index, hint in enumerate(table[1::2])
+                if hint[:len(prefix)].upper() == prefix]
+
 
 class LHRecord(DirectSubkeyList):
     """
@@ -1269,6 +1703,8 @@ class LHRecord(DirectSubkeyList):
     by the offset, which enables more efficient seaching of the Registry tree.
     The LHRecord is analogous to the LFRecord, but it uses a different hashing function.
     """
+    __slots__ = ()
+
     def __init__(self, buf, offset, parent):
         """
         Constructor.
@@ -1285,6 +1721,21 @@ class LHRecord(DirectSubkeyList):
     def __str__(self):
         return "LHRecord(Length: %d) at 0x%x" % (self._keys_len(), self.offset())
 
+    def _candidates(self, name):
+        """
+        Get the indices of the entries whose hash matches the hash of the given name.
+        """
+        count = self._keys_len()
+        hashes = struct.unpack_from(str("<%dI") % (2 * count), self._buf, self._offset + 0x4)[1::2]
+        target = lh_hash(name)
+        index = -1
+        while True:
+            try:
+                index = hashes.index(target, index + 1)
+            except ValueError:
+                return
+            yield index
+
 
 class NKRecord(Record):
     """
@@ -1292,6 +1743,8 @@ class NKRecord(Record):
     It contains pointers/offsets to the ValueList (values associated with the given record),
     and to subkeys.
     """
+    __slots__ = ('_header',)
+
     def __init__(self, buf, offset, parent):
         """
         Constructor.
@@ -1301,8 +1754,11 @@ class NKRecord(Record):
         - `parent`: The parent block, which links to this block. This should be a HBINCell.
         """
         super(NKRecord, self).__init__(buf, offset, parent)
-        _id = self.unpack_string(0x0, 2)
-        if _id != b"nk":
+        try:
+            self._header = _NK_HEADER.unpack_from(buf, offset)
+        except struct.error:
+            raise ParseException("Truncated NK Record at 0x%x" % (offset))
+        if self._header[0] != b"nk":
             raise ParseException("Invalid NK Record ID")
 
     def __str__(self):
@@ -1323,7 +1779,7 @@ class NKRecord(Record):
         """
         Does this have a classname?
         """
-        return self.unpack_word(0x4A) > 0
+        return self._header[19] > 0
 
     def classname(self):
         """
@@ -1333,8 +1789,8 @@ class NKRecord(Record):
         if not self.has_classname():
             return ""
 
-        classname_offset = self.unpack_dword(0x30)
-        classname_length = self.unpack_word(0x4A)
+        classname_offset = self._header[12]
+        classname_length = self._header[19]
 
         offset = self.abs_offset_from_hbin_offset(classname_offset)
         d = HBINCell(self._buf, offset, self)
@@ -1344,18 +1800,24 @@ class NKRecord(Record):
         """
         Get the modified timestamp as a Python datetime.
         """
-        return parse_windows_timestamp(self.unpack_qword(0x4))
+        return parse_windows_timestamp(self._header[2])
+
+    def raw_timestamp(self):
+        """
+        Get the modified timestamp as the raw FILETIME integer.
+        """
+        return self._header[2]
 
     def has_ascii_name(self):
-        return self.unpack_word(0x2) & 0x0020 > 0
+        return self._header[1] & 0x0020 > 0
 
     def name(self):
         """
         Return the registry key name as a string.
         @return: unicode string containing the name
         """
-        name_length = self.unpack_word(0x48)
-        unpacked_string = self.unpack_string(0x4C, name_length)
+        name_length = self._header[18]
+        unpacked_string = self._buf[self._offset + 0x4C:self._offset + 0x4C + name_length]
         if self.has_ascii_name():
             return unpacked_string.decode("windows-1252")
         return unpacked_string.decode("utf-16le")
@@ -1382,7 +1844,7 @@ class NKRecord(Record):
         """
         Is this a root key?
         """
-        return self.unpack_word(0x2) & 0x0004 > 0
+        return self._header[1] & 0x0004 > 0
 
     def has_parent_key(self):
         """
@@ -1397,20 +1859,26 @@ class NKRecord(Record):
         except ParseException:
             return False
 
+    def parent_key_offset(self):
+        """
+        Get the absolute offset of the parent key NKRecord.
+        The result is meaningless for a root key.
+        """
+        return self.abs_offset_from_hbin_offset(self._header[4]) + 0x4
+
     def parent_key(self):
         """
         Get the parent_key, which will be an NKRecord.
         """
-        offset = self.abs_offset_from_hbin_offset(self.unpack_dword(0x10))
+        offset = self.abs_offset_from_hbin_offset(self._header[4])
 
-        d = HBINCell(self._buf, offset, self.parent())
-        return NKRecord(self._buf, d.data_offset(), self.parent())
+        return NKRecord(self._buf, offset + 0x4, None)
 
     def sk_record(self):
         """
         Get the security descriptor associated with this NKRecord as an SKRecord.
         """
-        offset = self.abs_offset_from_hbin_offset(self.unpack_dword(0x2C))
+        offset = self.abs_offset_from_hbin_offset(self._header[11])
 
         d = HBINCell(self._buf, offset, self)
         return SKRecord(self._buf, d.data_offset(), d)
@@ -1419,7 +1887,7 @@ class NKRecord(Record):
         """
         Get the number of values associated with this NKRecord/Key.
         """
-        num = self.unpack_dword(0x24)
+        num = self._header[9]
         if num == 0xFFFFFFFF:
             return 0
         return num
@@ -1432,7 +1900,7 @@ class NKRecord(Record):
         if self.values_number() == 0:
             raise RegistryStructureDoesNotExist("NK Record has no associated values.")
 
-        values_list_offset = self.abs_offset_from_hbin_offset(self.unpack_dword(0x28))
+        values_list_offset = self.abs_offset_from_hbin_offset(self._header[10])
 
         d = HBINCell(self._buf, values_list_offset, self)
         return ValuesList(self._buf, d.data_offset(), self, self.values_number())
@@ -1441,7 +1909,7 @@ class NKRecord(Record):
         """
         Get the number of subkeys of this key.
         """
-        number = self.unpack_dword(0x14)
+        number = self._header[5]
         if number == 0xFFFFFFFF:
             return 0
         return number
@@ -1455,7 +1923,7 @@ class NKRecord(Record):
         if self.subkey_number() == 0:
             raise RegistryStructureDoesNotExist("NKRecord has no subkey list at 0x%x" % (self.offset()))
 
-        subkey_list_offset = self.abs_offset_from_hbin_offset(self.unpack_dword(0x1C))
+        subkey_list_offset = self.abs_offset_from_hbin_offset(self._header[7])
 
         d = HBINCell(self._buf, subkey_list_offset, self)
         id_ = d.data_id()
@@ -1480,6 +1948,8 @@ class HBINBlock(RegistryBlock):
     A HBINBlock is the basic allocation block of the Windows Registry.
     It's length is multiple of 0x1000.
     """
+    __slots__ = ('_reloffset_next_hbin', '_offset_next_hbin')
+
     def __init__(self, buf, offset, parent):
         """
         Constructor.
@@ -1543,6 +2013,22 @@ class HBINBlock(RegistryBlock):
                 break
             c = c.next()
 
+    def allocated_cells(self):
+        """
+        Get a generator that yields the absolute offset of each allocated HBINCell
+        contained in this HBIN, without building HBINCell objects.
+        These are not necessarily linked to from the root key.
+        """
+        offset = self._offset + 0x20
+        while offset < self._offset_next_hbin:
+            size = _INT.unpack_from(self._buf, offset)[0]
+            if size == 0:
+                break
+            if size < 0:
+                yield offset
+                size = -size
+            offset += size
+
     def records(self):
         """
         Obsolete, use cells instead.
@@ -1556,6 +2042,8 @@ class HvLEBlock(RegistryBlock):
     A HvLEBlock is the log entry in a new transaction log file.
     It's length is multiple of 0x200.
     """
+    __slots__ = ('_offset_next_hvle', '_marvin32seed')
+
     def __init__(self, buf, offset, parent):
         """
         Constructor.
@@ -1582,50 +2070,7 @@ class HvLEBlock(RegistryBlock):
         """
         Hash the buf using Marvin32 with a predefined seed.
         """
-        def rotl(x, n, w):
-            return (x.value << n) | (x.value >> (w - n))
-
-        def to_uint32_le(four_bytes):
-            b1, b2, b3, b4 = bytearray(four_bytes)
-            return b1 | (b2 << 8) | (b3 << 16) | (b4 << 24)
-
-        def marvin32_mix(state, val):
-            lo, hi = state
-            lo.value += val.value
-            hi.value ^= lo.value
-            lo.value = rotl(lo, 20, 32) + hi.value
-            hi.value = rotl(hi, 9, 32) ^ lo.value
-            lo.value = rotl(lo, 27, 32) + hi.value
-            hi.value = rotl(hi, 19, 32)
-            return (lo, hi)
-
-        seed = self._marvin32seed
-        lo = c_uint32(seed)
-        hi = c_uint32(seed >> 32)
-        state = (lo, hi)
-
-        length = len(buf)
-        pos = 0
-        val = c_uint32()
-
-        while length >= 4:
-            val.value = to_uint32_le(buf[pos:pos+4])
-            state = marvin32_mix(state, val)
-            pos += 4
-            length -= 4
-
-        final = c_uint32(0x80)
-        if length == 3:
-            final.value = (final.value << 8) | buf[pos+2]
-        elif length == 2:
-            final.value = (final.value << 8) | buf[pos+1]
-        elif length == 1:
-            final.value = (final.value << 8) | buf[pos]
-
-        state = marvin32_mix(state, final)
-        state = marvin32_mix(state, c_uint32(0))
-        lo, hi = state
-        return (hi.value << 32 | lo.value)
+        return marvin32(buf, self._marvin32seed)
 
     def size(self):
         """
@@ -1747,6 +2192,8 @@ class DirtyPageReference(RegistryBlock):
     """
     A structure describing a single dirty page in the HvLEBlock.
     """
+    __slots__ = ()
+
     def __init__(self, buf, offset, parent):
         """
         Constructor.
@@ -1773,6 +2220,8 @@ class DirtyPage(RegistryBlock):
     """
     A a single dirty page in the HvLEBlock.
     """
+    __slots__ = ('_size',)
+
     def __init__(self, buf, offset, size, parent):
         """
         Constructor.
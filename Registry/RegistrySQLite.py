@@ -0,0 +1,244 @@
+#!/bin/python
+
+#    This file is part of python-registry.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+Export hives into a SQLite database, for ad-hoc SQL queries.
+
+    python -m Registry.RegistrySQLite hives.db SYSTEM SOFTWARE NTUSER.DAT
+
+Each hive gets a row in `hives`, and its keys and values rows in `keys`
+and `key_values`, tagged with its `hive_id`. Timestamps are raw FILETIME
+integers, which SQLite converts with:
+
+    datetime((timestamp - 116444736000000000) / 10000000, 'unixepoch')
+
+For example, the keys written in a day, with their values:
+
+    SELECT k.path, v.name, v.type_name
+    FROM keys k JOIN key_values v ON v.hive_id = k.hive_id AND v.key_offset = k.offset
+    WHERE k.timestamp BETWEEN 132000000000000000 AND 132000864000000000;
+"""
+from __future__ import print_function
+
+import sys
+import time
+import sqlite3
+from collections import namedtuple
+
+from . import Registry
+from . import RegistryParse
+
+ExportStats = namedtuple("ExportStats", ["hive_id", "keys", "values", "elapsed", "keys_per_second"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hives (
+    hive_id INTEGER PRIMARY KEY,
+    source TEXT,
+    hive_name TEXT,
+    hive_type TEXT,
+    sequence1 INTEGER,
+    sequence2 INTEGER,
+    checksum INTEGER,
+    timestamp INTEGER
+);
+CREATE TABLE IF NOT EXISTS keys (
+    hive_id INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    parent_offset INTEGER,
+    path TEXT COLLATE NOCASE,
+    name TEXT COLLATE NOCASE,
+    depth INTEGER,
+    timestamp INTEGER,
+    subkeys_number INTEGER,
+    values_number INTEGER
+);
+CREATE TABLE IF NOT EXISTS key_values (
+    hive_id INTEGER NOT NULL,
+    key_offset INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    name TEXT COLLATE NOCASE,
+    type INTEGER,
+    type_name TEXT,
+    data_length INTEGER,
+    data BLOB
+);
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS keys_offset ON keys (hive_id, offset);
+CREATE INDEX IF NOT EXISTS keys_path ON keys (path);
+CREATE INDEX IF NOT EXISTS keys_name ON keys (name);
+CREATE INDEX IF NOT EXISTS keys_timestamp ON keys (timestamp);
+CREATE INDEX IF NOT EXISTS key_values_key ON key_values (hive_id, key_offset);
+CREATE INDEX IF NOT EXISTS key_values_name ON key_values (name);
+CREATE INDEX IF NOT EXISTS key_values_type ON key_values (type);
+"""
+
+# SQLite integers are signed 64 bit
+_MAX_INTEGER = 0x7FFFFFFFFFFFFFFF
+
+
+def connect(database):
+    """
+    Open a SQLite database for exporting, with the write-ahead log and
+    without waiting for writes to reach the disk, and create the tables.
+    Arguments:
+    - `database`: The filename of the database.
+    """
+    connection = sqlite3.connect(database)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=OFF")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def create_indexes(connection):
+    """
+    Create the indexes on the paths, names, timestamps and types of the keys
+    and values. Creating them once all the hives are loaded is faster than
+    updating them on every insert.
+    """
+    connection.executescript(INDEXES)
+    connection.commit()
+
+
+def _integer(n):
+    return n if n <= _MAX_INTEGER else None
+
+
+def _value_row(hive_id, key_offset, vk, data):
+    value = Registry.RegistryValue(vk)
+    try:
+        raw = vk.raw_data() if data else None
+    except RegistryParse.RegistryException:
+        raw = None
+    try:
+        type_name = value.value_type_str()
+    except RegistryParse.RegistryException:
+        type_name = None
+    return (hive_id, key_offset, vk.offset(), vk.name(), value.value_type(), type_name,
+            vk.data_length(), raw if raw is None else sqlite3.Binary(raw))
+
+
+def export_hive(connection, reg, source=None, batch_size=10000, data=True):
+    """
+    Export the keys and values of a hive reachable from its root key into
+    a database opened with connect(), and return an ExportStats.
+    Rows are inserted with executemany() in batches, and committed at the end.
+    Arguments:
+    - `reg`: A Registry.
+    - `source`: A description of the hive, such as its filename, stored in
+          `hives`. Defaults to Registry.hive_id().
+    - `batch_size`: The number of rows inserted at once.
+    - `data`: If True, the raw data of the values is stored too.
+    """
+    start = time.time()
+    regf = reg._regf
+    cursor = connection.execute(
+        "INSERT INTO hives (source, hive_name, hive_type, sequence1, sequence2, checksum, timestamp) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (source or reg.hive_id(), reg.hive_name(), reg.hive_type().value, regf.hive_sequence1(),
+         regf.hive_sequence2(), regf.checksum(), _integer(regf.raw_modification_timestamp())))
+    hive_id = cursor.lastrowid
+
+    keys = []
+    values = []
+    key_count = 0
+    value_count = 0
+    for entry in reg.walk():
+        nk = entry.key._nkrecord
+        offset = nk.offset()
+        values_number = nk.values_number()
+        # key names hold no backslashes, so the name is the end of the path
+        keys.append((hive_id, offset, None if nk.is_root() else nk.parent_key_offset(),
+                     entry.path, entry.path.rpartition("\\")[2], entry.depth,
+                     _integer(nk.raw_timestamp()), nk.subkey_number(), values_number))
+        if values_number > 0:
+            try:
+                vks = nk.values_list().values()
+            except RegistryParse.RegistryStructureDoesNotExist:
+                vks = []
+            for vk in vks:
+                values.append(_value_row(hive_id, offset, vk, data))
+
+        if len(keys) >= batch_size:
+            connection.executemany("INSERT INTO keys VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", keys)
+            key_count += len(keys)
+            keys = []
+        if len(values) >= batch_size:
+            connection.executemany("INSERT INTO key_values VALUES (?, ?, ?, ?, ?, ?, ?, ?)", values)
+            value_count += len(values)
+            values = []
+
+    connection.executemany("INSERT INTO keys VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", keys)
+    connection.executemany("INSERT INTO key_values VALUES (?, ?, ?, ?, ?, ?, ?, ?)", values)
+    connection.commit()
+    key_count += len(keys)
+    value_count += len(values)
+
+    elapsed = time.time() - start
+    return ExportStats(hive_id, key_count, value_count, elapsed,
+                       key_count / elapsed if elapsed > 0 else 0.0)
+
+
+def export(database, filenames, batch_size=10000, data=True, mmap=True, logs=False):
+    """
+    Export the hives at `filenames` into the SQLite database at `database`,
+    then create the indexes, and return a list of ExportStats.
+    Arguments:
+    - `batch_size`, `data`: As for export_hive().
+    - `mmap`: If True, the hives are memory mapped. See Registry.
+    - `logs`: If True, the hives are recovered from the transaction log
+          files next to them. See Registry.open_with_logs().
+    """
+    connection = connect(database)
+    stats = []
+    try:
+        for filename in filenames:
+            if logs:
+                reg = Registry.Registry.open_with_logs(filename, mmap=mmap)
+            else:
+                reg = Registry.Registry(filename, mmap=mmap)
+            with reg:
+                stats.append(export_hive(connection, reg, source=filename,
+                                         batch_size=batch_size, data=data))
+        create_indexes(connection)
+    finally:
+        connection.close()
+    return stats
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export Windows Registry hives into a SQLite database.")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Rows inserted at once")
+    parser.add_argument("--no-data", action="store_true", help="Do not store the raw data of values")
+    parser.add_argument("--logs", action="store_true", help="Recover hives from their .LOG1/.LOG2 files")
+    parser.add_argument("database", help="Path of the SQLite database, created if needed")
+    parser.add_argument("hives", nargs="+", help="Paths of the hives")
+    args = parser.parse_args()
+
+    start = time.time()
+    stats = export(args.database, args.hives, batch_size=args.batch_size,
+                   data=not args.no_data, logs=args.logs)
+    for filename, s in zip(args.hives, stats):
+        print("%s: hive %d, %d keys, %d values in %.2fs (%d keys/s)" %
+              (filename, s.hive_id, s.keys, s.values, s.elapsed, s.keys_per_second), file=sys.stderr)
+    print("total: %.2fs, including indexes" % (time.time() - start), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
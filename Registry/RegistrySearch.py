@@ -0,0 +1,342 @@
+#!/bin/python
+
+#    This file is part of python-registry.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+A trigram index for substring searches over the key names and paths, the
+value names, and the string data of a hive.
+
+Every key below the root, value name, and RegSZ, RegExpandSZ or RegMultiSZ value is a
+document. The index maps each trigram, three upper case characters, to the
+sorted list of the documents that contain it. A query intersects the lists
+of the trigrams of the needle, smallest first, and verifies the remaining
+candidates against the hive, so the results are exact.
+
+The index is built by Registry.search() the first time it is used, or by
+Registry.build_search_index(), which stores it next to the hive as
+<filename>.regtri for later runs. It is only loaded for the contents it was
+built for, as identified by the checksum, sequence numbers and size of the
+hive. Its layout, all little endian:
+
+- header: magic, version, hive checksum, sequence numbers and size, the
+      number of keys, documents and trigrams, and the offsets of the tables;
+- keys: the NKRecord offset of each key, and its full path;
+- documents: the kind, key and VKRecord offset of each document;
+- trigrams: each trigram, sorted, with the start and length of its list;
+- postings: the lists of document numbers;
+- strings: the UTF-8 full paths of the keys.
+"""
+import sys
+import mmap
+import struct
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+
+from . import RegistryParse
+from . import RegistryIndex
+
+SEARCH_SUFFIX = ".regtri"
+SEARCH_MAGIC = b"regftri\x00"
+SEARCH_VERSION = 1
+
+# The kinds of documents and of SearchHits.
+KEY = "key"
+VALUE_NAME = "value_name"
+DATA = "data"
+KINDS = (KEY, VALUE_NAME, DATA)
+
+_HEADER = struct.Struct(str("<8sIIIIQQQQQQQQQ"))
+_KEY = struct.Struct(str("<III"))
+_DOCUMENT = struct.Struct(str("<III"))
+_TRIGRAM = struct.Struct(str("<QII"))
+
+_STRING_TYPES = (RegistryParse.RegSZ, RegistryParse.RegExpandSZ, RegistryParse.RegMultiSZ)
+
+SearchHit = namedtuple("SearchHit", ["kind", "path", "value_name"])
+
+
+def search_index_path(filename):
+    """
+    Get the filename of the sidecar search index of a hive.
+    """
+    return filename + SEARCH_SUFFIX
+
+
+def trigrams(text):
+    """
+    Get the set of trigrams of an upper case string, each packed into an integer.
+    """
+    codes = [ord(c) for c in text]
+    return set((codes[i] << 42) | (codes[i + 1] << 21) | codes[i + 2] for i in range(len(codes) - 2))
+
+
+def _contains(postings, number):
+    """
+    Check whether a sorted array of document numbers holds a number.
+    """
+    i = bisect_left(postings, number)
+    return i < len(postings) and postings[i] == number
+
+
+def _frombytes(a, data):
+    """
+    Append the items in a byte string to an array, on Python 2 and 3.
+    """
+    if hasattr(a, "frombytes"):
+        a.frombytes(data)
+    else:
+        a.fromstring(data)
+
+
+def _tobytes(a):
+    """
+    Get the items of an array as a byte string, on Python 2 and 3.
+    """
+    return a.tobytes() if hasattr(a, "tobytes") else a.tostring()
+
+
+def _string_data(vk):
+    """
+    Get the data of a string value as text, the strings of a RegMultiSZ
+    joined by newlines, or None if it is not a string or cannot be read.
+    """
+    if vk.data_type() not in _STRING_TYPES:
+        return None
+    try:
+        data = vk.data()
+    except (RegistryParse.RegistryException, UnicodeDecodeError):
+        return None
+    if isinstance(data, list):
+        return u"\n".join(data)
+    return data
+
+
+def build(reg):
+    """
+    Build the search index of the keys and values reachable from the root
+    key of a Registry, and return its contents as a byte string.
+    """
+    keys = bytearray()
+    documents = bytearray()
+    strings = bytearray()
+    postings = {}
+    count = 0
+    for position, entry in enumerate(reg.walk()):
+        nk = entry.key._nkrecord
+        path = entry.path.encode("utf-8")
+        keys += _KEY.pack(nk.offset(), len(strings), len(path))
+        strings += path
+
+        texts = [(0, 0, entry.path.rpartition("\\")[2])] if entry.depth > 0 else []
+        if nk.values_number() > 0:
+            try:
+                vks = nk.values_list().values()
+            except RegistryParse.RegistryStructureDoesNotExist:
+                vks = []
+            for vk in vks:
+                texts.append((1, vk.offset(), vk.name()))
+                data = _string_data(vk)
+                if data is not None:
+                    texts.append((2, vk.offset(), data))
+
+        for kind, value_offset, text in texts:
+            documents += _DOCUMENT.pack(kind, position, value_offset)
+            for trigram in trigrams(RegistryParse.upcase_name(text)):
+                postings.setdefault(trigram, array("I")).append(count)
+            count += 1
+
+    table = bytearray()
+    lists = array("I")
+    for trigram in sorted(postings):
+        table += _TRIGRAM.pack(trigram, len(lists), len(postings[trigram]))
+        lists.extend(postings[trigram])
+    if sys.byteorder == "big":
+        lists.byteswap()
+
+    keys_offset = _HEADER.size
+    documents_offset = keys_offset + len(keys)
+    trigrams_offset = documents_offset + len(documents)
+    postings_offset = trigrams_offset + len(table)
+    strings_offset = postings_offset + len(lists) * 4
+    (checksum, sequence1, sequence2, size) = RegistryIndex.hive_identity(reg._regf, len(reg._buf))
+    header = _HEADER.pack(SEARCH_MAGIC, SEARCH_VERSION, checksum, sequence1, sequence2, size,
+                          len(keys) // _KEY.size, count, len(postings), keys_offset, documents_offset,
+                          trigrams_offset, postings_offset, strings_offset)
+    return b"".join([header, bytes(keys), bytes(documents), bytes(table), _tobytes(lists), bytes(strings)])
+
+
+class SearchIndex(object):
+    """
+    A trigram index of a hive, over its contents as a byte string or a memory map.
+    """
+    def __init__(self, buf):
+        """
+        Constructor.
+        Arguments:
+        - `buf`: The contents of the index, as made by build().
+        Raises RegistryParse.ParseException if it is not a valid index.
+        """
+        if len(buf) < _HEADER.size:
+            raise RegistryParse.ParseException("Truncated search index")
+        (magic, version, checksum, sequence1, sequence2, size,
+         self._key_count, self._document_count, self._trigram_count,
+         self._keys, self._documents, self._trigrams, self._postings,
+         self._strings) = _HEADER.unpack_from(buf, 0)
+        if magic != SEARCH_MAGIC or version != SEARCH_VERSION:
+            raise RegistryParse.ParseException("Invalid search index")
+        if self._strings > len(buf) or \
+           self._trigrams + self._trigram_count * _TRIGRAM.size > self._postings:
+            raise RegistryParse.ParseException("Truncated search index")
+        self._buf = buf
+        self._identity = (checksum, sequence1, sequence2, size)
+
+    @classmethod
+    def load(cls, filename, identity):
+        """
+        Map the index at `filename`, and return it if it was built for a hive
+        with the given RegistryIndex.hive_identity(), or None if it is missing
+        or does not match.
+        """
+        try:
+            with open(filename, "rb") as f:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError):
+            return None
+        try:
+            index = cls(buf)
+        except RegistryParse.ParseException:
+            buf.close()
+            return None
+        if index.identity() != identity:
+            buf.close()
+            return None
+        return index
+
+    def close(self):
+        if hasattr(self._buf, "close"):
+            self._buf.close()
+
+    def identity(self):
+        """
+        Get the RegistryIndex.hive_identity() of the hive this index was built for.
+        """
+        return self._identity
+
+    def __len__(self):
+        """
+        Get the number of documents.
+        """
+        return self._document_count
+
+    def postings(self, trigram):
+        """
+        Get the sorted array of the documents that contain a trigram.
+        """
+        lo, hi = 0, self._trigram_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _TRIGRAM.unpack_from(self._buf, self._trigrams + mid * _TRIGRAM.size)[0] < trigram:
+                lo = mid + 1
+            else:
+                hi = mid
+        result = array("I")
+        if lo < self._trigram_count:
+            (found, start, length) = _TRIGRAM.unpack_from(self._buf, self._trigrams + lo * _TRIGRAM.size)
+            if found == trigram:
+                start = self._postings + start * 4
+                _frombytes(result, self._buf[start:start + length * 4])
+                if sys.byteorder == "big":
+                    result.byteswap()
+        return result
+
+    def candidates(self, text):
+        """
+        Get the sorted list of the documents that contain all the trigrams of
+        an upper case string, or None if it is too short to have any.
+        """
+        lists = sorted((self.postings(t) for t in trigrams(text)), key=len)
+        if not lists:
+            return None
+        result = lists[0]
+        for other in lists[1:]:
+            if not result:
+                break
+            if len(result) * 16 < len(other):
+                # look the few candidates up in the long list, rather than hashing it all
+                result = [d for d in result if _contains(other, d)]
+            else:
+                members = set(other)
+                result = [d for d in result if d in members]
+        return list(result)
+
+    def document(self, number):
+        """
+        Get the (kind, key number, VKRecord offset) of a document.
+        """
+        (kind, key, value_offset) = _DOCUMENT.unpack_from(self._buf, self._documents + number * _DOCUMENT.size)
+        return KINDS[kind], key, value_offset
+
+    def key(self, number):
+        """
+        Get the (NKRecord offset, full path) of a key.
+        """
+        (offset, start, length) = _KEY.unpack_from(self._buf, self._keys + number * _KEY.size)
+        start += self._strings
+        return offset, self._buf[start:start + length].decode("utf-8")
+
+    def search(self, buf, needle, case_insensitive=False, kinds=KINDS):
+        """
+        A generator that yields a SearchHit for each document that contains
+        `needle`, in walk order. See Registry.search().
+        Arguments:
+        - `buf`: The contents of the hive the index was built for.
+        """
+        if case_insensitive:
+            needle = RegistryParse.upcase_name(needle)
+
+        def contains(text, needle=needle):
+            return needle in (RegistryParse.upcase_name(text) if case_insensitive else text)
+
+        # a key matches when its path contains the needle, ending in its name,
+        # so the name contains the part of the needle after its last backslash
+        key_needle = needle.rstrip("\\")
+        filters = [self.candidates(RegistryParse.upcase_name(key_needle.rpartition("\\")[2] if kind == KEY
+                                                             else needle))
+                   for kind in kinds]
+        if any(f is None for f in filters):
+            # too short for trigrams, so every document is checked
+            numbers = range(self._document_count)
+        else:
+            numbers = sorted(set().union(*filters))
+
+        for number in numbers:
+            (kind, key, value_offset) = self.document(number)
+            if kind not in kinds:
+                continue
+            (offset, path) = self.key(key)
+            if kind == KEY:
+                name = path.rpartition("\\")[2]
+                start = max(0, len(path) - len(name) - len(key_needle) + 1)
+                if key_needle and contains(path[start:], key_needle):
+                    yield SearchHit(KEY, path, None)
+                continue
+            vk = RegistryParse.VKRecord(buf, value_offset, None)
+            if kind == VALUE_NAME:
+                if contains(vk.name()):
+                    yield SearchHit(VALUE_NAME, path, vk.name() or "(default)")
+            else:
+                data = _string_data(vk)
+                if data is not None and contains(data):
+                    yield SearchHit(DATA, path, vk.name() or "(default)")
@@ -20,5 +20,10 @@ _version_ = '1.2.0'
 __all__ = [
     'Registry',
     'RegistryParse',
-    'RegistryLog'
+    'RegistryLog',
+    'RegistryBatch',
+    'RegistryArtifacts',
+    'RegistryIndex',
+    'RegistrySQLite',
+    'RegistrySearch'
 ]
@@ -31,12 +31,16 @@ Field = namedtuple("Field", ["name", "getter"])
 
 
 def make_value_getter(value_name):
-    """ return a function that fetches the value from the registry key """
-    def _value_getter(key):
-        try:
-            return key.value(value_name).value()
-        except Registry.RegistryValueNotFoundException:
+    """
+    return a function that fetches the value from the registry key,
+      given its values as by RegistryKey.values_dict().
+    """
+    value_name = value_name.lower()
+    def _value_getter(key, values):
+        value = values.get(value_name)
+        if value is None:
             return None
+        return value.value()
     return _value_getter
 
 
@@ -46,9 +50,9 @@ def make_windows_timestamp_value_getter(value_name):
       as a Windows timestamp.
     """
     f = make_value_getter(value_name)
-    def _value_getter(key):
+    def _value_getter(key, values):
         try:
-            return parse_windows_timestamp(f(key) or 0)
+            return parse_windows_timestamp(f(key, values) or 0)
         except ValueError:
             return datetime.datetime.min
     return _value_getter
@@ -71,9 +75,9 @@ def make_unix_timestamp_value_getter(value_name):
       as a UNIX timestamp.
     """
     f = make_value_getter(value_name)
-    def _value_getter(key):
+    def _value_getter(key, values):
         try:
-            return parse_unix_timestamp(f(key) or 0)
+            return parse_unix_timestamp(f(key, values) or 0)
         except ValueError:
             return datetime.datetime.min
     return _value_getter
@@ -117,7 +121,7 @@ FIELDS = [
     Field("sha1", make_value_getter("101")),
     Field("size", make_value_getter("6")),
     Field("file_description", make_value_getter("c")),
-    Field("first_run", lambda key: key.timestamp()),
+    Field("first_run", lambda key, values: key.timestamp()),
     Field("created_timestamp", make_windows_timestamp_value_getter("12")),
     Field("modified_timestamp", make_windows_timestamp_value_getter("11")),
     Field("modified_timestamp2", make_windows_timestamp_value_getter("17")),
@@ -139,7 +143,8 @@ ExecutionEntry = namedtuple("ExecutionEntry", map(lambda e: e.name, FIELDS))
 
 
 def parse_execution_entry(key):
-    return ExecutionEntry(**dict((e.name, e.getter(key)) for e in FIELDS))
+    values = key.values_dict()
+    return ExecutionEntry(*[e.getter(key, values) for e in FIELDS])
 
 
 
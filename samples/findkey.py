@@ -26,10 +26,9 @@
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import sys
-
 import argparse
 from Registry import Registry
+from Registry import RegistrySearch
 
 
 def main():
@@ -40,44 +39,26 @@ def main():
     parser.add_argument("query", type=str,
                         help="Query for which to search")
     parser.add_argument("-i", action="store_true", dest="case_insensitive",
-                        help="Query for which to search")
+                        help="Search case-insensitively")
+    parser.add_argument("--build-index", action="store_true",
+                        help="Store the search index next to the hive, for later searches")
     args = parser.parse_args()
 
+    if args.build_index:
+        Registry.build_search_index(args.registry_hive)
+
     paths = []
     value_names = []
     values = []
 
-
-    def rec(key, depth, needle):
-        for value in key.values():
-            if (args.case_insensitive and needle in value.name().lower()) or needle in value.name():
-                value_names.append((key.path(), value.name()))
-                sys.stdout.write("n")
-                sys.stdout.flush()
-            try:
-                if (args.case_insensitive and needle in str(value.value()).lower()) or needle in str(value.value()):
-                    values.append((key.path(), value.name()))
-                    sys.stdout.write("v")
-                    sys.stdout.flush()
-            except UnicodeEncodeError:
-                pass
-            except UnicodeDecodeError:
-                pass
-
-        for subkey in key.subkeys():
-            if needle in subkey.name():
-                paths.append(subkey.path())
-                sys.stdout.write("p")
-                sys.stdout.flush()
-            rec(subkey, depth + 1, needle)
-
     reg = Registry.Registry(args.registry_hive)
-    needle = args.query
-    if args.case_insensitive:
-        needle = needle.lower()
-
-    rec(reg.root(), 0, needle)
-    print("")
+    for hit in reg.search(args.query, case_insensitive=args.case_insensitive):
+        if hit.kind == RegistrySearch.KEY:
+            paths.append(hit.path)
+        elif hit.kind == RegistrySearch.VALUE_NAME:
+            value_names.append((hit.path, hit.value_name))
+        else:
+            values.append((hit.path, hit.value_name))
 
     print("[Paths]")
     for path in paths:
@@ -126,20 +126,18 @@ def env_settings(sys_reg):
     Environment Settings
     """
     results = []
-    sys_architecture = []
     registry = Registry.Registry(sys_reg)    
     print(("=" * 51) + "\n[+] Environment Settings\n" + ("=" * 51))
-    key = registry.open("ControlSet00%s\\Control\\Session Manager\\Environment" % control_set_check(sys_reg))    
-    for v in key.values():
-        if v.name() == "PROCESSOR_ARCHITECTURE":
-            sys_architecture = v.value()
-            results.append("[-] Architecture.....: " + str(v.value()))            
-        if v.name() == "NUMBER_OF_PROCESSORS":
-            results.append("[-] Processors.......: " + str(v.value()))
-        if v.name() == "TEMP":
-            results.append("[-] Temp path........: " + str(v.value()))
-        if v.name() == "TMP":
-            results.append("[-] Tmp path.........: " + str(v.value()))                                                                             
+    key = "ControlSet00%s\\Control\\Session Manager\\Environment" % control_set_check(sys_reg)
+    labels = [("PROCESSOR_ARCHITECTURE", "[-] Architecture.....: "),
+              ("NUMBER_OF_PROCESSORS", "[-] Processors.......: "),
+              ("TEMP", "[-] Temp path........: "),
+              ("TMP", "[-] Tmp path.........: ")]
+    values = registry.values_many([(key, name) for name, _ in labels])
+    for name, label in labels:
+        v = values[(key, name)]
+        if v is not None:
+            results.append(label + str(v.value()))
     for line in results:
         print(line)
 
@@ -173,22 +171,14 @@ def os_settings(sys_reg, soft_reg):
     results = []
     registry = Registry.Registry(soft_reg)
     os_dict = {}
-    key = registry.open("Microsoft\\Windows NT\\CurrentVersion")             
-    for v in key.values():
-        if v.name() == "ProductName":
-            os_dict['ProductName'] = v.value()          
-        if v.name() == "ProductId":
-            os_dict['ProductId'] = v.value()              
-        if v.name() == "CSDVersion":
-            os_dict['CSDVersion'] = v.value()
-        if v.name() == "PathName":
-            os_dict['PathName'] = v.value()  
-        if v.name() == "InstallDate":
-            os_dict['InstallDate'] = time.strftime('%a %b %d %H:%M:%S %Y (UTC)', time.gmtime(v.value()))
-        if v.name() == "RegisteredOrganization":
-            os_dict['RegisteredOrganization'] = v.value()   
-        if v.name() == "RegisteredOwner":
-            os_dict['RegisteredOwner'] = v.value()          
+    key = "Microsoft\\Windows NT\\CurrentVersion"
+    names = ["ProductName", "ProductId", "CSDVersion", "PathName", "InstallDate",
+             "RegisteredOrganization", "RegisteredOwner"]
+    for (_, name), v in registry.values_many([(key, name) for name in names]).items():
+        if v is not None:
+            os_dict[name] = v.value()
+    if 'InstallDate' in os_dict:
+        os_dict['InstallDate'] = time.strftime('%a %b %d %H:%M:%S %Y (UTC)', time.gmtime(os_dict['InstallDate']))
                           
     print(("=" * 51) + "\n[+] Operating System Information\n" + ("=" * 51))
     print("[-] Product Name.....: %s" % os_dict['ProductName'])
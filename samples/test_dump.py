@@ -13,57 +13,54 @@ def format_total_values(total_values):
     return "total_values|{total_values}".format(total_values=total_values)
 
 
-def format_key(key):
+def format_key(key, path):
     return "key|{path}|{ts}".format(
-            path=key.path(),
+            path=path,
             ts=key.timestamp().isoformat(chr(ord("T"))) + "Z")
 
 
-def format_value(key, value):
+def format_value(key, path, value):
     try:
-        h = " ".join(["%02X" % (ord(c)) for c in value.raw_data()])
+        h = " ".join(["%02X" % (c) for c in bytearray(value.raw_data())])
     except RegistryParse.UnknownTypeException:
         h = "UNKNOWN_TYPE_SO_UNKNOWN_DATA"
     return "value|{path}|{name}|{type}|{hex}".format(
-            path=key.path(),
+            path=path,
             name=value.name(),
             type=value.value_type(),
             hex=h)
 
 
-def handle_key(key):
-    print(format_key(key))
+def handle_key(key, path):
+    print(format_key(key, path))
 
 
-def handle_value(key, value):
-    print(format_value(key, value))
+def handle_value(key, path, value):
+    print(format_value(key, path, value))
 
 
 class RegistryExplorer(object):
-    def __init__(self, root):
-        self._root = root
+    def __init__(self, registry):
+        self._registry = registry
 
     def handle_pre(self):
         pass
 
-    def handle_key(self, key):
+    def handle_key(self, key, path):
         raise NotImplementedException()
 
-    def handle_value(self, key, value):
+    def handle_value(self, key, path, value):
         raise NotImplementedException()
 
     def handle_post(self):
         pass
 
-    def _rec(self, key):
-        self.handle_key(key)
-        for value in key.values():
-            self.handle_value(key, value)
-        map(self._rec, key.subkeys())
-
     def go(self):
         self.handle_pre()
-        self._rec(self._root)
+        for entry in self._registry.walk(values=True):
+            self.handle_key(entry.key, entry.path)
+            for value in entry.values:
+                self.handle_value(entry.key, entry.path, value)
         self.handle_post()
 
 
@@ -73,19 +70,19 @@ class TestDumper(RegistryExplorer):
         self._key_count = 0
         self._value_count = 0
 
-    def handle_key(self, key):
+    def handle_key(self, key, path):
         self._key_count += 1
         try:
-            print(format_key(key))
+            print(format_key(key, path))
         except UnicodeEncodeError:
             pass
         except UnicodeDecodeError:
             pass
 
-    def handle_value(self, key, value):
+    def handle_value(self, key, path, value):
         self._value_count += 1
         try:
-            print(format_value(key, value))
+            print(format_value(key, path, value))
         except UnicodeEncodeError:
             pass
         except UnicodeDecodeError:
@@ -98,4 +95,4 @@ class TestDumper(RegistryExplorer):
 
 
 reg = Registry.Registry(sys.argv[1])
-TestDumper(reg.root()).go()
+TestDumper(reg).go()
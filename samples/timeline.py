@@ -4,10 +4,10 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import os
-import calendar
 
 import argparse
 from Registry import Registry
+from Registry.RegistryParse import parse_windows_timestamp, windows_timestamp_to_epoch
 
 
 def guess_hive_name(path):
@@ -28,13 +28,9 @@ def main():
                         help="Path to the Windows Registry hive to process")
     args = parser.parse_args()
 
-    def rec(key, visitor):
-        try:
-            visitor(key.timestamp(), key.path())
-        except ValueError:
-            pass
-        for subkey in key.subkeys():
-            rec(subkey, visitor)
+    def rec(reg, visitor):
+        for entry in reg.walk():
+            visitor(entry.key.raw_timestamp(), entry.path)
 
     for filename in args.registry_hives:
         basename = os.path.basename(filename)
@@ -44,16 +40,22 @@ def main():
             def visitor(timestamp, path):
                 try:
                     print("0|[Registry %s] %s|0|0|0|0|0|%s|0|0|0" % \
-                      (basename, path, int(calendar.timegm(timestamp.timetuple()))))
+                      (basename, path, windows_timestamp_to_epoch(timestamp)))
                 except UnicodeDecodeError:
                     pass
 
-            rec(reg.root(), visitor)
+            rec(reg, visitor)
         else:
+            # sort the raw FILETIME integers, and only convert
+            # the timestamps that are printed
             items = []
-            rec(reg.root(), lambda a, b: items.append((a, b)))
-            for i in sorted(items, key=lambda x: x[0]):
-                print("%s\t[Registry %s]%s" % (i[0], basename, i[1]))
+            rec(reg, lambda a, b: items.append((a, b)))
+            items.sort(key=lambda x: x[0])
+            for timestamp, path in items:
+                try:
+                    print("%s\t[Registry %s]%s" % (parse_windows_timestamp(timestamp), basename, path))
+                except ValueError:
+                    pass
 
 if __name__ == "__main__":
     main()
@@ -15,6 +15,7 @@ setup(name='python-registry',
                      "Programming Language :: Python :: 3",
                      "Operating System :: OS Independent", 
                      "License :: OSI Approved :: Apache Software License"],
-     install_requires=['enum34','unicodecsv']
+     install_requires=['enum34','unicodecsv'],
+     extras_require={'numpy': ['numpy']}
      )
 
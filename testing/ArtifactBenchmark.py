@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+#    This file is part of python-registry.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+#   Time the extraction of the built-in artifacts of RegistryArtifacts
+#   from hives, once the way the sample scripts do it, opening the hive
+#   and resolving the paths for each artifact, and once with a single
+#   Extractor traversal, and check that both find the same records.
+#
+#   python ArtifactBenchmark.py [--repeat N] <registry file> [<registry file> ...]
+#
+
+from __future__ import print_function
+
+import sys
+import time
+import argparse
+from fnmatch import fnmatchcase
+
+from Registry import Registry, RegistryParse
+from Registry.RegistryArtifacts import ARTIFACTS, Extractor
+
+
+def expand(key, names):
+    """
+    Resolve the pattern names below a key the way a script would: open
+    each named subkey, and list the subkeys for wildcards.
+    """
+    if not names:
+        yield key
+        return
+    (name, rest) = (names[0], names[1:])
+    if name == "**":
+        for entry in key.walk():
+            for match in expand(entry.key, rest):
+                yield match
+    elif any(c in name for c in "*?["):
+        for subkey in key.subkeys():
+            if fnmatchcase(subkey.name().upper(), name.upper()):
+                for match in expand(subkey, rest):
+                    yield match
+    else:
+        try:
+            subkey = key.subkey(name)
+        except Registry.RegistryKeyNotFoundException:
+            return
+        for match in expand(subkey, rest):
+            yield match
+
+
+def field_value(key, field):
+    try:
+        if "\\" in field.value:
+            (path, _, name) = field.value.rpartition("\\")
+            data = key.find_key(path).value(name).value()
+        else:
+            data = key.value(field.value).value()
+        return field.decoder(data) if field.decoder else data
+    except (RegistryParse.RegistryException, ValueError, TypeError, OverflowError):
+        return None
+
+
+def per_artifact(path):
+    """
+    Extract each artifact on its own, from a newly opened hive.
+    """
+    records = 0
+    hive_type = Registry.Registry(path).hive_type()
+    for artifact in ARTIFACTS:
+        if not artifact.applies_to(hive_type):
+            continue
+        reg = Registry.Registry(path)
+        seen = set()
+        for pattern in artifact.paths:
+            names = [name for name in pattern.split("\\") if name]
+            if names[0].upper() == "CURRENTCONTROLSET":
+                try:
+                    names[0] = "ControlSet%03d" % (reg.open("Select").value("Current").value())
+                except Registry.RegistryKeyNotFoundException:
+                    continue
+            for key in expand(reg.root(), names):
+                if key._nkrecord.offset() in seen:
+                    continue
+                seen.add(key._nkrecord.offset())
+                if artifact.per_value:
+                    records += len(key.values())
+                else:
+                    [field_value(key, field) for field in artifact.fields]
+                    records += 1
+    return records
+
+
+def extractor(path):
+    """
+    Extract all the artifacts in one traversal of the hive.
+    """
+    return sum(1 for _ in Extractor(ARTIFACTS).extract(Registry.Registry(path)))
+
+
+def timed(f, path, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        result = f(path)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the artifact extractor.")
+    parser.add_argument("--repeat", type=int, default=3, help="Take the best of this many runs")
+    parser.add_argument("hives", nargs="+", help="Paths of the hives")
+    args = parser.parse_args()
+
+    print("%8s %12s %10s %8s  %s" % ("records", "per-artifact", "extractor", "speedup", "hive"))
+    for path in args.hives:
+        (slow, slow_records) = timed(per_artifact, path, args.repeat)
+        (fast, fast_records) = timed(extractor, path, args.repeat)
+        if slow_records != fast_records:
+            print("MISMATCH: %s: %d != %d records" % (path, slow_records, fast_records))
+            sys.exit(1)
+        print("%8d %11.3fs %9.3fs %7.1fx  %s" % (fast_records, slow, fast, slow / max(fast, 1e-9), path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+#    This file is part of python-registry.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+#   Time the Marvin32 hashing of every entry of transaction log files,
+#   and check the results against the original ctypes implementation.
+#
+#   python Marvin32Benchmark.py [<log file> ...]
+#
+#   Without arguments, the log files under testing/reg_samples are used.
+#
+
+from __future__ import print_function
+
+import os
+import sys
+import glob
+import time
+from ctypes import c_uint32
+
+from Registry import RegistryParse
+
+SEED = 0x82EF4D887A4E55C5
+
+
+def reference_marvin32(buf, seed=SEED):
+    """
+    The original implementation of HvLEBlock.marvin32_hash.
+    """
+    def rotl(x, n, w):
+        return (x.value << n) | (x.value >> (w - n))
+
+    def to_uint32_le(four_bytes):
+        b1, b2, b3, b4 = bytearray(four_bytes)
+        return b1 | (b2 << 8) | (b3 << 16) | (b4 << 24)
+
+    def marvin32_mix(state, val):
+        lo, hi = state
+        lo.value += val.value
+        hi.value ^= lo.value
+        lo.value = rotl(lo, 20, 32) + hi.value
+        hi.value = rotl(hi, 9, 32) ^ lo.value
+        lo.value = rotl(lo, 27, 32) + hi.value
+        hi.value = rotl(hi, 19, 32)
+        return (lo, hi)
+
+    lo = c_uint32(seed)
+    hi = c_uint32(seed >> 32)
+    state = (lo, hi)
+
+    length = len(buf)
+    pos = 0
+    val = c_uint32()
+
+    while length >= 4:
+        val.value = to_uint32_le(buf[pos:pos+4])
+        state = marvin32_mix(state, val)
+        pos += 4
+        length -= 4
+
+    final = c_uint32(0x80)
+    if length == 3:
+        final.value = (final.value << 8) | bytearray(buf)[pos+2]
+    elif length == 2:
+        final.value = (final.value << 8) | bytearray(buf)[pos+1]
+    elif length == 1:
+        final.value = (final.value << 8) | bytearray(buf)[pos]
+
+    state = marvin32_mix(state, final)
+    state = marvin32_mix(state, c_uint32(0))
+    lo, hi = state
+    return (hi.value << 32 | lo.value)
+
+
+def log_payloads(path):
+    with open(path, "rb") as f:
+        buf = f.read()
+    regf = RegistryParse.REGFBlock(buf, 0, False)
+    offset = regf.first_log_entry_offset()
+    payloads = []
+    while offset + 0x28 <= len(buf) and buf[offset:offset + 4] == b"HvLE":
+        entry = RegistryParse.HvLEBlock(buf, offset, regf)
+        if entry.size() <= 0x28 or offset + entry.size() > len(buf):
+            break
+        payloads.append(buf[offset + 0x28:offset + entry.size()])
+        offset += entry.size()
+    return payloads
+
+
+def timed(f, payloads):
+    start = time.time()
+    hashes = [f(payload) for payload in payloads]
+    return time.time() - start, hashes
+
+
+def main():
+    paths = sys.argv[1:] or sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                          "reg_samples", "*", "*.LOG*")))
+    print("%-9s %8s %10s %10s %8s  %s" % ("bytes", "entries", "reference", "marvin32", "speedup", "log"))
+    for path in paths:
+        payloads = log_payloads(path)
+        total = sum(len(payload) for payload in payloads)
+        (reference_time, reference_hashes) = timed(reference_marvin32, payloads)
+        (fast_time, fast_hashes) = timed(lambda b: RegistryParse.marvin32(b, SEED), payloads)
+        if reference_hashes != fast_hashes:
+            print("MISMATCH: %s" % (path))
+            sys.exit(1)
+        print("%-9d %8d %9.3fs %9.3fs %7.1fx  %s" % (total, len(payloads), reference_time, fast_time,
+                                                     reference_time / max(fast_time, 1e-9), path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+#    This file is part of python-registry.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+#   Report the memory held by, and the number of objects created for,
+#   the RegistryKeys and RegistryValues of a whole hive, with the
+#   __slots__-based classes and with equivalent dict-backed classes.
+#
+#   python MemoryBenchmark.py <registry file> [<registry file> ...]
+#
+
+from __future__ import print_function
+
+import os
+import re
+import sys
+import types
+import tracemalloc
+
+import Registry as package
+
+# Registry and the modules it imports, each after the modules it depends on.
+MODULES = ("RegistryParse", "RegistryLog", "RegistryIndex", "RegistrySearch", "Registry")
+SLOTS = re.compile(r"^\s*__slots__ = .*$", re.MULTILINE)
+
+
+def load_variant(slots):
+    """
+    Load a private copy of the Registry modules listed in MODULES, with or
+    without their __slots__ declarations, and wrap every class __init__
+    there so that the objects it creates are counted.
+    """
+    name = "_registry_%s" % ("slots" if slots else "dict")
+    variant = types.ModuleType(name)
+    variant.__path__ = []
+    variant.created = 0
+    sys.modules[name] = variant
+
+    def counting(init):
+        def __init__(self, *args, **kwargs):
+            variant.created += 1
+            init(self, *args, **kwargs)
+        return __init__
+
+    for module_name in MODULES:
+        path = os.path.join(os.path.dirname(package.__file__), module_name + ".py")
+        with open(path) as f:
+            source = f.read()
+        if not slots:
+            source = SLOTS.sub("", source)
+        module = types.ModuleType("%s.%s" % (name, module_name))
+        module.__file__ = path
+        module.__package__ = name
+        sys.modules[module.__name__] = module
+        setattr(variant, module_name, module)
+        exec(compile(source, path, "exec"), module.__dict__)
+        for value in list(module.__dict__.values()):
+            if isinstance(value, type) and value.__module__ == module.__name__ \
+                    and "__init__" in value.__dict__:
+                value.__init__ = counting(value.__init__)
+    return variant
+
+
+def measure(path, variant):
+    variant.created = 0
+    tracemalloc.start()
+    reg = variant.Registry.Registry(path)
+    base = tracemalloc.get_traced_memory()[0]
+    entries = list(reg.walk(values=True))
+    held = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    keys = len(entries)
+    values = sum(len(entry.values) for entry in entries)
+    return (keys, values, float(held) / keys, float(variant.created) / keys)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("  USAGE:\n\t%s <Registry Hive file> [...]" % (sys.argv[0]))
+        sys.exit(-1)
+
+    variants = [("dict", load_variant(False)), ("slots", load_variant(True))]
+    print("%-8s %10s %10s %12s %12s  %s" % ("layout", "keys", "values", "bytes/key", "objects/key", "hive"))
+    for path in sys.argv[1:]:
+        for label, variant in variants:
+            (keys, values, bytes_per_key, objects_per_key) = measure(path, variant)
+            print("%-8s %10d %10d %12.1f %12.2f  %s" % (label, keys, values,
+                                                        bytes_per_key, objects_per_key, path))
+
+
+if __name__ == "__main__":
+    main()
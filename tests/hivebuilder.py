@@ -0,0 +1,197 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Build small synthetic primary hives for the tests.
+
+Only the structures python-registry reads are written: a REGF block,
+one HBIN, NK records, subkey lists (lf, lh, li and ri), value lists,
+VK records and db records for large values.
+
+build_log() writes new format (Windows 8.1) transaction log files.
+"""
+import struct
+
+from Registry.RegistryParse import marvin32
+
+MARVIN32_SEED = 0x82EF4D887A4E55C5
+
+
+class Key(object):
+    def __init__(self, name, values=None, subkeys=None, list_type="lh",
+                 ri_chunk=None, timestamp=0x01D1C4D1C4D1C4D1, sort=True):
+        self.name = name
+        self.values = values or []
+        self.subkeys = subkeys or []
+        self.list_type = list_type
+        self.ri_chunk = ri_chunk
+        self.timestamp = timestamp
+        self.sort = sort
+
+
+def _encode_name(name):
+    try:
+        return name.encode("ascii"), True
+    except UnicodeEncodeError:
+        return name.encode("utf-16le"), False
+
+
+def lh_hash(name):
+    h = 0
+    for c in name.upper():
+        h = (h * 37 + ord(c)) & 0xFFFFFFFF
+    return h
+
+
+class HiveBuilder(object):
+    def __init__(self, hive_name="SYNTHETIC"):
+        self._hive_name = hive_name
+        self._data = bytearray(b"\x00" * 0x20)
+
+    def _alloc(self, payload):
+        size = (len(payload) + 4 + 7) & ~7
+        offset = len(self._data)
+        self._data += struct.pack("<i", -size) + payload
+        self._data += b"\x00" * (offset + size - len(self._data))
+        return offset
+
+    def _patch(self, offset, fmt, *args):
+        struct.pack_into(fmt, self._data, offset, *args)
+
+    def _value(self, name, data_type, data):
+        raw_name, ascii_name = _encode_name(name)
+        if len(data) <= 4:
+            length = len(data) | 0x80000000
+            data_offset = struct.unpack("<I", data.ljust(4, b"\x00"))[0]
+        elif len(data) > 0x3fd8:
+            length = len(data)
+            segments = [self._alloc(data[i:i + 0x3fd8])
+                        for i in range(0, len(data), 0x3fd8)]
+            indirect = self._alloc(struct.pack("<%dI" % len(segments), *segments))
+            data_offset = self._alloc(b"db" + struct.pack("<HI", len(segments), indirect))
+        else:
+            length = len(data)
+            data_offset = self._alloc(data)
+        return self._alloc(b"vk" + struct.pack("<HIIIHH", len(raw_name), length, data_offset,
+                                               data_type, 1 if ascii_name else 0, 0) + raw_name)
+
+    def _subkey_list(self, list_type, entries):
+        if list_type == "li":
+            return self._alloc(b"li" + struct.pack("<H", len(entries)) +
+                               b"".join(struct.pack("<I", off) for off, _ in entries))
+        blob = b""
+        for off, name in entries:
+            if list_type == "lh":
+                blob += struct.pack("<II", off, lh_hash(name))
+            else:
+                blob += struct.pack("<I", off) + name.encode("ascii", "replace")[:4].ljust(4, b"\x00")
+        return self._alloc(list_type.encode("ascii") + struct.pack("<H", len(entries)) + blob)
+
+    def _key(self, key, parent_offset, root=False):
+        raw_name, ascii_name = _encode_name(key.name)
+        flags = (0x20 if ascii_name else 0) | (0x0C if root else 0)
+        offset = self._alloc(b"nk" + b"\x00" * 0x4A + raw_name)
+        self._patch(offset + 6, "<HQ15IHH", flags, key.timestamp, 0,
+                    parent_offset, len(key.subkeys), 0, 0xFFFFFFFF, 0xFFFFFFFF,
+                    len(key.values), 0xFFFFFFFF, 0xFFFFFFFF, 0xFFFFFFFF,
+                    0, 0, 0, 0, 0, len(raw_name), 0)
+
+        if key.values:
+            vks = [self._value(*v) for v in key.values]
+            values_list = self._alloc(struct.pack("<%dI" % len(vks), *vks))
+            self._patch(offset + 4 + 0x28, "<I", values_list)
+
+        if key.subkeys:
+            children = key.subkeys
+            if key.sort:
+                children = sorted(children, key=lambda k: k.name.upper())
+            entries = [(self._key(k, offset), k.name) for k in children]
+            if key.ri_chunk:
+                chunks = [self._subkey_list(key.list_type, entries[i:i + key.ri_chunk])
+                          for i in range(0, len(entries), key.ri_chunk)]
+                subkey_list = self._alloc(b"ri" + struct.pack("<H%dI" % len(chunks), len(chunks), *chunks))
+            else:
+                subkey_list = self._subkey_list(key.list_type, entries)
+            self._patch(offset + 4 + 0x1C, "<I", subkey_list)
+        return offset
+
+    def build(self, root, sequence1=1, sequence2=1):
+        root_offset = self._key(root, 0xFFFFFFFF, root=True)
+
+        hbin_size = (len(self._data) + 0xFFF) & ~0xFFF
+        if hbin_size - len(self._data) < 8:
+            hbin_size += 0x1000
+        self._data += struct.pack("<i", hbin_size - len(self._data))
+        self._data += b"\x00" * (hbin_size - len(self._data))
+        self._patch(0, "<4sII", b"hbin", 0, hbin_size)
+
+        regf = bytearray(0x1000)
+        struct.pack_into("<4sIIQIIIIII", regf, 0, b"regf", sequence1, sequence2, 0,
+                         1, 5, 0, 1, root_offset, hbin_size)
+        struct.pack_into("<I", regf, 0x2C, 1)
+        name = self._hive_name.encode("utf-16le")[:64]
+        regf[0x30:0x30 + len(name)] = name
+        set_checksum(regf)
+        return bytes(regf + self._data)
+
+
+def set_checksum(regf):
+    xsum = 0
+    for i in range(0, 0x1FC, 4):
+        xsum ^= struct.unpack_from("<I", regf, i)[0]
+    struct.pack_into("<I", regf, 0x1FC, xsum)
+
+
+def build_hive(root, hive_name="SYNTHETIC", **kwargs):
+    return HiveBuilder(hive_name).build(root, **kwargs)
+
+
+def mid_update(hive):
+    """
+    Mark a primary hive as being in the middle of an update, as it is
+    left when the system stops before the hive is written completely.
+    """
+    regf = bytearray(hive[:0x1000])
+    sequence2 = struct.unpack_from("<I", regf, 0x8)[0]
+    struct.pack_into("<I", regf, 0x4, sequence2 + 1)
+    set_checksum(regf)
+    return bytes(regf) + hive[0x1000:]
+
+
+def dirty_pages(old, new):
+    """
+    List the (offset, data) pages, relative to the first HBIN, of the
+    hive `new` that differ from those of the hive `old`.
+    """
+    pages = []
+    for offset in range(0x1000, len(new), 0x1000):
+        if old[offset:offset + 0x1000] != new[offset:offset + 0x1000]:
+            pages.append((offset - 0x1000, new[offset:offset + 0x1000]))
+    return pages
+
+
+def build_log(sequence, entries):
+    """
+    Build a new format transaction log file.
+    Arguments:
+    - `sequence`: The sequence number of the first log entry.
+    - `entries`: A list of (hbins_size, pages) tuples, one for each log entry,
+          where pages is a list of (offset, data) tuples as from dirty_pages().
+    """
+    regf = bytearray(0x200)
+    struct.pack_into("<4sIIQIIIIII", regf, 0, b"regf", sequence, sequence, 0,
+                     1, 5, 6, 1, 0, entries[0][0] if entries else 0)
+    struct.pack_into("<I", regf, 0x2C, 1)
+    set_checksum(regf)
+
+    log = regf
+    for i, (hbins_size, pages) in enumerate(entries):
+        body = b"".join(struct.pack("<II", offset, len(data)) for offset, data in pages)
+        body += b"".join(data for _, data in pages)
+        size = (0x28 + len(body) + 0x1FF) & ~0x1FF
+        entry = bytearray(size)
+        struct.pack_into("<4sIIIII", entry, 0, b"HvLE", size, 0, sequence + i, hbins_size, len(pages))
+        entry[0x28:0x28 + len(body)] = body
+        struct.pack_into("<Q", entry, 0x18, marvin32(bytes(entry[0x28:]), MARVIN32_SEED))
+        struct.pack_into("<Q", entry, 0x20, marvin32(bytes(entry[:0x20]), MARVIN32_SEED))
+        log += entry
+    return bytes(log)
@@ -0,0 +1,59 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import unittest
+
+from Registry import Registry
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestToArrays(unittest.TestCase):
+    def setUp(self):
+        self.paths = [os.path.join(os.path.dirname(__file__), "reg_samples", name)
+                      for name in ("UNICODE_TESTS", "issue22.hive")]
+
+    def test_matches_walk(self):
+        for path in self.paths:
+            reg = Registry.Registry(path)
+            arrays = reg.to_arrays()
+            entries = list(reg.walk(values=True))
+
+            self.assertEqual(len(arrays.keys), len(entries))
+            self.assertEqual(len(arrays.values), sum(len(e.values) for e in entries))
+            self.assertEqual(len(set(arrays.names)), len(arrays.names))
+
+            offsets = dict((row["offset"], i) for i, row in enumerate(arrays.keys))
+            for row, entry in zip(arrays.keys, entries):
+                key = entry.key
+                self.assertEqual(arrays.names[row["name"]], key.name())
+                self.assertEqual(row["depth"], entry.depth)
+                self.assertEqual(row["subkeys"], key.subkeys_number())
+                self.assertEqual(row["values"], key.values_number())
+                self.assertEqual(Registry.RegistryParse.parse_windows_timestamp(row["timestamp"]),
+                                 key.timestamp())
+                if entry.depth == 0:
+                    self.assertEqual(row["parent"], -1)
+                else:
+                    parent = arrays.keys[offsets[row["parent"]]]
+                    self.assertEqual(parent["depth"], entry.depth - 1)
+
+            values = [(e.key, v) for e in entries for v in e.values]
+            for row, (key, value) in zip(arrays.values, values):
+                self.assertEqual(row["key"], key._nkrecord.offset())
+                self.assertEqual(arrays.names[row["name"]], value._vkrecord.name())
+                self.assertEqual(row["type"], value.value_type())
+
+    def test_vectorized(self):
+        arrays = Registry.Registry(self.paths[1]).to_arrays()
+        leaves = arrays.keys[arrays.keys["subkeys"] == 0]
+        self.assertEqual(len(leaves), 1)
+        self.assertEqual(numpy.count_nonzero(arrays.values["type"] == Registry.RegSZ), 3)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,122 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import io
+import struct
+import unittest
+
+from Registry import Registry, RegistryParse
+from Registry.RegistryArtifacts import ARTIFACTS, Artifact, Extractor, Field, unix_timestamp, \
+    windows_timestamp
+from hivebuilder import Key, build_hive
+
+
+def sz(s):
+    return (s + u"\x00").encode("utf-16le")
+
+
+def dword(n):
+    return struct.pack("<I", n)
+
+
+def control_set(services):
+    return Key("ControlSet00x", subkeys=[
+        Key("Control", subkeys=[
+            Key("ComputerName", subkeys=[
+                Key("ComputerName", values=[("ComputerName", RegistryParse.RegSZ, sz(u"HOST"))])]),
+            Key("TimeZoneInformation", values=[("Bias", RegistryParse.RegDWord, dword(60))]),
+        ]),
+        Key("Services", subkeys=services),
+    ])
+
+
+def system_hive():
+    current = control_set([
+        Key("alpha", values=[("DisplayName", RegistryParse.RegSZ, sz(u"Alpha")),
+                             ("Start", RegistryParse.RegDWord, dword(2))],
+            subkeys=[Key("Parameters", values=[("ServiceDll", RegistryParse.RegSZ, sz(u"a.dll"))])]),
+        Key("beta", values=[("ImagePath", RegistryParse.RegSZ, sz(u"beta.exe"))]),
+    ])
+    current.name = "ControlSet002"
+    old = control_set([Key("old")])
+    old.name = "ControlSet001"
+    return Registry.Registry(io.BytesIO(build_hive(Key("ROOT", subkeys=[
+        Key("Select", values=[("Current", RegistryParse.RegDWord, dword(2))]), old, current,
+    ]), hive_name=u"\\SystemRoot\\Config\\SYSTEM")))
+
+
+def user_hive():
+    bags = Key("BagMRU", values=[("NodeSlot", RegistryParse.RegDWord, dword(1))], subkeys=[
+        Key("0", values=[("NodeSlot", RegistryParse.RegDWord, dword(2))], subkeys=[Key("0"), Key("1")]),
+        Key("1"),
+    ])
+    return Registry.Registry(io.BytesIO(build_hive(Key("ROOT", subkeys=[
+        Key("Software", subkeys=[
+            Key("Microsoft", subkeys=[Key("Windows", subkeys=[
+                Key("CurrentVersion", subkeys=[Key("Run", values=[
+                    ("updater", RegistryParse.RegSZ, sz(u"u.exe")),
+                    ("", RegistryParse.RegSZ, sz(u"default.exe"))])]),
+                Key("Shell", subkeys=[bags]),
+            ])]),
+        ]),
+    ]), hive_name=u"\\??\\C:\\Users\\u\\ntuser.dat")))
+
+
+class TestExtractor(unittest.TestCase):
+    def test_system(self):
+        reg = system_hive()
+        self.assertEqual(reg.hive_type(), Registry.HiveType.SYSTEM)
+        records = list(Extractor(ARTIFACTS).extract(reg))
+        self.assertEqual([type(r).__name__ for r in records],
+                         ["ComputerName", "TimeZone", "Service", "Service"])
+        (computer, timezone, alpha, beta) = records
+        self.assertEqual(computer.ComputerName, u"HOST")
+        self.assertEqual(computer.path, "ROOT\\ControlSet002\\Control\\ComputerName\\ComputerName")
+        self.assertEqual((timezone.Bias, timezone.ActiveTimeBias), (60, None))
+        self.assertEqual((alpha.path, alpha.DisplayName, alpha.Start, alpha.ServiceDll, alpha.ImagePath),
+                         ("ROOT\\ControlSet002\\Services\\alpha", u"Alpha", 2, u"a.dll", None))
+        self.assertEqual((beta.ImagePath, beta.ServiceDll), (u"beta.exe", None))
+        self.assertEqual(alpha.last_written, reg.open("ControlSet002\\Services\\alpha").raw_timestamp())
+
+    def test_user(self):
+        reg = user_hive()
+        records = list(Extractor(ARTIFACTS).extract(reg))
+        autoruns = [(r.name, r.data) for r in records if type(r).__name__ == "UserAutorun"]
+        self.assertEqual(autoruns, [(u"updater", u"u.exe"), (u"(default)", u"default.exe")])
+        bags = [r for r in records if type(r).__name__ == "ShellBag"]
+        prefix = "ROOT\\Software\\Microsoft\\Windows\\Shell\\BagMRU"
+        self.assertEqual([r.path[len(prefix):] for r in bags], ["", "\\0", "\\0\\0", "\\0\\1", "\\1"])
+        self.assertEqual([r.NodeSlot for r in bags], [1, 2, None, None, None])
+
+    def test_plan(self):
+        artifacts = [
+            Artifact("Any", [], "**\\0", ["NodeSlot"]),
+            Artifact("Glob", [], "Software\\*\\W?ndows", [Field("Slot", "Shell\\BagMRU\\NodeSlot"),
+                                                          Field("Time", "Shell\\BagMRU\\NodeSlot",
+                                                                decoder=unix_timestamp)]),
+            Artifact("Two", [Registry.HiveType.SAM], ["Software", "SOFTWARE"], []),
+            Artifact("Missing", [], "Software\\Nothing\\*", []),
+        ]
+        extractor = Extractor(artifacts)
+        reg = user_hive()
+        records = list(extractor.extract(reg))
+        self.assertEqual([(type(r).__name__, r.path.count("\\")) for r in records],
+                         [("Glob", 3), ("Any", 6), ("Any", 7)])
+        self.assertEqual(records[0].Slot, 1)
+        self.assertEqual(records[0].Time.year, 1970)
+        self.assertEqual(len(extractor.artifacts(Registry.HiveType.SAM)), 4)
+
+        records = list(extractor.extract(reg, hive_type=Registry.HiveType.SAM))
+        self.assertEqual([type(r).__name__ for r in records][:2], ["Two", "Glob"])
+
+    def test_undecodable_field(self):
+        reg = Registry.Registry(io.BytesIO(build_hive(Key("ROOT", subkeys=[
+            Key("a", values=[("Time", RegistryParse.RegBin, b"\x01\x02\x03\x04")]),
+            Key("b", values=[("Time", RegistryParse.RegBin, struct.pack("<Q", 116444736000000000))]),
+        ]))))
+        artifacts = [Artifact("Stamp", [], "*", [Field("Time", decoder=windows_timestamp)])]
+        records = list(Extractor(artifacts).extract(reg))
+        self.assertEqual([r.Time if r.Time is None else r.Time.year for r in records], [None, 1970])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from Registry import Registry, RegistryBatch
+from hivebuilder import Key, build_hive, build_log, dirty_pages, mid_update
+
+
+def count_keys(reg):
+    return sum(1 for _ in reg.walk())
+
+
+def fail_on_large(reg):
+    if reg.root().subkeys_number() > 3:
+        raise ValueError("too many keys")
+    return reg.root().subkeys_number()
+
+
+def key_path(entry):
+    return (entry.path, entry.depth)
+
+
+def odd_keys(entry):
+    if entry.key.name().endswith(("1", "3")):
+        return entry.path
+
+
+def prune_b(entry):
+    return entry.key.name().startswith("b")
+
+
+def tree(depth):
+    if depth == 0:
+        return []
+    return [Key("%s%d" % (name, i), subkeys=tree(depth - 1), list_type=list_type)
+            for name, list_type in (("a", "lh"), ("b", "li")) for i in range(4)]
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.paths = []
+        for i in range(6):
+            path = os.path.join(self.dir, "hive%d" % i)
+            with open(path, "wb") as f:
+                f.write(build_hive(Key("ROOT", subkeys=[Key("k%d" % j) for j in range(i)])))
+            self.paths.append(path)
+        self.paths.append(os.path.join(self.dir, "missing"))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_ordered(self):
+        for chunksize in (1, 4):
+            batch = RegistryBatch.Batch(count_keys, workers=2, chunksize=chunksize, ordered=True)
+            results = list(batch.run(self.paths))
+            self.assertEqual([r.index for r in results], list(range(7)))
+            self.assertEqual([r.result for r in results], [1, 2, 3, 4, 5, 6, None])
+            self.assertEqual(results[-1].path, self.paths[-1])
+            self.assertTrue("No such file" in results[-1].error or "cannot find" in results[-1].error)
+
+            stats = batch.stats()
+            self.assertEqual((stats.hives, stats.failed), (7, 1))
+            self.assertTrue(stats.hives_per_second > 0)
+            self.assertTrue(stats.max_latency >= stats.mean_latency >= 0)
+
+    def test_unordered_errors(self):
+        results = sorted(RegistryBatch.run(fail_on_large, self.paths[:6], workers=3, mmap=True))
+        self.assertEqual([r.result for r in results], [0, 1, 2, 3, None, None])
+        self.assertTrue(all("too many keys" in r.error for r in results[4:]))
+
+    def test_summarize(self):
+        results = list(RegistryBatch.run(RegistryBatch.summarize, self.paths[2:3], workers=1))
+        self.assertEqual(results[0].result["keys"], 3)
+        self.assertEqual(results[0].result["hive_name"], "SYNTHETIC")
+
+
+class TestWalkParallel(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "SOFTWARE")
+        with open(self.path, "wb") as f:
+            f.write(build_hive(Key("ROOT", subkeys=[Key("Classes", subkeys=tree(3)), Key("Empty")])))
+        self.reg = Registry.Registry(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def walk(self, function, start=None, **kwargs):
+        key = self.reg.open(start) if start else None
+        return [r for r in map(function, self.reg.walk(key, **kwargs)) if r is not None]
+
+    def test_same_as_walk(self):
+        expected = self.walk(key_path)
+        self.assertEqual(len(expected), 1 + 1 + 8 + 64 + 512 + 1)
+        for split_depth in (1, 2, 3, 5):
+            for chunksize in (1, 7):
+                self.assertEqual(list(RegistryBatch.walk_parallel(
+                    self.path, key_path, split_depth=split_depth, workers=2, chunksize=chunksize)), expected)
+
+    def test_options(self):
+        self.assertEqual(list(RegistryBatch.walk_parallel(self.path, odd_keys, split_depth=2,
+                                                          start="Classes", workers=2)),
+                         self.walk(odd_keys, start="Classes"))
+        for max_depth in (0, 1, 2):
+            self.assertEqual(list(RegistryBatch.walk_parallel(self.path, key_path, split_depth=2,
+                                                              prune=prune_b, max_depth=max_depth,
+                                                              mmap=False, workers=2)),
+                             self.walk(key_path, prune=prune_b, max_depth=max_depth))
+        self.assertRaises(ValueError, list, RegistryBatch.walk_parallel(self.path, key_path, split_depth=0))
+
+    def test_worker_hive_options(self):
+        old = build_hive(Key("ROOT", subkeys=[Key("k0")]), sequence1=10, sequence2=10)
+        new = build_hive(Key("ROOT", subkeys=[Key("k0"), Key("k1")]))
+        with open(self.path, "wb") as f:
+            f.write(mid_update(old))
+        with open(self.path + ".LOG1", "wb") as f:
+            f.write(build_log(10, [(len(new) - 0x1000, dirty_pages(old, new))]))
+        # the hive registry of this process holds the primary file alone
+        primary = Registry.open_hive(self.path, mmap=False)
+        try:
+            root = Registry.Registry.open_with_logs(self.path).root()._nkrecord.offset()
+            for logs in (False, True):
+                paths = RegistryBatch._walk_chunk(self.path, True, logs, key_path, [(root, "", 0, ())],
+                                                  None, None, False)
+                self.assertEqual(len(paths), 3 if logs else 2)
+            self.assertFalse(primary in RegistryBatch._walk_hives.values())
+        finally:
+            Registry.close_hive(self.path)
+            RegistryBatch._walk_hives.clear()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,143 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import hashlib
+import io
+import os
+import struct
+import tempfile
+import unittest
+
+from Registry import Registry, RegistryParse
+from hivebuilder import Key, build_hive
+
+BLOB = bytes(bytearray(i % 251 for i in range(100000)))
+TEXT = (u"large string value " * 2000).encode("utf-16le") + b"\x00\x00"
+
+
+def large_registry(**kwargs):
+    root = Key("ROOT", values=[
+        ("blob", RegistryParse.RegBin, BLOB),
+        ("text", RegistryParse.RegSZ, TEXT),
+        ("small", RegistryParse.RegBin, b"0123456789"),
+        ("dword", RegistryParse.RegDWord, b"\x2a\x00\x00\x00"),
+    ])
+    f = tempfile.NamedTemporaryFile(delete=False)
+    f.write(build_hive(root))
+    f.close()
+    return f.name
+
+
+class TestLargeData(unittest.TestCase):
+    def setUp(self):
+        self.path = large_registry()
+        self.reg = Registry.Registry(self.path)
+        self.root = self.reg.root()
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_raw_data(self):
+        self.assertEqual(self.root.value("blob").raw_data(), BLOB)
+        self.assertEqual(self.root.value("blob").value(), BLOB)
+        self.assertEqual(self.root.value("text").value(), u"large string value " * 2000)
+
+    def test_iter_data_chunks(self):
+        chunks = list(self.root.value("blob").iter_data_chunks())
+        self.assertTrue(len(chunks) > 1)
+        self.assertTrue(all(isinstance(chunk, memoryview) for chunk in chunks))
+        self.assertEqual(b"".join(chunk.tobytes() for chunk in chunks), BLOB)
+
+        h = hashlib.sha256()
+        for chunk in self.root.value("text").iter_data_chunks():
+            h.update(chunk)
+        self.assertEqual(h.digest(), hashlib.sha256(TEXT).digest())
+
+        for name in ("small", "dword"):
+            value = self.root.value(name)
+            self.assertEqual(b"".join(c.tobytes() for c in value.iter_data_chunks()), value.raw_data())
+
+    def test_open_data(self):
+        f = self.root.value("blob").open_data()
+        self.assertTrue(f.readable() and f.seekable())
+        self.assertEqual(f.read(10), BLOB[:10])
+        f.seek(0x3fd0)
+        self.assertEqual(f.read(0x20), BLOB[0x3fd0:0x3ff0])
+        self.assertEqual(f.tell(), 0x3ff0)
+        f.seek(-5, io.SEEK_END)
+        self.assertEqual(f.read(), BLOB[-5:])
+        self.assertEqual(f.read(), b"")
+        f.seek(0)
+        self.assertEqual(f.read(), BLOB)
+
+        buf = bytearray(0x5000)
+        f.seek(100)
+        self.assertEqual(f.readinto(buf), 0x5000)
+        self.assertEqual(bytes(buf), BLOB[100:100 + 0x5000])
+
+        self.assertEqual(self.root.value("dword").open_data().read(), b"\x2a\x00\x00\x00")
+
+    def test_mmap(self):
+        with Registry.Registry(self.path, mmap=True) as reg:
+            value = reg.root().value("blob")
+            self.assertEqual(value.raw_data(), BLOB)
+            self.assertEqual(value.open_data().read(), BLOB)
+            self.assertEqual(b"".join(c.tobytes() for c in value.iter_data_chunks()), BLOB)
+
+    def test_short_segments(self):
+        vk = self.root.value("blob")._vkrecord
+        indirect = RegistryParse.HBINCell(self.reg._buf, vk.data_offset(), None).child().indirect_block()
+        extents = indirect.data_extents(len(BLOB))
+        with open(self.path, "rb") as f:
+            hive = bytearray(f.read())
+
+        # a segment is cut at the end of its cell, and the data runs short
+        size = struct.unpack_from(str("<i"), hive, extents[-1][0] - 4)[0]
+        struct.pack_into(str("<i"), hive, extents[-1][0] - 4, -0x10)
+        value = Registry.Registry(io.BytesIO(bytes(hive))).root().value("blob")
+        self.assertRaises(RegistryParse.ParseException, value.raw_data)
+
+        # the block lists fewer segments than the data needs
+        struct.pack_into(str("<i"), hive, extents[-1][0] - 4, size)
+        struct.pack_into(str("<i"), hive, indirect.parent().offset(), -8)
+        value = Registry.Registry(io.BytesIO(bytes(hive))).root().value("blob")
+        self.assertRaises(RegistryParse.ParseException, value.raw_data)
+
+
+
+class TestProjection(unittest.TestCase):
+    def setUp(self):
+        def entry(i):
+            return Key("entry%d" % i, values=[
+                ("15", RegistryParse.RegSZ, (u"C:\\file%d.exe\x00" % i).encode("utf-16le")),
+                ("6", RegistryParse.RegDWord, struct.pack("<I", i)),
+                ("", RegistryParse.RegSZ, u"default\x00".encode("utf-16le")),
+                ("Name", RegistryParse.RegDWord, struct.pack("<I", 1)),
+                ("NAME", RegistryParse.RegDWord, struct.pack("<I", 2)),
+            ])
+        self.reg = Registry.Registry(io.BytesIO(build_hive(Key("ROOT", subkeys=[
+            Key("File", subkeys=[entry(i) for i in range(3)]), Key("Empty")]))))
+
+    def test_values_dict(self):
+        values = self.reg.open("File\\entry1").values_dict()
+        self.assertEqual(sorted(values), ["", "15", "6", "name"])
+        self.assertEqual(values["name"].value(), 1)
+        self.assertEqual(values[""].name(), "(default)")
+        self.assertEqual(self.reg.open("Empty").values_dict(), {})
+
+    def test_project(self):
+        key = self.reg.open("File\\entry2")
+        self.assertEqual(key.project(["6", "15", "missing", "(default)", "name"]),
+                         [2, u"C:\\file2.exe", None, u"default", 1])
+        self.assertEqual(key.project(["missing"], default=0), [0])
+        for name in ("15", "(default)", "Name"):
+            self.assertEqual(key.project([name]), [key.value(name).value()])
+
+    def test_project_subkeys(self):
+        rows = list(self.reg.open("File").project_subkeys(["15", "6"]))
+        self.assertEqual([(key.name(), data) for key, data in rows],
+                         [("entry%d" % i, [u"C:\\file%d.exe" % i, i]) for i in range(3)])
+        self.assertEqual(list(self.reg.open("Empty").project_subkeys(["15"])), [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,97 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from Registry import Registry, RegistryIndex, RegistryParse
+from hivebuilder import Key, build_hive
+
+
+def tree():
+    def leaves(prefix):
+        return [Key(u"%s%02d" % (prefix, i), values=[("v", RegistryParse.RegDWord, b"\x01\x00\x00\x00")])
+                for i in range(20)]
+    return Key("ROOT", subkeys=[
+        Key("Software", subkeys=[Key("Vendor", subkeys=leaves("app")), Key(u"Sch\xf6n")]),
+        Key("System", subkeys=leaves("svc"), ri_chunk=6),
+        Key("Empty"),
+    ])
+
+
+def walked(reg, key=None, **kwargs):
+    return [(e.path, e.depth, e.key._nkrecord.offset()) for e in reg.walk(key, **kwargs)]
+
+
+def prune_vendor(entry):
+    return entry.key.name() == "Vendor"
+
+
+class TestIndex(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "SOFTWARE")
+        self.hive = build_hive(tree(), sequence1=3, sequence2=3)
+        with open(self.path, "wb") as f:
+            f.write(self.hive)
+        self.plain = Registry.Registry(self.path, index=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_build_and_load(self):
+        self.assertEqual(self.plain.index(), None)
+        path = Registry.build_index(self.path)
+        self.assertEqual(path, self.path + ".regidx")
+        for mmap in (False, True):
+            with Registry.Registry(self.path, mmap=mmap) as reg:
+                index = reg.index()
+                self.assertNotEqual(index, None)
+                self.assertEqual(len(index), len(walked(self.plain)))
+                for entry in index.entries():
+                    nk = reg.key_at(entry.offset)._nkrecord
+                    if entry.parent_offset is not None:
+                        self.assertEqual(entry.parent_offset, nk.parent_key_offset())
+                    if nk.values_number() > 0:
+                        self.assertEqual(entry.values_offset, nk.values_list().offset())
+                        self.assertEqual(entry.values_number, nk.values_number())
+        self.assertEqual(Registry.Registry(io.BytesIO(self.hive)).index(), None)
+
+    def test_walk(self):
+        Registry.build_index(self.path)
+        reg = Registry.Registry(self.path)
+        self.assertEqual(walked(reg), walked(self.plain))
+        self.assertEqual(walked(reg, prune=prune_vendor), walked(self.plain, prune=prune_vendor))
+        for max_depth in (0, 1, 2):
+            self.assertEqual(walked(reg, max_depth=max_depth), walked(self.plain, max_depth=max_depth))
+        self.assertEqual(walked(reg, reg.open("Software")), walked(self.plain, self.plain.open("Software")))
+        self.assertEqual(walked(reg, order="post"), walked(self.plain, order="post"))
+        entries = list(reg.walk(values=True))
+        self.assertEqual([len(e.values) for e in entries], [len(e.key.values()) for e in entries])
+
+    def test_open(self):
+        Registry.build_index(self.path)
+        reg = Registry.Registry(self.path)
+        for path in ("Software\\Vendor\\app07", "SOFTWARE\\vendor\\APP07\\", u"Software\\SCH\xd6N",
+                     "System\\svc19", "Empty"):
+            self.assertEqual(reg.open(path)._nkrecord.offset(), self.plain.open(path)._nkrecord.offset())
+        self.assertEqual(reg.open("Software").find_key("Vendor\\app03").path(), "ROOT\\Software\\Vendor\\app03")
+        for path in ("Software\\Vendor\\app20", "Missing", "Empty\\x"):
+            self.assertRaises(Registry.RegistryKeyNotFoundException, reg.open, path)
+
+    def test_stale_index(self):
+        Registry.build_index(self.path)
+        with open(self.path, "wb") as f:
+            f.write(build_hive(tree(), sequence1=4, sequence2=4))
+        self.assertEqual(Registry.Registry(self.path).index(), None)
+
+        with open(self.path + ".regidx", "wb") as f:
+            f.write(b"regfidx\x00" + b"\x00" * 16)
+        self.assertEqual(Registry.Registry(self.path).index(), None)
+        self.assertRaises(RegistryParse.ParseException, RegistryIndex.HiveIndex, b"junk")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
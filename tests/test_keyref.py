@@ -0,0 +1,97 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import io
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from Registry import Registry, RegistryBatch, RegistryParse
+from hivebuilder import Key, build_hive, build_log, dirty_pages, mid_update
+
+
+def key_ref(entry):
+    return entry.key.ref()
+
+
+def ref_path(ref):
+    return ref.key().path()
+
+
+class TestKeyRef(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "NTUSER.DAT")
+        self.hive = build_hive(Key("ROOT", subkeys=[
+            Key("Software", subkeys=[Key("k%d" % i, subkeys=[Key("leaf")]) for i in range(5)])]))
+        with open(self.path, "wb") as f:
+            f.write(self.hive)
+
+    def tearDown(self):
+        Registry.close_hive(self.path)
+        Registry.close_hive("memory")
+        shutil.rmtree(self.dir)
+
+    def test_resolve(self):
+        reg = Registry.Registry(self.path)
+        self.assertEqual(reg.hive_id(), os.path.abspath(self.path))
+        key = reg.open("Software\\k3\\leaf")
+        ref = key.ref()
+        self.assertEqual(ref, Registry.KeyRef(self.path, key._nkrecord.offset()))
+        self.assertEqual(hash(ref), hash(key.ref()))
+        self.assertEqual(pickle.loads(pickle.dumps(ref)), ref)
+        self.assertTrue(len(pickle.dumps(ref, 2)) < 200)
+
+        self.assertEqual(ref.key().path(), key.path())
+        self.assertTrue(Registry.get_hive(self.path) is ref.key()._registry)
+        self.assertTrue(Registry.open_hive(self.path) is Registry.get_hive(self.path))
+        self.assertRaises(RegistryParse.ParseException, reg.key_at, 0x1000)
+
+    def test_unnamed_hive(self):
+        reg = Registry.Registry(io.BytesIO(self.hive))
+        self.assertEqual(reg.hive_id(), None)
+        self.assertRaises(ValueError, reg.root().ref)
+        self.assertRaises(ValueError, Registry.register_hive, reg)
+        self.assertEqual(Registry.register_hive(reg, "memory"), "memory")
+        ref = reg.open("Software\\k1").ref()
+        self.assertEqual(ref.hive_id, "memory")
+        self.assertTrue(ref.key()._registry is reg)
+
+    def test_recovered_hive(self):
+        old = build_hive(Key("ROOT", subkeys=[Key("k%d" % i) for i in range(5)]), sequence1=10, sequence2=10)
+        new = build_hive(Key("ROOT", subkeys=[Key("k%d" % i) for i in range(6)]))
+        with open(self.path, "wb") as f:
+            f.write(mid_update(old))
+        with open(self.path + ".LOG1", "wb") as f:
+            f.write(build_log(10, [(len(new) - 0x1000, dirty_pages(old, new))]))
+
+        reg = Registry.Registry.open_with_logs(self.path)
+        self.assertEqual(reg.hive_id(), (os.path.abspath(self.path), "logs"))
+        key = reg.open("k5")
+        ref = key.ref()
+        self.assertTrue(ref.key()._registry is reg)
+        self.assertEqual(ref.key().path(), key.path())
+        self.assertRaises(Registry.RegistryKeyNotFoundException, Registry.open_hive(self.path).open, "k5")
+        reg.close()
+        self.assertEqual(Registry.get_hive(ref.hive_id), Registry.open_hive(self.path, logs=True))
+        self.assertEqual(ref.key().path(), key.path())
+        Registry.close_hive(ref.hive_id)
+
+        # a hive recovered from given logs cannot be found again from a handle
+        reg = Registry.Registry(self.path, logs=[self.path + ".LOG1"])
+        self.assertEqual(reg.hive_id(), None)
+        self.assertRaises(ValueError, reg.open("k5").ref)
+
+    def test_across_processes(self):
+        refs = list(RegistryBatch.walk_parallel(self.path, key_ref, split_depth=2, workers=2))
+        reg = Registry.Registry(self.path, mmap=True)
+        self.assertEqual(refs, [entry.key.ref() for entry in reg.walk()])
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(list(executor.map(ref_path, refs)), [entry.path for entry in reg.walk()])
+        reg.close()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
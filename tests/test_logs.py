@@ -0,0 +1,207 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from Registry import Registry, RegistryLog, RegistryParse
+from hivebuilder import Key, build_hive, build_log, dirty_pages, mid_update
+
+
+def tree(changed=(), extra=0):
+    keys = []
+    for i in range(200 + extra):
+        data = u"new value" if i in changed else u"old value"
+        keys.append(Key("Key%03d" % i, values=[("Data", RegistryParse.RegSZ, data.encode("utf-16le"))]))
+    return Key("ROOT", subkeys=keys)
+
+
+def data(reg):
+    return dict((entry.path, entry.key.value("Data").value())
+                for entry in reg.walk() if entry.depth == 1)
+
+
+class TestLogRecovery(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.old = build_hive(tree(), sequence1=10, sequence2=10)
+        self.primary = os.path.join(self.dir, "SYSTEM")
+        with open(self.primary, "wb") as f:
+            f.write(mid_update(self.old))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def assertRecovered(self, reg, new):
+        self.assertEqual(data(reg), data(Registry.Registry(io.BytesIO(new))))
+        self.assertFalse(any(reg._regf.recovery_required()))
+        self.assertEqual(reg._regf.hive_sequence1(), reg._regf.hive_sequence2())
+
+    def test_single_log(self):
+        new = build_hive(tree(changed=(0, 199)))
+        log = self.write("SYSTEM.LOG1", build_log(10, [(len(new) - 0x1000, dirty_pages(self.old, new))]))
+        for mmap in (False, True):
+            with Registry.Registry(self.primary, mmap=mmap, logs=[log]) as reg:
+                self.assertRecovered(reg, new)
+                self.assertEqual(reg._regf.hive_sequence1(), 10)
+        with open(self.primary, "rb") as f:
+            self.assertEqual(f.read(), mid_update(self.old))
+
+    def test_dual_logs(self):
+        middle = build_hive(tree(changed=(0,)))
+        new = build_hive(tree(changed=(0, 199)))
+        hbins_size = len(new) - 0x1000
+        log1 = self.write("SYSTEM.LOG1", build_log(10, [(hbins_size, dirty_pages(self.old, middle))]))
+        log2 = self.write("SYSTEM.LOG2", build_log(11, [(hbins_size, dirty_pages(middle, new))]))
+        for logs in ([log1, log2], [log2, log1]):
+            for mmap in (False, True):
+                with Registry.Registry(self.primary, mmap=mmap, logs=logs) as reg:
+                    self.assertRecovered(reg, new)
+                    self.assertEqual(reg._regf.hive_sequence1(), 11)
+
+    def test_ineligible_log(self):
+        new = build_hive(tree(changed=(0, 199)))
+        stale = self.write("SYSTEM.LOG2", build_log(5, [(len(new) - 0x1000, dirty_pages(self.old, new))]))
+        with Registry.Registry(self.primary, logs=[stale]) as reg:
+            self.assertEqual(data(reg), data(Registry.Registry(io.BytesIO(self.old))))
+
+    def test_growth(self):
+        new = build_hive(tree(changed=(0,), extra=100))
+        self.assertTrue(len(new) > len(self.old))
+        log = self.write("SYSTEM.LOG1", build_log(10, [(len(new) - 0x1000, dirty_pages(self.old, new))]))
+        for mmap in (False, True):
+            with Registry.Registry(self.primary, mmap=mmap, logs=[log]) as reg:
+                self.assertRecovered(reg, new)
+                self.assertEqual(len(data(reg)), 300)
+
+    def test_apply_logs(self):
+        new = build_hive(tree(changed=(199,)))
+        log = build_log(10, [(len(new) - 0x1000, dirty_pages(self.old, new))])
+        primary = io.BytesIO(mid_update(self.old))
+        self.assertEqual(RegistryLog.apply_logs(primary, [io.BytesIO(log)]), 10)
+        primary.seek(0)
+        self.assertRecovered(Registry.Registry(primary), new)
+
+    def test_recover_hive(self):
+        middle = build_hive(tree(changed=(0,)))
+        new = build_hive(tree(changed=(0, 199)))
+        hbins_size = len(new) - 0x1000
+        log = build_log(10, [(hbins_size, dirty_pages(self.old, middle)),
+                             (hbins_size, dirty_pages(middle, new)),
+                             (hbins_size, dirty_pages(self.old, new))])
+        primary = io.BytesIO(mid_update(self.old))
+        self.assertEqual(RegistryLog.RegistryLog(primary, io.BytesIO(log)).recover_hive(), 12)
+        primary.seek(0)
+        self.assertRecovered(Registry.Registry(primary), new)
+
+    def test_open_with_logs(self):
+        middle = build_hive(tree(changed=(0,)))
+        new = build_hive(tree(changed=(0, 199)))
+        hbins_size = len(new) - 0x1000
+        self.write("SYSTEM.LOG1", build_log(10, [(hbins_size, dirty_pages(self.old, middle))]))
+        self.write("SYSTEM.log2", build_log(11, [(hbins_size, dirty_pages(middle, new))]))
+        self.assertEqual(len(Registry.find_logs(self.primary)), 2)
+        for mmap in (False, True):
+            with Registry.Registry.open_with_logs(self.primary, mmap=mmap) as reg:
+                self.assertRecovered(reg, new)
+
+    def test_open_with_unsupported_logs(self):
+        self.write("SYSTEM.LOG1", self.old)
+        with Registry.Registry.open_with_logs(self.primary) as reg:
+            self.assertEqual(data(reg), data(Registry.Registry(io.BytesIO(self.old))))
+        self.assertRaises(RegistryParse.ParseException, Registry.Registry, self.primary,
+                          logs=[os.path.join(self.dir, "SYSTEM.LOG1")])
+
+    def test_open_without_logs(self):
+        with Registry.Registry.open_with_logs(self.primary) as reg:
+            self.assertTrue(reg._regf.recovery_required().recover_data)
+        with open(self.primary, "rb") as f:
+            reg = Registry.Registry.open_with_logs(f)
+            self.assertEqual(reg.hive_name(), "SYNTHETIC")
+
+
+class TestDirtyPages(unittest.TestCase):
+    def test_runs(self):
+        pages = RegistryLog.DirtyPages()
+        pages.add(0x3000, b"c" * 0x1000)
+        pages.add(0x1000, b"a" * 0x1000)
+        pages.add(0x6000, b"e" * 0x1000)
+        pages.add(0x2000, b"b" * 0x1000)
+        pages.add(0x3000, b"d" * 0x1000)
+        self.assertEqual(len(pages), 4)
+        self.assertEqual(pages.end(), 0x7000)
+        self.assertEqual(pages.runs(), [(0x1000, [b"a" * 0x1000, b"b" * 0x1000, b"d" * 0x1000]),
+                                        (0x6000, [b"e" * 0x1000])])
+
+        f = io.BytesIO()
+        pages.write_to(f)
+        self.assertEqual(f.getvalue(), b"\x00" * 0x1000 + b"a" * 0x1000 + b"b" * 0x1000 +
+                         b"d" * 0x1000 + b"\x00" * 0x2000 + b"e" * 0x1000)
+
+    def test_stats(self):
+        pages = RegistryLog.DirtyPages()
+        for offset in (0x1000, 0x2000, 0x1000, 0x5000, 0x3000, 0x2000):
+            pages.add(offset, b"x" * 0x1000)
+        stats = pages.stats()
+        self.assertEqual((stats.pages, stats.unique_pages, stats.superseded_pages, stats.runs),
+                         (6, 4, 2, 2))
+        self.assertEqual((stats.writes, stats.bytes_written), (0, 0))
+        stats = pages.write_to(io.BytesIO())
+        self.assertEqual((stats.writes, stats.bytes_written), (2, 0x4000))
+
+    def test_pwritev(self):
+        pages = RegistryLog.DirtyPages()
+        for i, offset in enumerate((0x3000, 0x1000, 0x2000, 0x8000)):
+            pages.add(offset, bytes(bytearray([0x41 + i])) * 0x1000)
+        expected = io.BytesIO(b"\x00" * 0x9000)
+        pages.write_to(expected)
+
+        f = tempfile.TemporaryFile()
+        f.write(b"\x00" * 0x9000)
+        f.flush()
+        raw = io.FileIO(f.fileno(), "r+b", closefd=False)
+        stats = pages.write_to(raw)
+        self.assertEqual(stats.bytes_written, 0x8000)
+        f.seek(0)
+        self.assertEqual(f.read(), expected.getvalue())
+        f.close()
+
+    def test_overlapping_pages(self):
+        pages = RegistryLog.DirtyPages()
+        pages.add(0x2000, b"b" * 0x1000)
+        pages.add(0x1000, b"a" * 0x2000)
+        f = io.BytesIO()
+        pages.write_to(f)
+        self.assertEqual(f.getvalue()[0x1000:], b"a" * 0x2000)
+
+    def test_smaller_page_at_same_offset(self):
+        pages = RegistryLog.DirtyPages()
+        pages.add(0x1000, b"a" * 0x2000)
+        pages.add(0x1000, b"b" * 0x1000)
+        f = io.BytesIO()
+        stats = pages.write_to(f)
+        self.assertEqual(f.getvalue()[0x1000:], b"b" * 0x1000 + b"a" * 0x1000)
+        self.assertEqual((stats.pages, stats.unique_pages, stats.superseded_pages, stats.runs), (2, 2, 0, 1))
+
+    def test_page_inside_older_pages(self):
+        pages = RegistryLog.DirtyPages()
+        pages.add(0x2000, b"c" * 0x1000)
+        pages.add(0x0, b"a" * 0x3000)
+        pages.add(0x1000, b"b" * 0x1000)
+        self.assertEqual(len(pages), 3)
+        f = io.BytesIO()
+        stats = pages.write_to(f)
+        self.assertEqual(f.getvalue(), b"a" * 0x1000 + b"b" * 0x1000 + b"a" * 0x1000)
+        self.assertEqual((stats.pages, stats.unique_pages, stats.superseded_pages, stats.runs), (3, 2, 1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,42 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import unittest
+
+from Registry import RegistryParse
+
+SEED = 0x82EF4D887A4E55C5
+
+# Hashes of b"\x01\x02...", of length 0 to 9, from the original
+#  ctypes implementation of HvLEBlock.marvin32_hash.
+EXPECTED = [
+    0xb39efca403966e08, 0xa38e1a34a85617bd, 0xe7e67c8cdd62f055, 0x97a4a8be5babb105,
+    0x1cbf1be2814a8413, 0xdb42d9c1d6c90f54, 0x1fb383697cc0b7cf, 0x98aa5492da9ec6d9,
+    0x9dbc8559cb2d626e, 0x36571928135294d3,
+]
+
+
+class TestMarvin32(unittest.TestCase):
+    def test_known_hashes(self):
+        for length, expected in enumerate(EXPECTED):
+            buf = bytes(bytearray(range(1, length + 1)))
+            self.assertEqual(RegistryParse.marvin32(buf, SEED), expected)
+            self.assertEqual(RegistryParse.marvin32(bytearray(buf), SEED), expected)
+        buf = bytes(bytearray(i * 7 & 0xFF for i in range(1003)))
+        self.assertEqual(RegistryParse.marvin32(buf, 0x0123456789ABCDEF), 0xc1aedf7ef1caf529)
+
+    def test_log_entries(self):
+        path = os.path.join(os.path.dirname(__file__), "..", "testing", "reg_samples",
+                            "new_log_2", "SYSTEM.LOG2")
+        if not os.path.exists(path):
+            self.skipTest("transaction log samples are not available")
+        with open(path, "rb") as f:
+            regf = RegistryParse.REGFBlock(f.read(), 0, False)
+        entries = list(regf.log_entries())
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0].hash_1(), entries[0].calculate_hash_1())
+        self.assertEqual(entries[0].hash_2(), entries[0].calculate_hash_2())
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
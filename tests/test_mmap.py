@@ -0,0 +1,38 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import unittest
+
+from Registry import Registry
+
+
+def dump(key, depth=0):
+    ret = [(depth, key.path(), key.timestamp())]
+    for value in key.values():
+        ret.append((depth, value.name(), value.value_type(), value.raw_data()))
+    for subkey in key.subkeys():
+        ret.extend(dump(subkey, depth + 1))
+    return ret
+
+
+class TestRegistryMmap(unittest.TestCase):
+    def setUp(self):
+        self.paths = [os.path.join(os.path.dirname(__file__), "reg_samples", name)
+                      for name in ("UNICODE_TESTS", "issue22.hive")]
+
+    def test_same_as_read(self):
+        for path in self.paths:
+            with Registry.Registry(path, mmap=True) as reg:
+                self.assertEqual(dump(reg.root()), dump(Registry.Registry(path).root()))
+                self.assertEqual(reg.hive_name(), Registry.Registry(path).hive_name())
+
+    def test_file_object(self):
+        with open(self.paths[1], "rb") as f:
+            reg = Registry.Registry(f, mmap=True)
+            self.assertEqual(reg.root().value("TimeZoneKeyName").value(),
+                             u"W. Europe Standard Time")
+            reg.close()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
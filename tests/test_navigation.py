@@ -0,0 +1,219 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import io
+import os
+import unittest
+
+from Registry import Registry
+from Registry import RegistryParse
+from hivebuilder import Key, build_hive, lh_hash
+
+
+def synthetic_registry():
+    names = ["Key%04d" % i for i in range(300)] + [u"Sch\xf6n", u"\u0416uk", "a", "ab"]
+    def children():
+        return [Key(name) for name in names]
+    root = Key("ROOT", subkeys=[
+        Key("lh", subkeys=children()),
+        Key("lf", subkeys=children(), list_type="lf"),
+        Key("li", subkeys=children(), list_type="li"),
+        Key("ri", subkeys=children(), ri_chunk=16),
+        Key("rili", subkeys=children(), list_type="li", ri_chunk=16),
+        Key("unsorted", subkeys=list(reversed(children())), sort=False),
+        Key("unsorted_li", subkeys=list(reversed(children())), sort=False, list_type="li"),
+        Key("unsorted_rili", subkeys=list(reversed(children())), sort=False, list_type="li", ri_chunk=16),
+    ])
+    return Registry.Registry(io.BytesIO(build_hive(root))), names
+
+
+class TestNavigation(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(os.path.dirname(__file__), "reg_samples", "UNICODE_TESTS")
+        self.reg = Registry.Registry(self.path)
+
+    def test_parent_and_path(self):
+        root = self.reg.root()
+        for key in root.subkeys():
+            self.assertEqual(key.path(), root.name() + "\\" + key.name())
+            self.assertEqual(key.parent().name(), root.name())
+            for value in key.values():
+                self.assertEqual(key.value(value.name()).raw_data(), value.raw_data())
+        self.assertRaises(Registry.RegistryKeyHasNoParentException, root.parent)
+
+    def test_records_do_not_chain_parents(self):
+        for key in self.reg.root().subkeys():
+            self.assertEqual(key._nkrecord.parent(), None)
+
+
+class TestSubkeyLookup(unittest.TestCase):
+    def setUp(self):
+        self.reg, self.names = synthetic_registry()
+
+    def test_lh_hash(self):
+        for name in self.names:
+            self.assertEqual(RegistryParse.lh_hash(name), lh_hash(name))
+
+    def test_lookup(self):
+        for list_name in ("lh", "lf", "li", "ri", "rili", "unsorted", "unsorted_li", "unsorted_rili"):
+            parent = self.reg.root().subkey(list_name)
+            for name in self.names:
+                self.assertEqual(parent.subkey(name).name(), name)
+                self.assertEqual(parent.subkey(name.lower()).name(), name)
+                self.assertEqual(parent.subkey(name.upper()).name(), name)
+            for name in ("Key0300", "Key", "", "zzz", "0"):
+                self.assertRaises(Registry.RegistryKeyNotFoundException, parent.subkey, name)
+
+    def test_key_offsets(self):
+        for list_name in ("lh", "lf", "li", "ri", "rili", "unsorted", "unsorted_li", "unsorted_rili"):
+            l = self.reg.root().subkey(list_name)._nkrecord.subkey_list()
+            self.assertEqual(list(l.key_offsets()), [k.offset() for k in l.keys()])
+            self.assertEqual(len(list(l.key_offsets())), len(self.names))
+
+    def test_sample_lookup(self):
+        root = Registry.Registry(os.path.join(os.path.dirname(__file__),
+                                              "reg_samples", "UNICODE_TESTS")).root()
+        for key in root.subkeys():
+            self.assertEqual(root.subkey(key.name()).name(), key.name())
+
+
+class TestPathCache(unittest.TestCase):
+    def setUp(self):
+        self.reg, self.names = synthetic_registry()
+
+    def test_open(self):
+        cache = self.reg.path_cache()
+        self.assertEqual(self.reg.open("ri\\Key0042").path(), "ROOT\\ri\\Key0042")
+        self.assertEqual(cache.stats().misses, 1)
+        self.assertEqual(self.reg.open("RI\\key0042\\").path(), "ROOT\\ri\\Key0042")
+        self.assertEqual(cache.stats().hits, 1)
+        self.assertEqual(self.reg.open("ri\\Key0043").path(), "ROOT\\ri\\Key0043")
+        self.assertEqual(cache.stats().partial_hits, 1)
+        self.assertRaises(Registry.RegistryKeyNotFoundException, self.reg.open, "ri\\missing")
+        self.assertEqual(self.reg.root().find_key("lh").find_key("a").path(), "ROOT\\lh\\a")
+
+    def test_bounded(self):
+        reg = Registry.Registry(io.BytesIO(build_hive(Key("ROOT", subkeys=[
+            Key("k%d" % i) for i in range(10)]))), path_cache_size=4)
+        for i in range(10):
+            reg.open("k%d" % i)
+        self.assertEqual(reg.path_cache().stats().size, 4)
+
+    def test_disabled(self):
+        reg = Registry.Registry(io.BytesIO(build_hive(Key("ROOT", subkeys=[Key("k")]))),
+                                path_cache_size=0)
+        self.assertEqual(reg.path_cache(), None)
+        self.assertEqual(reg.open("k").name(), "k")
+
+
+class TestOpenMany(unittest.TestCase):
+    def setUp(self):
+        self.reg, self.names = synthetic_registry()
+
+    def test_open_many(self):
+        paths = ["ri\\Key0042", "RI\\key0042\\", "lf\\a", "li", "", "li\\missing",
+                 "missing\\Key0001", u"lh\\sch\xf6n"]
+        results = self.reg.open_many(paths)
+        self.assertEqual(sorted(results), sorted(paths))
+        for path in paths:
+            if "missing" in path:
+                self.assertEqual(results[path], None)
+            else:
+                self.assertEqual(results[path].path(), self.reg.open(path).path())
+        self.assertEqual(self.reg.open_many(["nope"], default=False), {"nope": False})
+
+    def test_values_many(self):
+        reg = Registry.Registry(io.BytesIO(build_hive(Key("ROOT", subkeys=[
+            Key("Select", values=[("Current", 4, b"\x01\x00\x00\x00"), ("", 4, b"\x02\x00\x00\x00")]),
+            Key("ControlSet001", subkeys=[Key("Control", values=[("Name", 4, b"\x03\x00\x00\x00")])]),
+        ]))))
+        requests = [("Select", "Current"), ("select", "CURRENT"), ("Select", "(default)"),
+                    ("ControlSet001\\Control", "name"), ("Select", "missing"), ("Missing", "Current")]
+        results = reg.values_many(requests)
+        self.assertEqual(dict((r, v.value() if v is not None else None) for r, v in results.items()),
+                         {("Select", "Current"): 1, ("select", "CURRENT"): 1, ("Select", "(default)"): 2,
+                          ("ControlSet001\\Control", "name"): 3, ("Select", "missing"): None,
+                          ("Missing", "Current"): None})
+
+
+class TestWalk(unittest.TestCase):
+    def setUp(self):
+        root = Key("ROOT", subkeys=[
+            Key("a", subkeys=[Key("a1", values=[("v", 4, b"\x01\x00\x00\x00")]),
+                              Key("a2", subkeys=[Key("deep")])]),
+            Key("b", subkeys=[Key("b1")]),
+        ])
+        self.reg = Registry.Registry(io.BytesIO(build_hive(root)))
+
+    def paths(self, **kwargs):
+        return [entry.path for entry in self.reg.walk(**kwargs)]
+
+    def test_orders(self):
+        self.assertEqual(self.paths(), ["ROOT", "ROOT\\a", "ROOT\\a\\a1", "ROOT\\a\\a2",
+                                        "ROOT\\a\\a2\\deep", "ROOT\\b", "ROOT\\b\\b1"])
+        self.assertEqual(self.paths(order="post"), ["ROOT\\a\\a1", "ROOT\\a\\a2\\deep", "ROOT\\a\\a2",
+                                                    "ROOT\\a", "ROOT\\b\\b1", "ROOT\\b", "ROOT"])
+        self.assertEqual(self.paths(order="bfs"), ["ROOT", "ROOT\\a", "ROOT\\b", "ROOT\\a\\a1",
+                                                   "ROOT\\a\\a2", "ROOT\\b\\b1", "ROOT\\a\\a2\\deep"])
+        self.assertRaises(ValueError, self.paths, order="in")
+
+    def test_paths_and_depths(self):
+        for entry in self.reg.walk():
+            self.assertEqual(entry.path, entry.key.path())
+            self.assertEqual(entry.depth, entry.path.count("\\"))
+            self.assertEqual(entry.values, None)
+
+    def test_prune_and_max_depth(self):
+        self.assertEqual(self.paths(prune=lambda e: e.key.name() == "a"),
+                         ["ROOT", "ROOT\\b", "ROOT\\b\\b1"])
+        self.assertEqual(self.paths(max_depth=1), ["ROOT", "ROOT\\a", "ROOT\\b"])
+        self.assertEqual(self.paths(max_depth=1, order="bfs"), ["ROOT", "ROOT\\a", "ROOT\\b"])
+
+    def test_values_and_subtree(self):
+        entries = list(self.reg.walk(self.reg.open("a"), values=True))
+        self.assertEqual(entries[0].path, "ROOT\\a")
+        self.assertEqual(entries[1].values[0].value(), 1)
+
+
+class TestScan(unittest.TestCase):
+    def test_same_as_walk(self):
+        reg, _ = synthetic_registry()
+        for path in (os.path.join(os.path.dirname(__file__), "reg_samples", "UNICODE_TESTS"), None):
+            if path is not None:
+                reg = Registry.Registry(path)
+            expected_keys = set()
+            expected_values = set()
+            for entry in reg.walk(values=True):
+                expected_keys.add((entry.key._nkrecord.offset(), entry.path))
+                for value in entry.values:
+                    expected_values.add((value._vkrecord.offset(), entry.key._nkrecord.offset(),
+                                         entry.path, value._vkrecord.name()))
+
+            keys = set()
+            values = set()
+            for entry in reg.scan():
+                if isinstance(entry.record, RegistryParse.NKRecord):
+                    keys.add((entry.offset, entry.path))
+                else:
+                    values.add((entry.offset, entry.parent_offset, entry.path, entry.record.name()))
+            self.assertEqual(keys, expected_keys)
+            self.assertEqual(values, expected_values)
+
+    def test_malformed_records(self):
+        hive = bytearray(build_hive(Key("ROOT", subkeys=[
+            Key("bad", values=[("v", RegistryParse.RegDWord, b"\x01\x00\x00\x00")]),
+            Key("good", values=[("w", RegistryParse.RegDWord, b"\x02\x00\x00\x00")])])))
+        reg = Registry.Registry(io.BytesIO(bytes(hive)))
+        bad = reg.open("bad")._nkrecord.offset()
+        # a huge value count, whose list runs past the end of the hive
+        hive[bad + 0x24:bad + 0x28] = b"\xff\xff\xff\x0f"
+
+        entries = list(Registry.Registry(io.BytesIO(bytes(hive))).scan())
+        self.assertEqual(sorted(e.path for e in entries if isinstance(e.record, RegistryParse.NKRecord)),
+                         ["ROOT", "ROOT\\bad", "ROOT\\good"])
+        self.assertEqual(sorted((e.record.name(), e.path) for e in entries
+                                if isinstance(e.record, RegistryParse.VKRecord)),
+                         [("v", None), ("w", "ROOT\\good")])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,79 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from Registry import Registry, RegistryParse
+from hivebuilder import Key, build_hive, build_log, mid_update
+
+
+class TestProbe(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.hive = build_hive(Key("ROOT", subkeys=[Key("Software")]),
+                               hive_name=u"emRoot\\System32\\Config\\SOFTWARE", sequence1=7, sequence2=7)
+        self.files = {
+            "SOFTWARE": self.hive,
+            "SOFTWARE.LOG1": build_log(7, [(len(self.hive) - 0x1000, [])]),
+            os.path.join("sub", "DIRTY"): mid_update(self.hive),
+            "junk.txt": b"not a hive" * 100,
+            "short": b"regf",
+        }
+        os.mkdir(os.path.join(self.dir, "sub"))
+        for name, content in self.files.items():
+            with open(os.path.join(self.dir, name), "wb") as f:
+                f.write(content)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_probe(self):
+        info = Registry.probe(os.path.join(self.dir, "SOFTWARE"))
+        self.assertEqual(info.path, os.path.join(self.dir, "SOFTWARE"))
+        self.assertEqual(info.file_type, RegistryParse.FileType.FILE_TYPE_PRIMARY)
+        self.assertEqual(info.hive_type, Registry.HiveType.SOFTWARE)
+        self.assertEqual(info.hive_name, Registry.Registry(io.BytesIO(self.hive)).hive_name())
+        self.assertEqual((info.major_version, info.minor_version), (1, 5))
+        self.assertEqual((info.sequence1, info.sequence2), (7, 7))
+        self.assertTrue(info.checksum_valid)
+        self.assertFalse(info.recover_header or info.recover_data)
+        self.assertEqual(info.hbins_size, len(self.hive) - 0x1000)
+
+        info = Registry.probe(os.path.join(self.dir, "SOFTWARE.LOG1"))
+        self.assertEqual(info.file_type, RegistryParse.FileType.FILE_TYPE_LOG_NEW)
+
+        with open(os.path.join(self.dir, "sub", "DIRTY"), "rb") as f:
+            info = Registry.probe(f)
+        self.assertEqual((info.sequence1, info.sequence2), (8, 7))
+        self.assertTrue(info.recover_data)
+        self.assertFalse(info.recover_header)
+
+        for name in ("junk.txt", "short"):
+            self.assertRaises(RegistryParse.ParseException, Registry.probe, os.path.join(self.dir, name))
+
+    def test_probe_bad_name(self):
+        # a lone surrogate in the hive name
+        junk = bytearray(b"regf" + b"\x00" * 0xffc)
+        junk[0x30:0x34] = b"\x00\xd8A\x00"
+        path = os.path.join(self.dir, "sub", "junk")
+        with open(path, "wb") as f:
+            f.write(bytes(junk))
+        info = Registry.probe(path)
+        self.assertEqual(info.hive_name, u"\ufffdA")
+        self.assertEqual(info.file_type, RegistryParse.FileType.FILE_TYPE_PRIMARY)
+        found = [info.path for info in Registry.probe_directory(self.dir)]
+        self.assertEqual(found[-2:], [os.path.join(self.dir, "sub", "DIRTY"), path])
+
+    def test_probe_directory(self):
+        found = [info.path for info in Registry.probe_directory(self.dir, workers=2)]
+        self.assertEqual(found, [os.path.join(self.dir, name)
+                                 for name in ("SOFTWARE", "SOFTWARE.LOG1", os.path.join("sub", "DIRTY"))])
+        found = [info.path for info in Registry.probe_directory(self.dir, recursive=False)]
+        self.assertEqual(len(found), 2)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
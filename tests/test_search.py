@@ -0,0 +1,124 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from Registry import Registry, RegistryParse, RegistrySearch
+from hivebuilder import Key, build_hive
+
+
+def sz(s):
+    return (s + u"\x00").encode("utf-16le")
+
+
+def tree():
+    return Key("ROOT", subkeys=[
+        Key("Software", subkeys=[
+            Key("Microsoft", subkeys=[Key("Windows", subkeys=[Key("CurrentVersion", subkeys=[
+                Key("Run", values=[("Updater", RegistryParse.RegSZ, sz(u"C:\\Tools\\update.exe")),
+                                   ("Path", RegistryParse.RegExpandSZ, sz(u"%SystemRoot%\\notepad.exe"))]),
+                Key("RunOnce"),
+            ])])]),
+            Key(u"Sch\xf6n", values=[(u"Gr\xfc\xdfe", RegistryParse.RegMultiSZ,
+                                      sz(u"one") + sz(u"NOTEPAD")[:-2] + b"\x00\x00"),
+                                     ("", RegistryParse.RegSZ, sz(u"default notepad"))]),
+        ]),
+        Key("System", subkeys=[Key("svc%02d" % i, values=[
+            ("ImagePath", RegistryParse.RegSZ, sz(u"C:\\svc%02d.sys" % i)),
+            ("Start", RegistryParse.RegDWord, b"\x03\x00\x00\x00"),
+            ("runner", RegistryParse.RegBin, b"notepad")]) for i in range(30)], ri_chunk=8),
+    ])
+
+
+def expected(reg, needle, case_insensitive=False):
+    """
+    The hits of a search, found by walking the hive.
+    """
+    def contains(text, needle):
+        if case_insensitive:
+            return RegistryParse.upcase_name(needle) in RegistryParse.upcase_name(text)
+        return needle in text
+
+    hits = []
+    for entry in reg.walk(values=True):
+        name = entry.key.name()
+        tail = entry.path[max(0, len(entry.path) - len(name) - len(needle.rstrip("\\")) + 1):]
+        if entry.depth > 0 and needle.rstrip("\\") and contains(tail, needle.rstrip("\\")):
+            hits.append(RegistrySearch.SearchHit(RegistrySearch.KEY, entry.path, None))
+        for value in entry.values:
+            if contains(value._vkrecord.name(), needle):
+                hits.append(RegistrySearch.SearchHit(RegistrySearch.VALUE_NAME, entry.path, value.name()))
+            if value.value_type() in (RegistryParse.RegSZ, RegistryParse.RegExpandSZ, RegistryParse.RegMultiSZ):
+                data = value.value()
+                if isinstance(data, list):
+                    data = u"\n".join(data)
+                if contains(data, needle):
+                    hits.append(RegistrySearch.SearchHit(RegistrySearch.DATA, entry.path, value.name()))
+    return hits
+
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "SOFTWARE")
+        self.hive = build_hive(tree())
+        with open(self.path, "wb") as f:
+            f.write(self.hive)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def assertSearch(self, reg, needle, case_insensitive=False):
+        self.assertEqual(list(reg.search(needle, case_insensitive)), expected(reg, needle, case_insensitive),
+                         needle)
+
+    def test_search(self):
+        reg = Registry.Registry(io.BytesIO(self.hive))
+        for needle in (u"Run", u"run", u"notepad", u"NOTEPAD", u"svc1", u"svc07.sys", u"Windows\\Curr",
+                       u"Microsoft\\Windows\\", u"ft\\Micro", u"sch\xd6n", u"gr\xfcsse", u"\xdfe",
+                       u"Path", u"e", u"", u"missing", u".exe"):
+            self.assertSearch(reg, needle)
+            self.assertSearch(reg, needle, case_insensitive=True)
+
+        hits = list(reg.search(u"notepad"))
+        self.assertEqual(hits, [
+            RegistrySearch.SearchHit(RegistrySearch.DATA, u"ROOT\\Software\\Microsoft\\Windows\\CurrentVersion\\Run",
+                                     u"Path"),
+            RegistrySearch.SearchHit(RegistrySearch.DATA, u"ROOT\\Software\\Sch\xf6n", u"(default)"),
+        ])
+        self.assertEqual([h.path for h in reg.search(u"Windows\\CurrentVersion")],
+                         [u"ROOT\\Software\\Microsoft\\Windows\\CurrentVersion"])
+        self.assertEqual(len(list(reg.search(u"run", True, kinds=(RegistrySearch.VALUE_NAME,)))), 30)
+        self.assertEqual(list(reg.search(u"ROOT")), [])
+
+    def test_candidates(self):
+        reg = Registry.Registry(io.BytesIO(self.hive))
+        index = reg.search_index()
+        self.assertTrue(reg.search_index() is index)
+        self.assertEqual(index.candidates(u"AB"), None)
+        self.assertEqual(index.candidates(u"ZZZ"), [])
+        # "IMAGEPATH" is in 30 value names and "SVC07" in one key and one string
+        self.assertEqual(len(index.candidates(u"IMAGEPATH")), 30)
+        self.assertEqual(len(index.candidates(u"SVC07")), 2)
+
+    def test_sidecar(self):
+        self.assertEqual(Registry.build_search_index(self.path), self.path + ".regtri")
+        with Registry.Registry(self.path, mmap=True) as reg:
+            index = reg.search_index()
+            self.assertEqual(type(index._buf).__name__, "mmap")
+            self.assertSearch(reg, u"notepad", case_insensitive=True)
+
+        # a stale index is ignored, and one is built in memory
+        with open(self.path, "wb") as f:
+            f.write(build_hive(tree(), sequence1=5, sequence2=5))
+        reg = Registry.Registry(self.path)
+        self.assertEqual(type(reg.search_index()._buf), bytes)
+        self.assertSearch(reg, u"svc2")
+        self.assertRaises(RegistryParse.ParseException, RegistrySearch.SearchIndex, b"junk")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from Registry import Registry, RegistryParse, RegistrySQLite
+from hivebuilder import Key, build_hive
+
+
+class TestSQLiteExport(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.paths = []
+        for i, name in enumerate(("SYSTEM", "SOFTWARE")):
+            path = os.path.join(self.dir, name)
+            with open(path, "wb") as f:
+                f.write(build_hive(Key("ROOT", subkeys=[
+                    Key("k%d" % j, values=[("v", RegistryParse.RegBin, b"\x00\x01" * (j + i)),
+                                           (u"n\xe4me", RegistryParse.RegDWord, b"\x07\x00\x00\x00")],
+                        subkeys=[Key("sub")])
+                    for j in range(25)]), hive_name=name))
+            self.paths.append(path)
+        self.database = os.path.join(self.dir, "hives.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_export(self):
+        stats = RegistrySQLite.export(self.database, self.paths, batch_size=7)
+        self.assertEqual([(s.hive_id, s.keys, s.values) for s in stats], [(1, 51, 50), (2, 51, 50)])
+        self.assertTrue(all(s.keys_per_second > 0 for s in stats))
+
+        db = sqlite3.connect(self.database)
+        self.assertEqual(db.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(db.execute("SELECT hive_id, source, hive_name FROM hives ORDER BY hive_id").fetchall(),
+                         [(1, self.paths[0], "SYSTEM"), (2, self.paths[1], "SOFTWARE")])
+        indexes = [row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")]
+        for name in ("keys_path", "keys_name", "keys_timestamp", "key_values_name", "key_values_type"):
+            self.assertTrue(name in indexes)
+
+        reg = Registry.Registry(self.paths[1])
+        key = reg.open("k3")
+        row = db.execute("SELECT offset, parent_offset, depth, timestamp, subkeys_number, values_number "
+                         "FROM keys WHERE hive_id = 2 AND path = 'root\\K3'").fetchone()
+        self.assertEqual(row, (key._nkrecord.offset(), reg.root()._nkrecord.offset(), 1,
+                               key.raw_timestamp(), 1, 2))
+        rows = db.execute("SELECT v.name, v.type, v.type_name, v.data_length, v.data "
+                          "FROM keys k JOIN key_values v ON v.hive_id = k.hive_id AND v.key_offset = k.offset "
+                          "WHERE k.hive_id = 2 AND k.name = 'k3' ORDER BY v.offset").fetchall()
+        self.assertEqual([(r[0], r[1], r[2], r[3], bytes(r[4])) for r in rows],
+                         [(v.name(), v.value_type(), v.value_type_str(), len(v.raw_data()), v.raw_data())
+                          for v in key.values()])
+        db.close()
+
+        stats = RegistrySQLite.export(self.database, self.paths[:1], data=False)
+        db = sqlite3.connect(self.database)
+        self.assertEqual(stats[0].hive_id, 3)
+        self.assertEqual(db.execute("SELECT COUNT(*), COUNT(data) FROM key_values WHERE hive_id = 3").fetchone(),
+                         (50, 0))
+        db.close()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
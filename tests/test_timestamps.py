@@ -0,0 +1,69 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import unittest
+from datetime import datetime
+
+from Registry import Registry
+from Registry.RegistryParse import parse_windows_timestamp, windows_timestamp_to_epoch, \
+    windows_timestamps_to_epoch, windows_timestamps_to_datetime64
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+FILETIMES = [116444736000000000, 131102269399745745, 130954374507322110, 0]
+
+
+class TestTimestamps(unittest.TestCase):
+    def test_parse_windows_timestamp(self):
+        self.assertEqual(parse_windows_timestamp(0), datetime(1601, 1, 1))
+        self.assertEqual(parse_windows_timestamp(116444736000000000), datetime(1970, 1, 1))
+        self.assertEqual(parse_windows_timestamp(131102269399745745),
+                         datetime(2016, 6, 12, 17, 42, 19, 974574))
+        self.assertRaises(ValueError, parse_windows_timestamp, 0xFFFFFFFFFFFFFFFF)
+
+    def test_epoch(self):
+        self.assertEqual(windows_timestamp_to_epoch(116444736000000000), 0)
+        self.assertEqual(windows_timestamp_to_epoch(131102269399745745), 1465753339)
+        self.assertEqual(windows_timestamp_to_epoch(131102269399745745, "ms"), 1465753339974)
+        self.assertEqual(windows_timestamp_to_epoch(131102269399745745, "us"), 1465753339974574)
+        self.assertEqual(windows_timestamp_to_epoch(131102269399745745, "ns"), 1465753339974574500)
+        self.assertEqual(windows_timestamp_to_epoch(0), -11644473600)
+
+    def test_raw_timestamp(self):
+        reg = Registry.Registry(os.path.join(os.path.dirname(__file__), "reg_samples", "issue22.hive"))
+        root = reg.root()
+        self.assertEqual(parse_windows_timestamp(root.raw_timestamp()), root.timestamp())
+        self.assertEqual(parse_windows_timestamp(reg._regf.raw_modification_timestamp()),
+                         reg._regf.modification_timestamp())
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_vectorized(self):
+        for unit in ("s", "ms", "us", "ns"):
+            self.assertEqual(list(windows_timestamps_to_epoch(FILETIMES[:3], unit)),
+                             [windows_timestamp_to_epoch(q, unit) for q in FILETIMES[:3]])
+
+        converted = windows_timestamps_to_datetime64(numpy.array(FILETIMES, dtype=numpy.uint64))
+        self.assertEqual(converted.dtype, numpy.dtype("datetime64[ns]"))
+        self.assertEqual(converted[0], numpy.datetime64("1970-01-01T00:00:00", "ns"))
+        self.assertEqual(converted[1], numpy.datetime64("2016-06-12T17:42:19.974574500", "ns"))
+        for q, d in zip(FILETIMES[:3], converted):
+            self.assertEqual(d.astype("datetime64[us]").item(), parse_windows_timestamp(q))
+        self.assertTrue(numpy.isnat(converted[3]))
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_vectorized_large(self):
+        # FILETIMEs from 2**63 on must not wrap around to negative numbers
+        large = [0x7FFFFFFFFFFFFFFF, 0x8000000000000000, 0xFFFFFFFFFFFFFFFF]
+        for qwords in (large, numpy.array(large, dtype=numpy.uint64)):
+            for unit in ("s", "ms", "us"):
+                self.assertEqual(list(windows_timestamps_to_epoch(qwords, unit)),
+                                 [windows_timestamp_to_epoch(q, unit) for q in large])
+            self.assertTrue(numpy.isnat(windows_timestamps_to_datetime64(qwords)).all())
+            self.assertEqual(list(windows_timestamps_to_epoch(qwords, "ns")), [numpy.iinfo(numpy.int64).min] * 3)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)